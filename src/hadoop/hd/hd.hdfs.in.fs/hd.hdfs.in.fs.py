@@ -37,6 +37,16 @@
 # % key: local
 # % guisection: file input
 # %end
+# %option G_OPT_M_NPROCS
+# % description: Number of blocks transferred in parallel
+# %end
+# %option
+# % key: block_size
+# % type: integer
+# % answer: 128
+# % options: 1-
+# % description: Size of transferred blocks in MiB
+# %end
 
 
 import os
@@ -55,7 +65,12 @@ def main():
 
     if options["local"]:
         transf = GrassHdfs(options["driver"])
-        transf.upload(options["local"], options["hdfs"])
+        transf.upload(
+            options["local"],
+            options["hdfs"],
+            parallelism=int(options["nprocs"]),
+            block_size=int(options["block_size"]),
+        )
 
 
 if __name__ == "__main__":
@@ -45,6 +45,10 @@
 # % key: layer
 # % required: yes
 # %end
+# %flag
+# % key: l
+# % description: Write GeoJSON to local temporary file and upload it (always used with hdfs driver)
+# %end
 
 
 import grass.script as grass
@@ -65,11 +69,14 @@ def main():
     }
 
     json = JSONBuilder(grass_map)
-    json = json.get_JSON()
-
-    grass.message("upload %s" % json)
 
-    transf.upload(json, options["hdfs"])
+    if flags["l"] or options["driver"] != "webhdfs":
+        json = json.get_JSON()
+        grass.message("upload %s" % json)
+        transf.upload(json, options["hdfs"])
+    else:
+        # stream features from the map directly to HDFS
+        transf.write_json(json, options["hdfs"])
 
 
 if __name__ == "__main__":
@@ -51,6 +51,20 @@
 # % description: list of attributes with datatype
 # % guisection: data
 # %end
+# %flag
+# % key: c
+# % description: Resume interrupted download instead of starting over
+# %end
+# %option G_OPT_M_NPROCS
+# % description: Number of blocks transferred in parallel
+# %end
+# %option
+# % key: block_size
+# % type: integer
+# % answer: 128
+# % options: 1-
+# % description: Size of transferred blocks in MiB
+# %end
 
 import os
 import sys
@@ -71,7 +85,7 @@ import shutil
 def main():
     tmp_dir = os.path.join(get_tmp_folder(), options["out"])
 
-    if os.path.exists(tmp_dir):
+    if os.path.exists(tmp_dir) and not flags["c"]:
         shutil.rmtree(tmp_dir)
 
     transf = GrassHdfs(options["driver"])
@@ -91,7 +105,12 @@ def main():
         table_path = hive.find_table_location(options["table"])
         tmp_dir = os.path.join(tmp_dir, options["table"])
 
-    if not transf.download(hdfs=table_path, fs=tmp_dir):
+    if not transf.download(
+        hdfs=table_path,
+        fs=tmp_dir,
+        parallelism=int(options["nprocs"]),
+        block_size=int(options["block_size"]),
+    ):
         return
 
     files = os.listdir(tmp_dir)
@@ -2,7 +2,7 @@
 
 ############################################################################
 #
-# MODULE:       hd.hive.execute
+# MODULE:       hd.hive.select
 # AUTHOR(S):    Matej Krejci (matejkrejci@gmail.com)
 #
 # COPYRIGHT:    (C) 2016 by the GRASS Development Team
@@ -44,7 +44,22 @@
 # % key: out
 # % type: string
 # % required: no
-# % description: Name for output file (if omitted output to stdout)
+# % description: Name for output CSV file (if omitted output to stdout)
+# %end
+# %option G_OPT_DB_TABLE
+# % key: table
+# % required: no
+# % description: Name for output attribute table in the current database
+# %end
+# %option
+# % key: batch
+# % type: integer
+# % answer: 1000
+# % options: 1-
+# % description: Number of rows fetched and written at once
+# %end
+# %rules
+# % exclusive: out,table
 # %end
 
 import grass.script as grass
@@ -52,6 +67,53 @@ import grass.script as grass
 from hdfsgrass.hdfs_grass_lib import ConnectionManager
 
 
+def get_sql_type(hive_type):
+    """
+    Return SQL column type for Hive column type (text if unknown)
+    """
+    hive_type = (hive_type or "").upper().split("_")[0]
+    if hive_type in ("TINYINT", "SMALLINT", "INT", "BIGINT"):
+        return "integer"
+    if hive_type in ("FLOAT", "DOUBLE", "DECIMAL"):
+        return "double precision"
+    return "text"
+
+
+def sql_value(value):
+    if value is None or value == "NULL":
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'%s'" % str(value).replace("'", "''")
+
+
+def write_table(cursor, table, batch):
+    """
+    Write rows of result cursor to attribute table in batches
+    """
+    columns = [
+        "%s %s" % (name.split(".")[-1], get_sql_type(ctype))
+        for name, ctype in cursor.header
+    ]
+    grass.run_command(
+        "db.execute", sql="CREATE TABLE %s (%s)" % (table, ", ".join(columns))
+    )
+
+    count = 0
+    for rows in cursor.batches(batch):
+        sql = "BEGIN TRANSACTION;\n"
+        for row in rows:
+            sql += "INSERT INTO %s VALUES (%s);\n" % (
+                table,
+                ", ".join(sql_value(value) for value in row),
+            )
+        sql += "COMMIT;\n"
+        grass.write_command("db.execute", input="-", stdin=sql)
+        count += len(rows)
+        grass.verbose("%d rows written" % count)
+    grass.message("%d rows written to table <%s>" % (count, table))
+
+
 def main():
     conn = ConnectionManager()
 
@@ -61,14 +123,18 @@ def main():
     if not options["schema"]:
         options["schema"] = "default"
 
-    out = hive.get_results(hql=options["hql"], schema=options["schema"])
+    batch = int(options["batch"])
+    cursor = hive.stream(hql=options["hql"], schema=options["schema"])
 
     if options["out"]:
-        with open(out, "rw") as io:
-            io.writelines(out)
-            io.close()
+        cursor.to_csv(options["out"], batch_size=batch)
+    elif options["table"]:
+        write_table(cursor, options["table"], batch)
     else:
-        print(out)
+        print(",".join(col[0] for col in cursor.header))
+        for rows in cursor.batches(batch):
+            for row in rows:
+                print(",".join(str(value) for value in row))
 
 
 if __name__ == "__main__":
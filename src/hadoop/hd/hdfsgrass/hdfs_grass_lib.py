@@ -2,8 +2,10 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import inspect
+import json
 import logging
 import os
+import posixpath
 import sys
 
 # import mmap
@@ -18,13 +20,12 @@ from hdfswrapper import settings
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import Table
 from hdfs_grass_util import read_dict, save_dict, get_tmp_folder
+from hdfs_transfer import ChunkedTransfer
 from grass.pygrass.modules import Module
-from grass.script.core import PIPE
+from grass.pygrass.vector import VectorTopo
 import grass.script as grass
 from grass_map import VectorDBInfo as VectorDBInfoBase
 
-from dagpype import stream_lines, to_stream, filt, nth
-
 
 class ConnectionManager:
     """
@@ -348,9 +349,24 @@ class HiveTableBuilder:
 
 class JSONBuilder:
     """
-    Class which performe conversion from grass map to  serialisable GeoJSON
+    Class which performe conversion from grass map to  serialisable GeoJSON.
+    Features are read directly from the vector map and written one per line
+    (newline-delimited JSON), which can be parsed by Hive SerDe functions.
+    >>> json = JSONBuilder({'map': 'roads', 'layer': '1', 'type': 'line'})
+    >>> json.get_JSON()  # write to local file
+    >>> with open('roads.json', 'w') as f:
+    >>>     json.write(f)  # write to any file-like object
     """
 
+    vtypes = {
+        "point": ["points"],
+        "line": ["lines"],
+        "boundary": ["boundaries"],
+        "centroid": ["centroids"],
+        "area": ["areas"],
+        "auto": ["points", "lines", "areas"],
+    }
+
     def __init__(self, grass_map=None, json_file=None):
 
         self.grass_map = grass_map
@@ -369,100 +385,95 @@ class JSONBuilder:
             self.json = os.path.join(get_tmp_folder(), "%s.json" % filename)
         return self.json
 
-    def rm_last_lines(self, path, rm_last_line=3):
+    def get_file_name(self):
         """
-        Removing last n lines for given text file
-        :param path:
-        :param rm_last_line:
+        Return name of GeoJSON file for class variable grass_map
         :return:
         """
-        file = open(
-            path,
-            "r+",
-        )
-
-        # Move the pointer (similar to a cursor in a text editor) to the end of the file.
-        file.seek(-rm_last_line, os.SEEK_END)
-
-        pos = file.tell() - 1
-
-        while pos > 0 and file.read(1) != "\n":
-            pos -= 1
-            file.seek(pos, os.SEEK_SET)
-
-        # So long as we're not at the start of the file, delete all the characters ahead of this position
-        if pos > 0:
-            file.seek(pos, os.SEEK_SET)
-            file.truncate()
+        return "%s_%s.json" % (self.grass_map["map"], self.grass_map["layer"])
 
-        file.close()
+    def _get_vtypes(self):
+        """
+        Translate feature types of grass_map to pygrass feature types
+        :return:
+        """
+        vtypes = []
+        for gtype in self.grass_map["type"].split(","):
+            if gtype not in self.vtypes:
+                grass.warning("Features of type %s are not exported" % gtype)
+                continue
+            for vtype in self.vtypes[gtype]:
+                if vtype not in vtypes:
+                    vtypes.append(vtype)
+        return vtypes
 
     @staticmethod
-    def remove_line(filename, lineNumber):
+    def _get_geometry(vtype, feature):
         """
-        Remove n lines for given file
-        :param filename:
-        :param lineNumber:
+        Return GeoJSON geometry of pygrass feature
+        :param vtype: pygrass feature type
+        :param feature: pygrass feature
         :return:
         """
-        with open(filename, "r+") as outputFile:
-            with open(filename, "r") as inputFile:
-
-                currentLineNumber = 0
-                while currentLineNumber < lineNumber:
-                    inputFile.readline()
-                    currentLineNumber += 1
-
-                seekPosition = inputFile.tell()
-                outputFile.seek(seekPosition, 0)
-
-                inputFile.readline()
-
-                currentLine = inputFile.readline()
-                while currentLine:
-                    outputFile.writelines(currentLine)
-                    currentLine = inputFile.readline()
-
-            outputFile.truncate()
+        if vtype in ["points", "centroids"]:
+            return {"type": "Point", "coordinates": list(feature.coords())}
+        if vtype in ["lines", "boundaries"]:
+            return {
+                "type": "LineString",
+                "coordinates": [list(pnt) for pnt in feature.to_list()],
+            }
+        rings = [feature.points().to_list()]
+        rings.extend(isle.points().to_list() for isle in feature.isles())
+        return {
+            "type": "Polygon",
+            "coordinates": [[list(pnt) for pnt in ring] for ring in rings],
+        }
+
+    def features(self):
+        """
+        Generator of serialised GeoJSON features of grass_map, one per line
+        :return:
+        """
+        vector = VectorTopo(self.grass_map["map"])
+        vector.open("r", layer=int(self.grass_map["layer"]))
+        try:
+            for vtype in self._get_vtypes():
+                for feature in vector.viter(vtype):
+                    attrs = feature.attrs
+                    properties = {}
+                    if attrs is not None:
+                        properties = dict(zip(attrs.keys(), attrs.values()))
+                    yield "%s\n" % json.dumps(
+                        {
+                            "type": "Feature",
+                            "properties": properties,
+                            "geometry": self._get_geometry(vtype, feature),
+                        }
+                    )
+        finally:
+            vector.close()
+
+    def write(self, output):
+        """
+        Write serialised GeoJSON features of grass_map to file-like object
+        :param output: file-like object
+        :return: number of written features
+        """
+        count = 0
+        for feature in self.features():
+            output.write(feature)
+            count += 1
+        return count
 
     def _get_grass_json(self):
         """
         Transform GRASS map to GeoJSON
         :return:
         """
-        if self.grass_map["type"] not in [
-            "point",
-            "line",
-            "boundary",
-            "centroid",
-            "area",
-            "face",
-            "kernel",
-            "auto",
-        ]:
-            self.grass_map["type"] = "auto"
-        out = "%s_%s.json" % (self.grass_map["map"], self.grass_map["layer"])
-
-        out = os.path.join(get_tmp_folder(), out)
-        if os.path.exists(out):
-            os.remove(out)
-        out1 = Module(
-            "v.out.ogr",
-            input=self.grass_map["map"],
-            layer=self.grass_map["layer"],
-            type=self.grass_map["type"],
-            output=out,
-            format="GeoJSON",
-            stderr_=PIPE,
-            overwrite=True,
-        )
-
-        grass.message(out1.outputs["stderr"].value.strip())
-
-        self.rm_last_lines(out, 3)
-        # remove first 5 lines and last 3 to enseure format for serializetion
-        for i in range(5):  # todo optimize
-            self.remove_line(out, 0)
+        out = os.path.join(get_tmp_folder(), self.get_file_name())
+        with open(out, "w") as f:
+            count = self.write(f)
+        grass.message("%s features written to %s" % (count, out))
 
         return out
 
@@ -472,6 +483,9 @@ class GrassMapBuilder(object):
     Base class for creating GRASS map from GeoJSON
     """
 
+    # first line sometimes include null which must be skipped
+    skip_null = False
+
     def __init__(self, json_file, map, attributes):
         self.file = json_file
         self.map = map
@@ -480,47 +494,26 @@ class GrassMapBuilder(object):
     def build(self):
         raise NotImplementedError
 
-    def remove_line(self, lineNumber):
-        with open(self.file, "r+") as outputFile:
-            with open(self.file, "r") as inputFile:
-
-                currentLineNumber = 0
-                while currentLineNumber < lineNumber:
-                    inputFile.readline()
-                    currentLineNumber += 1
-
-                seekPosition = inputFile.tell()
-                outputFile.seek(seekPosition, 0)
-
-                inputFile.readline()
-
-                currentLine = inputFile.readline()
-                while currentLine:
-                    outputFile.writelines(currentLine)
-                    currentLine = inputFile.readline()
-
-            outputFile.truncate()
-
     def _get_wkid(self):
         """
         Parse epsg from wkid (esri json)
         :return:
         :rtype:
         """
-        with open(self.file, "r") as f:
-            first_line = f.readline()
-            if first_line.find("wkid") != -1:
-                return self._find_between(first_line, 'wkid":', "}")
+        first_line = self._first_line()
+        if first_line.find("wkid") != -1:
+            return self._find_between(first_line, 'wkid":', "}")
 
-    def _rm_null(self):
+    def _first_line(self):
         """
-        First line sometimes include null. Must be removed
+        Return first line of the text file with feature
         :return:
         """
         with open(self.file, "r") as f:
-            first_line = f.readline()
-            if first_line.find("null") != -1:
-                self.remove_line(0)
+            line = f.readline()
+            if self.skip_null and line.find("null") != -1:
+                line = f.readline()
+        return line
 
     def _find_between(self, s, first, last):
         """
@@ -554,32 +547,12 @@ class GrassMapBuilder(object):
         # grass.message(out1.outputs["stderr"].value.strip())
         # logging.debug(out1.outputs["stderr"].value.strip())
 
-    def _prepend_line(self, line):
-        """
-        Prepend line to the text file
-        :param line:
-        :return:
-        """
-        with open(self.file, "r+") as f:
-            old = f.read()  # read everything in the file
-            f.seek(0)  # rewind
-            f.write("%s\n" % line + old)  # write the new line before
-
-    def _append_line(self, line):
-        """
-        Append line to the text file
-        :param line:
-        :return:
-        """
-        with open(self.file, "a") as file:
-            file.write(line)
-
     def _get_type(self):
         """
         return type of esri simple feature
         :return:
         """
-        line = stream_lines(self.file) | nth(0)
+        line = self._first_line()
         if line.find("ring"):
             return ["ring", '"type":"Polygon","coordinates":']
         if line.find("multipoint"):
@@ -592,16 +565,25 @@ class GrassMapBuilder(object):
         if line.find("envelope"):
             grass.fatal("Envelope is not supported")
 
-    def replace_substring(self, foo, bar):
+    def _build_file(self, header, footer, replacements=()):
         """
-        Replace substring by given string
-        :param foo:
-        :param bar:
+        Write header, lines of the text file with replaced substrings and
+        footer to a new file in one pass
+        :param header: line written before the content
+        :param footer: line written after the content
+        :param replacements: list of (substring, replacement) pairs
         :return:
         """
         path = "%s1" % self.file
-        io = open(path, "w")
-        stream_lines(self.file) | filt(lambda l: l.replace(foo, bar)) | to_stream(io)
+        with open(self.file, "r") as src, open(path, "w") as dst:
+            dst.write("%s\n" % header)
+            for i, line in enumerate(src):
+                if i == 0 and self.skip_null and line.find("null") != -1:
+                    continue
+                for foo, bar in replacements:
+                    line = line.replace(foo, bar)
+                dst.write(line)
+            dst.write(footer)
         self.file = path
 
 
@@ -610,20 +592,19 @@ class GrassMapBuilderEsriToStandard(GrassMapBuilder):
     Class for conversion serialised GeoJson to GRASS MAP
     """
 
-    def __init__(self, json_file, map):
-        super(GrassMapBuilderEsriToStandard, self).__init__(json_file, map)
+    def __init__(self, json_file, map, attributes=None):
+        super(GrassMapBuilderEsriToStandard, self).__init__(json_file, map, attributes)
 
     def build(self):
         geom_type = self._get_type()
-        self.replace_substring(geom_type[0], [1])
-        self.replace_substring("}}}", "}}},")
 
         fst_line = (
             '{"type": "FeatureCollection","crs": '
             '{ "type": "name", "properties": { "name": "urn:ogc:def:crs:OGC:1.3:CRS84" } },"features": ['
         )
-        self._prepend_line(fst_line)
-        self._append_line("]}")
+        self._build_file(
+            fst_line, "]}", [(geom_type[0], geom_type[1]), ("}}}", "}}},")]
+        )
 
         self._create_map()
 
@@ -633,20 +614,19 @@ class GrassMapBuilderEsriToEsri(GrassMapBuilder):
     Class for conversion serialised Esri GeoJson to GRASS MAP
     """
 
+    skip_null = True
+
     def __init__(self, json_file, map, attributes):
         super(GrassMapBuilderEsriToEsri, self).__init__(json_file, map, attributes)
         if not os.path.exists(self.file):
             return
 
     def build(self):
-        self._rm_null()
         geom_type = self._get_type()
         wkid = self._get_wkid()
-        self.replace_substring("}}", "}},")
 
         header = self._generate_header(geom_type[1], wkid)
-        self._prepend_line(header)
-        self._append_line("]}")
+        self._build_file(header, "]}", [("}}", "}},")])
 
         self._create_map()
 
@@ -685,7 +665,7 @@ class GrassMapBuilderEsriToEsri(GrassMapBuilder):
 
     def _get_type(self):
         logging.info("Get type for file: %s" % self.file)
-        line = stream_lines(self.file) | nth(0)
+        line = self._first_line()
         if line.find("ring"):
             return ["ring", "esriGeometryPolygon"]
         if line.find("multipoint"):
@@ -732,28 +712,53 @@ class GrassHdfs:
         self.mkdir(dest_path)
         return dest_path
 
-    def upload(self, fs, hdfs, overwrite=True, parallelism=1):
+    def upload(self, fs, hdfs, overwrite=True, parallelism=1, block_size=128):
+        """
+        Upload local file or directory to HDFS in blocks of block_size MiB
+        using parallelism threads. Interrupted uploads are resumed.
+        """
         logging.info("Trying copy: fs: %s to  hdfs: %s   " % (fs, hdfs))
-        self.hook.upload_file(fs, hdfs, overwrite, parallelism)
-        self.grass.messageInfo(hdfs, "File has been copied to:")
+        transfer = ChunkedTransfer(self.hook, block_size * 2**20, parallelism)
+        hdfs = transfer.upload(fs, hdfs, overwrite)
+        self.printInfo(hdfs, "File has been copied to:")
 
     def mkdir(self, hdfs):
         self.hook.mkdir(hdfs)
-        self.grass.messageInfo(hdfs)
+        self.printInfo(hdfs)
 
     def write(self, hdfs, data, **kwargs):
         # Write file to hdfs
         self.hook.write(hdfs, data, **kwargs)
-        self.grass.messageInfo(hdfs)
+        self.printInfo(hdfs, "File has been written to:")
+
+    def write_json(self, json_builder, hdfs, overwrite=True):
+        """
+        Stream serialised GeoJSON features of GRASS map to HDFS in one pass
+        :param json_builder: JSONBuilder of GRASS map
+        :param hdfs: HDFS file or existing directory
+        :param overwrite: Overwrite existing file
+        :return: HDFS path of written file
+        """
+        if self.hook.is_dir(hdfs):
+            hdfs = posixpath.join(hdfs, json_builder.get_file_name())
+        self.write(hdfs, json_builder.features(), overwrite=overwrite)
+        return hdfs
 
-    def download(self, fs, hdfs, overwrite=True, parallelism=1):
+    def download(self, fs, hdfs, overwrite=True, parallelism=1, block_size=128):
+        """
+        Download file or directory from HDFS in blocks of block_size MiB
+        using parallelism threads. Interrupted downloads are resumed.
+        """
         logging.info("Trying download : hdfs: %s to fs: %s   " % (hdfs, fs))
 
-        out = self.hook.download_file(
-            hdfs_path=hdfs, local_path=fs, overwrite=overwrite, parallelism=parallelism
-        )
+        transfer = ChunkedTransfer(self.hook, block_size * 2**20, parallelism)
+        try:
+            out = transfer.download(hdfs, fs, overwrite)
+        except IOError as e:
+            grass.warning(str(e))
+            out = None
         if out:
-            self.grass.messageInfo(out)
+            self.printInfo(out)
         else:
             grass.message("Copy error!")
         return out
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import grass.script as grass
+
+from hdfs_grass_util import get_tmp_folder
+
+
+class ChunkedTransfer:
+    """
+    Transfer manager which splits large files into blocks and copies them
+    between local file system and HDFS concurrently with a bounded pool of
+    threads. Finished blocks are recorded in a local state file, so that an
+    interrupted transfer is resumed from the finished blocks when it is
+    started again with the same arguments.
+
+    Uploaded blocks are written as separate files next to the target and
+    joined with HDFS concat. HDFS concat only accepts files made of full
+    blocks (except the last file), so every uploaded block is created with
+    an HDFS block size of block_size instead of the dfs.blocksize of the
+    cluster. block_size must thus be a valid HDFS block size, i.e. a
+    multiple of 512 bytes and at least dfs.namenode.fs-limits.min-block-size
+    (1 MiB by default). Downloaded blocks are written at their offsets to a
+    preallocated local file.
+
+    The manager only uses the following methods of the hook, so any object
+    providing them can stand in for WebHDFS (e.g. in tests):
+    status(path), list(path), read(path, offset, length),
+    write(path, data, overwrite, encoding, blocksize), rename(src, dst),
+    delete(path, recursive) and concat(path, sources).
+
+    >>> transfer = ChunkedTransfer(hook, block_size=128 * 2**20, parallelism=4)
+    >>> transfer.upload('/tmp/roads.json', '/data/roads.json')
+    >>> transfer.download('/data/roads.json', '/tmp/roads.json')
+    """
+
+    def __init__(self, hook, block_size=128 * 2**20, parallelism=1, state_dir=None):
+        self.hook = hook
+        self.block_size = block_size
+        self.parallelism = max(parallelism, 1)
+        self.state_dir = state_dir or get_tmp_folder()
+        self.chunk_size = min(block_size, 2**20)
+        self._lock = threading.Lock()
+
+    def _state_file(self, *key):
+        """
+        Return path of local state file for transfer identified by key
+        :param key:
+        :return:
+        """
+        digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.state_dir, "hdfs_transfer_%s.json" % digest)
+
+    @staticmethod
+    def _read_state(path):
+        """
+        Return set of finished blocks recorded in state file
+        :param path:
+        :return:
+        """
+        if not os.path.exists(path):
+            return set()
+        with open(path, "r") as f:
+            return set(json.load(f))
+
+    def _save_state(self, path, done):
+        """
+        Record finished blocks in state file, replacing it atomically
+        :param path:
+        :param done:
+        :return:
+        """
+        tmp = "%s.tmp%s" % (path, threading.get_ident())
+        with open(tmp, "w") as f:
+            json.dump(sorted(done), f)
+        os.replace(tmp, path)
+
+    def _blocks(self, size):
+        """
+        Return list of (offset, length) of blocks for file of given size
+        :param size:
+        :return:
+        """
+        if size == 0:
+            return [(0, 0)]
+        return [
+            (offset, min(self.block_size, size - offset))
+            for offset in range(0, size, self.block_size)
+        ]
+
+    def _run(self, task, blocks, done, state):
+        """
+        Run task for all unfinished blocks in thread pool and report progress
+        and throughput
+        :param task: function called with block index, offset and length
+        :param blocks: list of (offset, length)
+        :param done: set of finished block indices
+        :param state: path of state file
+        :return:
+        """
+        todo = [i for i in range(len(blocks)) if i not in done]
+        transferred = [0]
+        start = time.time()
+
+        def run_block(i):
+            offset, length = blocks[i]
+            task(i, offset, length)
+            with self._lock:
+                done.add(i)
+                self._save_state(state, done)
+                transferred[0] += length
+                grass.percent(len(done), len(blocks), 1)
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as pool:
+            # list() re-raises the first failed block
+            list(pool.map(run_block, todo))
+
+        elapsed = max(time.time() - start, 1e-6)
+        grass.message(
+            "%d of %d blocks transferred (%d resumed), %.1f MiB in %.1f s (%.1f MiB/s)"
+            % (
+                len(todo),
+                len(blocks),
+                len(blocks) - len(todo),
+                transferred[0] / 2.0**20,
+                elapsed,
+                transferred[0] / 2.0**20 / elapsed,
+            )
+        )
+
+    def _read_local(self, path, offset, length):
+        """
+        Generator of chunks of a block of local file
+        :param path:
+        :param offset:
+        :param length:
+        :return:
+        """
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while length > 0:
+                chunk = f.read(min(self.chunk_size, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
+
+    def upload(self, local_path, hdfs_path, overwrite=True):
+        """
+        Upload local file or files of local directory to HDFS. If the HDFS
+        path is an existing directory, files are uploaded inside.
+        :param local_path:
+        :param hdfs_path:
+        :param overwrite:
+        :return: HDFS path
+        """
+        status = self.hook.status(hdfs_path)
+        if status and status["type"] == "DIRECTORY":
+            hdfs_path = posixpath.join(hdfs_path, os.path.basename(local_path))
+
+        if os.path.isdir(local_path):
+            for name in sorted(os.listdir(local_path)):
+                src = os.path.join(local_path, name)
+                if os.path.isfile(src):
+                    self._upload_file(src, posixpath.join(hdfs_path, name), overwrite)
+        else:
+            self._upload_file(local_path, hdfs_path, overwrite)
+        return hdfs_path
+
+    def _upload_file(self, local_path, hdfs_path, overwrite):
+        """
+        Upload local file to HDFS in blocks
+        :param local_path:
+        :param hdfs_path:
+        :param overwrite:
+        :return:
+        """
+        if not overwrite and self.hook.status(hdfs_path):
+            raise IOError("HDFS path %s already exists" % hdfs_path)
+
+        size = os.path.getsize(local_path)
+        blocks = self._blocks(size)
+        parts = ["%s.part-%05d" % (hdfs_path, i) for i in range(len(blocks))]
+        state = self._state_file(
+            "upload",
+            os.path.abspath(local_path),
+            size,
+            os.path.getmtime(local_path),
+            hdfs_path,
+            self.block_size,
+        )
+
+        # resume only blocks which are still complete in HDFS
+        done = set()
+        for i in self._read_state(state):
+            part = self.hook.status(parts[i])
+            if part and part["length"] == blocks[i][1]:
+                done.add(i)
+
+        def upload_block(i, offset, length):
+            self.hook.write(
+                parts[i],
+                self._read_local(local_path, offset, length),
+                overwrite=True,
+                encoding=None,
+                blocksize=self.block_size,
+            )
+            logging.debug("Uploaded block %s of %s" % (i, local_path))
+
+        self._run(upload_block, blocks, done, state)
+
+        # join blocks to target file
+        if self.hook.status(hdfs_path):
+            self.hook.delete(hdfs_path, recursive=True)
+        self.hook.rename(parts[0], hdfs_path)
+        if len(parts) > 1:
+            self.hook.concat(hdfs_path, parts[1:])
+        os.remove(state)
+
+    def download(self, hdfs_path, local_path, overwrite=True):
+        """
+        Download file or files of directory from HDFS
+        :param hdfs_path:
+        :param local_path:
+        :param overwrite:
+        :return: local path
+        """
+        status = self.hook.status(hdfs_path)
+        if not status:
+            raise IOError("HDFS path %s does not exist" % hdfs_path)
+
+        if status["type"] == "DIRECTORY":
+            if not os.path.exists(local_path):
+                os.makedirs(local_path)
+            for name in self.hook.list(hdfs_path):
+                src = posixpath.join(hdfs_path, name)
+                if self.hook.status(src)["type"] == "FILE":
+                    self._download_file(src, os.path.join(local_path, name), overwrite)
+        else:
+            if os.path.isdir(local_path):
+                local_path = os.path.join(local_path, posixpath.basename(hdfs_path))
+            self._download_file(hdfs_path, local_path, overwrite)
+        return local_path
+
+    def _download_file(self, hdfs_path, local_path, overwrite):
+        """
+        Download file from HDFS in blocks to temporary local file, which
+        replaces the local path when all blocks are finished
+        :param hdfs_path:
+        :param local_path:
+        :param overwrite:
+        :return:
+        """
+        if not overwrite and os.path.exists(local_path):
+            raise IOError("Local path %s already exists" % local_path)
+
+        status = self.hook.status(hdfs_path)
+        size = status["length"]
+        blocks = self._blocks(size)
+        tmp_path = "%s.part" % local_path
+        state = self._state_file(
+            "download",
+            hdfs_path,
+            size,
+            status["modificationTime"],
+            os.path.abspath(local_path),
+            self.block_size,
+        )
+
+        done = self._read_state(state)
+        if not done or not os.path.exists(tmp_path):
+            done = set()
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+
+        def download_block(i, offset, length):
+            if length == 0:
+                return
+            with open(tmp_path, "r+b") as f:
+                f.seek(offset)
+                for chunk in self.hook.read(hdfs_path, offset=offset, length=length):
+                    f.write(chunk)
+            logging.debug("Downloaded block %s of %s" % (i, hdfs_path))
+
+        self._run(download_block, blocks, done, state)
+
+        os.replace(tmp_path, local_path)
+        os.remove(state)
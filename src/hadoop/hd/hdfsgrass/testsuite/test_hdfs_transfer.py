@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+"""
+MODULE:    Test of hdfs_transfer
+PURPOSE:   Test chunked transfers between local file system and HDFS
+           with a fake in-memory HDFS hook
+COPYRIGHT: (C) 2026 by the GRASS Development Team
+
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+"""
+
+import os
+import posixpath
+import shutil
+import sys
+import tempfile
+
+from grass.gunittest.case import TestCase
+from grass.gunittest.main import test
+
+path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+if path not in sys.path:
+    sys.path.append(path)
+
+from hdfs_transfer import ChunkedTransfer
+
+
+class FakeHook:
+    """In-memory HDFS providing the methods used by ChunkedTransfer"""
+
+    def __init__(self):
+        self.files = {}
+        self.block_sizes = {}
+        self.dirs = {"/", "/data"}
+        self.writes = []
+        self.fail = set()
+
+    def status(self, path):
+        if path in self.dirs:
+            return {"type": "DIRECTORY", "length": 0, "modificationTime": 0}
+        if path in self.files:
+            return {
+                "type": "FILE",
+                "length": len(self.files[path]),
+                "modificationTime": 0,
+            }
+        return None
+
+    def list(self, path):
+        return sorted(
+            posixpath.basename(name)
+            for name in list(self.files) + list(self.dirs)
+            if posixpath.dirname(name) == path and name != path
+        )
+
+    def read(self, path, offset=0, length=None):
+        data = self.files[path][offset:]
+        if length is not None:
+            data = data[:length]
+        # yield in small chunks like the WebHDFS reader
+        for start in range(0, len(data), 100):
+            yield data[start : start + 100]
+
+    def write(self, path, data, overwrite=True, encoding="utf-8", blocksize=None):
+        if not overwrite and path in self.files:
+            raise IOError("%s exists" % path)
+        self.writes.append(path)
+        data = b"".join(data)
+        if path in self.fail:
+            self.fail.discard(path)
+            raise IOError("Write of %s failed" % path)
+        self.files[path] = data
+        self.block_sizes[path] = blocksize
+
+    def rename(self, src, dst):
+        self.files[dst] = self.files.pop(src)
+        self.block_sizes[dst] = self.block_sizes.pop(src)
+
+    def delete(self, path, recursive=False):
+        self.block_sizes.pop(path, None)
+        return self.files.pop(path, None) is not None
+
+    def concat(self, path, sources):
+        # HDFS concat accepts only full blocks of the same block size
+        for name in [path] + sources[:-1]:
+            if len(self.files[name]) % self.block_sizes[name]:
+                raise IOError("%s does not consist of full blocks" % name)
+        for name in sources:
+            if self.block_sizes[name] != self.block_sizes[path]:
+                raise IOError("Block size of %s differs" % name)
+            self.files[path] += self.files.pop(name)
+            del self.block_sizes[name]
+
+
+class TestChunkedTransfer(TestCase):
+    """Test uploads and downloads of ChunkedTransfer"""
+
+    block_size = 1024
+
+    def setUp(self):
+        """Create fake HDFS and local temporary directory"""
+        self.hook = FakeHook()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_dir = os.path.join(self.tmp_dir, "state")
+        os.mkdir(self.state_dir)
+        self.transfer = ChunkedTransfer(
+            self.hook,
+            block_size=self.block_size,
+            parallelism=3,
+            state_dir=self.state_dir,
+        )
+
+    def tearDown(self):
+        """Remove local temporary directory"""
+        shutil.rmtree(self.tmp_dir)
+
+    def local_file(self, name, size):
+        """Create local file of given size with non-repeating content"""
+        local_path = os.path.join(self.tmp_dir, name)
+        with open(local_path, "wb") as f:
+            f.write(bytes(i * 7 % 251 for i in range(size)))
+        return local_path
+
+    @staticmethod
+    def read_file(local_path):
+        with open(local_path, "rb") as f:
+            return f.read()
+
+    def test_upload_blocks(self):
+        """Test that a file is split into blocks which are joined in HDFS"""
+        local_path = self.local_file("blocks.bin", 2 * self.block_size + 500)
+        out = self.transfer.upload(local_path, "/data")
+
+        self.assertEqual(out, "/data/blocks.bin")
+        self.assertEqual(self.hook.files[out], self.read_file(local_path))
+        self.assertEqual(
+            sorted(self.hook.writes), ["%s.part-%05d" % (out, i) for i in range(3)]
+        )
+        self.assertEqual(self.hook.block_sizes[out], self.block_size)
+        # block files are joined and state is removed
+        self.assertEqual(list(self.hook.files), [out])
+        self.assertEqual(os.listdir(self.state_dir), [])
+
+    def test_upload_resume(self):
+        """Test that resumed upload writes only the failed block"""
+        local_path = self.local_file("resume.bin", 4 * self.block_size)
+        out = "/data/resume.bin"
+        failed = "%s.part-%05d" % (out, 2)
+        self.hook.fail.add(failed)
+
+        with self.assertRaises(IOError):
+            self.transfer.upload(local_path, out)
+        self.assertNotIn(out, self.hook.files)
+        self.assertEqual(len(self.hook.writes), 4)
+
+        self.hook.writes = []
+        self.transfer.upload(local_path, out)
+        self.assertEqual(self.hook.writes, [failed])
+        self.assertEqual(self.hook.files[out], self.read_file(local_path))
+        self.assertEqual(os.listdir(self.state_dir), [])
+
+    def test_download(self):
+        """Test round trip of a file through HDFS"""
+        local_path = self.local_file("download.bin", 3 * self.block_size + 1)
+        self.transfer.upload(local_path, "/data/download.bin")
+
+        out = self.transfer.download(
+            "/data/download.bin", os.path.join(self.tmp_dir, "copy.bin")
+        )
+        self.assertEqual(self.read_file(out), self.read_file(local_path))
+        self.assertFalse(os.path.exists(out + ".part"))
+        self.assertEqual(os.listdir(self.state_dir), [])
+
+    def test_empty_file(self):
+        """Test upload and download of an empty file"""
+        local_path = self.local_file("empty.bin", 0)
+        out = self.transfer.upload(local_path, "/data/empty.bin")
+        self.assertEqual(self.hook.files[out], b"")
+
+        copy = self.transfer.download(out, os.path.join(self.tmp_dir, "copy.bin"))
+        self.assertEqual(self.read_file(copy), b"")
+        self.assertEqual(os.listdir(self.state_dir), [])
+
+
+if __name__ == "__main__":
+    test()
@@ -1,10 +1,17 @@
 from __future__ import print_function
 
+import atexit
 import sys
 import csv
+import itertools
 import logging
+import os
 import re
+import select
 import subprocess
+import tempfile
+import threading
+import uuid
 
 import pyhs2
 from builtins import zip
@@ -18,6 +25,216 @@ from base_hook import BaseHook
 
 from hdfswrapper.hive_table import HiveSpatial
 
+# persistent Hive CLI sessions and HiveServer2 connections by conn_id
+_cli_sessions = {}
+_hs2_connections = {}
+
+
+@atexit.register
+def _close_pool():
+    for session in _cli_sessions.values():
+        session.close()
+    _cli_sessions.clear()
+    for conn in _hs2_connections.values():
+        conn.close()
+    _hs2_connections.clear()
+
+
+class ResultCursor(object):
+    """
+    Iterator over rows of a query result. Rows are fetched lazily, so the
+    result does not have to fit in memory.
+
+    >>> hh = HiveServer2Hook()
+    >>> cur = hh.stream("SELECT * FROM default.streets")
+    >>> cur.header
+    [('linkid', 'INT_TYPE'), ...]
+    >>> for rows in cur.batches(1000):
+    >>>     print(len(rows))
+    """
+
+    def __init__(self, header, rows):
+        """
+        :param header: list of (column name, column type or None)
+        :param rows: iterator of rows
+        """
+        self.header = header
+        self._rows = rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._rows)
+
+    next = __next__
+
+    def close(self):
+        """
+        Skip remaining rows
+        """
+        for row in self._rows:
+            pass
+
+    def fetchmany(self, size=1000):
+        return list(itertools.islice(self._rows, size))
+
+    def batches(self, size=1000):
+        """
+        Generator of lists of at most size rows
+        """
+        while True:
+            rows = self.fetchmany(size)
+            if not rows:
+                return
+            yield rows
+
+    def to_csv(
+        self,
+        csv_filepath,
+        delimiter=",",
+        lineterminator="\r\n",
+        output_header=True,
+        batch_size=1000,
+    ):
+        """
+        Write rows to CSV file in batches
+        :return: number of written rows
+        """
+        i = 0
+        with open(csv_filepath, "w") as f:
+            writer = csv.writer(f, delimiter=delimiter, lineterminator=lineterminator)
+            if output_header:
+                writer.writerow([col[0] for col in self.header])
+            for rows in self.batches(batch_size):
+                writer.writerows(rows)
+                i += len(rows)
+                logging.info("Written {0} rows so far.".format(i))
+        logging.info("Done. Loaded a total of {0} rows.".format(i))
+        return i
+
+
+class HiveCliSession(object):
+    """
+    Hive CLI process which is kept open for several statements, so that the
+    JVM is started only once. Statements are sent to stdin and the output
+    is read until an end marker echoed after each statement.
+
+    Standard error is read separately and logged, so that warnings of the
+    JVM do not mix with the result. Error messages written to it before
+    the end marker make the statement fail.
+    """
+
+    def __init__(self, hive_cmd, use_beeline, cwd=None):
+        self.use_beeline = use_beeline
+        self.lock = threading.Lock()
+        self.sp = subprocess.Popen(
+            hive_cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            bufsize=0,
+        )
+        self._partial = {self.sp.stdout: b"", self.sp.stderr: b""}
+
+    def alive(self):
+        return self.sp.poll() is None
+
+    def _readlines(self, pipes, timeout=None):
+        """
+        Read output which is available in pipes of the process. Lines of
+        standard error come first, so that messages are known before the
+        end marker on standard output is processed.
+        :param pipes: list of pipes
+        :param timeout: seconds to wait for output, None waits until any
+        :return: list of (pipe, line) or None if stdout is closed
+        """
+        ready, _, _ = select.select(pipes, [], [], timeout)
+        ready.sort(key=lambda pipe: pipe is self.sp.stdout)
+        lines = []
+        for pipe in ready:
+            data = os.read(pipe.fileno(), 65536)
+            if not data:
+                if pipe is self.sp.stdout:
+                    return None
+                continue
+            data = (self._partial[pipe] + data).split(b"\n")
+            self._partial[pipe] = data.pop()
+            lines.extend(
+                (pipe, line.decode("utf-8", "replace").rstrip("\r")) for line in data
+            )
+        return lines
+
+    @staticmethod
+    def _log_stderr(line, errors):
+        """
+        Log line of standard error and record it if it is an error message
+        """
+        if line.startswith(("Error:", "FAILED:")):
+            errors.append(line)
+        logging.debug(line)
+
+    def run(self, hql):
+        """
+        Send statements and return generator of output lines of them. The
+        session is locked until all lines are read. If the generator is
+        closed before, the session is killed, so that no output of the
+        statements is left for the next ones.
+        :param hql: hql statements
+        :return:
+        """
+        marker = "__grass_hive_end_%s__" % uuid.uuid4().hex
+        if self.use_beeline:
+            echo = "!sh echo %s" % marker
+        else:
+            echo = "!echo %s;" % marker
+
+        pipes = [self.sp.stdout, self.sp.stderr]
+        errors = []
+        finished = False
+        self.lock.acquire()
+        try:
+            self.sp.stdin.write(
+                ("%s;\n%s\n" % (hql.strip().rstrip(";"), echo)).encode("utf-8")
+            )
+            self.sp.stdin.flush()
+            while True:
+                lines = self._readlines(pipes)
+                if lines is None:
+                    finished = True
+                    raise Exception("\n".join(errors + ["Hive session terminated"]))
+                for pipe, line in lines:
+                    if pipe is self.sp.stderr:
+                        self._log_stderr(line, errors)
+                    elif line.strip() == marker:
+                        # messages of the statements were written to
+                        # standard error before the marker was echoed
+                        while True:
+                            rest = self._readlines([self.sp.stderr], timeout=0)
+                            if not rest:
+                                break
+                            for _pipe, err_line in rest:
+                                self._log_stderr(err_line, errors)
+                        finished = True
+                        if errors:
+                            raise Exception("\n".join(errors))
+                        return
+                    else:
+                        yield line
+        finally:
+            if not finished:
+                self.kill()
+            self.lock.release()
+
+    def kill(self):
+        if self.alive():
+            self.sp.kill()
+        self.sp.communicate()
+
+    def close(self):
+        self.sp.communicate()
+
 
 class HiveCliHook(BaseHook, HiveSpatial):
     """
@@ -45,9 +262,10 @@ class HiveCliHook(BaseHook, HiveSpatial):
         self.conn = conn
         self.run_as = run_as
 
-    def execute(self, hql, schema=None, verbose=True):
+    def execute(self, hql, schema=None, verbose=True, persistent=False):
         """
-        Run an hql statement using the hive cli
+        Run an hql statement using the hive cli. With persistent, the
+        statement is run in the persistent session of the connection.
 
         >>> hh = HiveCliHook()
         >>> result = hh.execute("USE default;")
@@ -59,7 +277,10 @@ class HiveCliHook(BaseHook, HiveSpatial):
         schema = schema or conn.schema
         if schema:
             hql = "USE {schema};\n{hql}".format(**locals())
-        import tempfile
+
+        if persistent:
+            return "\n".join(self.get_session().run(hql))
+
         import os
 
         tmp_dir = tempfile.gettempdir()
@@ -74,46 +295,11 @@ class HiveCliHook(BaseHook, HiveSpatial):
             f.write(hql)
             f.flush()
             fname = f.name
-            hive_bin = "hive"
-            cmd_extra = []
-
-            if self.use_beeline:
-                hive_bin = "beeline"
-                jdbc_url = "jdbc:hive2://{conn.host}:{conn.port}/{conn.schema}"
-                securityConfig = None
-                if securityConfig == "kerberos":  # TODO make confugration file for thiw
-                    template = conn.extra_dejson.get(
-                        "principal", "hive/_HOST@EXAMPLE.COM"
-                    )
-                    if "_HOST" in template:
-                        template = utils.replace_hostname_pattern(
-                            utils.get_components(template)
-                        )
-
-                    proxy_user = ""
-                    if conn.extra_dejson.get("proxy_user") == "login" and conn.login:
-                        proxy_user = "hive.server2.proxy.user={0}".format(conn.login)
-                    elif conn.extra_dejson.get("proxy_user") == "owner" and self.run_as:
-                        proxy_user = "hive.server2.proxy.user={0}".format(self.run_as)
-
-                    jdbc_url += ";principal={template};{proxy_user}"
-                elif self.auth:
-                    jdbc_url += ";auth=" + self.auth
-
-                jdbc_url = jdbc_url.format(**locals())
-
-                cmd_extra += ["-u", jdbc_url]
-                if conn.login:
-                    cmd_extra += ["-n", conn.login]
-                if conn.password:
-                    cmd_extra += ["-p", conn.password]
+            hive_bin, cmd_extra = self._get_cli_cmd()
 
             hive_cmd = [hive_bin, "-f", fname] + cmd_extra
             hive_cmd = [hive_bin, "-e", hql] + cmd_extra
 
-            if self.hive_cli_params:
-                hive_params_list = self.hive_cli_params.split()
-                hive_cmd.extend(hive_params_list)
             if verbose:
                 logging.info(" ".join(hive_cmd))
 
@@ -135,6 +321,91 @@ class HiveCliHook(BaseHook, HiveSpatial):
 
             return stdout
 
+    def _get_cli_cmd(self):
+        """
+        Return hive binary and its arguments for the connection
+        """
+        conn = self.conn
+        hive_bin = "hive"
+        cmd_extra = []
+
+        if self.use_beeline:
+            hive_bin = "beeline"
+            jdbc_url = "jdbc:hive2://{conn.host}:{conn.port}/{conn.schema}"
+            securityConfig = None
+            if securityConfig == "kerberos":  # TODO make confugration file for thiw
+                template = conn.extra_dejson.get("principal", "hive/_HOST@EXAMPLE.COM")
+                if "_HOST" in template:
+                    template = utils.replace_hostname_pattern(
+                        utils.get_components(template)
+                    )
+
+                proxy_user = ""
+                if conn.extra_dejson.get("proxy_user") == "login" and conn.login:
+                    proxy_user = "hive.server2.proxy.user={0}".format(conn.login)
+                elif conn.extra_dejson.get("proxy_user") == "owner" and self.run_as:
+                    proxy_user = "hive.server2.proxy.user={0}".format(self.run_as)
+
+                jdbc_url += ";principal={template};{proxy_user}"
+            elif self.auth:
+                jdbc_url += ";auth=" + self.auth
+
+            jdbc_url = jdbc_url.format(**locals())
+
+            cmd_extra += ["-u", jdbc_url]
+            if conn.login:
+                cmd_extra += ["-n", conn.login]
+            if conn.password:
+                cmd_extra += ["-p", conn.password]
+
+        if self.hive_cli_params:
+            cmd_extra.extend(self.hive_cli_params.split())
+
+        return hive_bin, cmd_extra
+
+    def get_session(self):
+        """
+        Return persistent Hive CLI session of the connection from the pool.
+        The session is started on first use and reused by later statements.
+        """
+        session = _cli_sessions.get(self.conn.conn_id)
+        if session is None or not session.alive():
+            hive_bin, cmd_extra = self._get_cli_cmd()
+            if self.use_beeline:
+                cmd_extra += [
+                    "--silent=true",
+                    "--outputformat=tsv2",
+                    "--showHeader=true",
+                ]
+            else:
+                cmd_extra += ["-S", "--hiveconf", "hive.cli.print.header=true"]
+            session = HiveCliSession(
+                [hive_bin] + cmd_extra, self.use_beeline, cwd=tempfile.gettempdir()
+            )
+            _cli_sessions[self.conn.conn_id] = session
+        return session
+
+    def stream(self, hql, schema=None):
+        """
+        Run an hql query in the persistent session and return cursor over
+        rows of its result. The cursor must be consumed or closed before
+        the session runs other statements.
+
+        >>> hh = HiveCliHook()
+        >>> cur = hh.stream("SELECT * FROM streets")
+        >>> cur.to_csv("/tmp/streets.csv")
+        """
+        schema = schema or self.conn.schema
+        session = self.get_session()
+        if schema:
+            for line in session.run("USE %s" % schema):
+                logging.info(line)
+
+        lines = session.run(hql)
+        header = next(lines, None)
+        header = [(col, None) for col in header.split("\t")] if header else []
+        return ResultCursor(header, (line.split("\t") for line in lines))
+
     def show_tables(self):
         return self.execute("show tables")
 
@@ -391,6 +662,44 @@ class HiveServer2Hook(BaseHook, HiveSpatial):
             database=str(db.schema),
         )
 
+    def get_session(self):
+        """
+        Return persistent connection from the pool. The connection is opened
+        on first use and reused by later queries.
+        """
+        conn = _hs2_connections.get(self.hiveserver2_conn_id)
+        if conn is None:
+            conn = self.get_conn()
+            _hs2_connections[self.hiveserver2_conn_id] = conn
+        return conn
+
+    def stream(self, hql, schema="default", arraysize=1000):
+        """
+        Run an hql query using the persistent connection and return cursor
+        over rows of its result, which are fetched in batches of arraysize
+
+        >>> hh = HiveServer2Hook()
+        >>> cur = hh.stream("SELECT * FROM default.streets")
+        >>> cur.to_csv("/tmp/streets.csv")
+        """
+        cur = self.get_session().cursor()
+        logging.info("Running query: " + hql)
+        if schema:
+            cur.execute("USE %s" % schema)
+        cur.execute(hql)
+        header = [(c["columnName"], c["type"]) for c in cur.getSchema() or []]
+
+        def rows():
+            try:
+                while cur.hasMoreRows:
+                    for row in cur.fetchmany(arraysize):
+                        if row:
+                            yield row
+            finally:
+                cur.close()
+
+        return ResultCursor(header, rows())
+
     def get_results(self, hql, schema="default", arraysize=1000):
 
         with self.get_conn() as conn:
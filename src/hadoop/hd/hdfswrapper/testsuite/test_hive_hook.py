@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""
+MODULE:    Test of hive_hook
+PURPOSE:   Test result cursors and persistent Hive CLI sessions with a fake
+           Hive CLI process
+COPYRIGHT: (C) 2026 by the GRASS Development Team
+
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+"""
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+
+from grass.gunittest.case import TestCase
+from grass.gunittest.main import test
+
+for path in (os.pardir, os.path.join(os.pardir, os.pardir)):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    if path not in sys.path:
+        sys.path.append(path)
+
+import hive_hook
+from hive_hook import HiveCliHook, HiveCliSession, ResultCursor
+
+# Fake Hive CLI: "SELECT n" prints a header and n rows, "FAIL" prints an
+# error message, warnings are written to standard error like log4j does
+FAKE_HIVE = """
+import sys
+
+for line in sys.stdin:
+    line = line.strip().rstrip(";")
+    if line.startswith(("!echo ", "!sh echo ")):
+        sys.stdout.write(line.split()[-1] + "\\n")
+    elif line.startswith("SELECT"):
+        sys.stderr.write("WARN: log4j warning before the result\\n")
+        sys.stderr.flush()
+        sys.stdout.write("n\\tsquare\\n")
+        for i in range(int(line.split()[1])):
+            sys.stdout.write("%d\\t%d\\n" % (i, i * i))
+        sys.stdout.flush()
+        sys.stderr.write("SLF4J: Class path contains multiple bindings\\n")
+    elif line.startswith("FAIL"):
+        sys.stdout.write("partial output\\n")
+        sys.stdout.flush()
+        sys.stderr.write("FAILED: SemanticException Table not found\\n")
+    sys.stdout.flush()
+    sys.stderr.flush()
+"""
+
+
+class FakeConnection(object):
+    conn_id = "fake_hive_cli"
+    schema = None
+
+
+class TestResultCursor(TestCase):
+    """Test iteration over rows of ResultCursor"""
+
+    header = [("n", None), ("square", None)]
+
+    def cursor(self, n):
+        return ResultCursor(self.header, ([str(i), str(i * i)] for i in range(n)))
+
+    def test_iterate(self):
+        """Test that all rows are iterated"""
+        cur = self.cursor(3)
+        self.assertEqual(cur.header, self.header)
+        self.assertEqual(list(cur), [["0", "0"], ["1", "1"], ["2", "4"]])
+
+    def test_batches(self):
+        """Test that rows are split into batches of at most size rows"""
+        cur = self.cursor(5)
+        self.assertEqual(cur.fetchmany(1), [["0", "0"]])
+        self.assertEqual([len(rows) for rows in cur.batches(3)], [3, 1])
+        self.assertEqual(cur.fetchmany(1), [])
+
+    def test_close(self):
+        """Test that close skips remaining rows"""
+        cur = self.cursor(5)
+        next(cur)
+        cur.close()
+        self.assertEqual(list(cur), [])
+
+    def test_to_csv(self):
+        """Test that header and rows are written to CSV"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            csv_file = os.path.join(tmp_dir, "result.csv")
+            self.assertEqual(self.cursor(4).to_csv(csv_file, batch_size=3), 4)
+            with open(csv_file) as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(rows[0], ["n", "square"])
+            self.assertEqual(rows[1:], [[str(i), str(i * i)] for i in range(4)])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class TestHiveCliSession(TestCase):
+    """Test statements run in a persistent session of a fake Hive CLI"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Write the fake Hive CLI"""
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.fake_hive = os.path.join(cls.tmp_dir, "fake_hive.py")
+        with open(cls.fake_hive, "w") as f:
+            f.write(FAKE_HIVE)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the fake Hive CLI"""
+        shutil.rmtree(cls.tmp_dir)
+
+    def setUp(self):
+        """Start a session of the fake Hive CLI"""
+        self.session = HiveCliSession(
+            [sys.executable, self.fake_hive], use_beeline=False
+        )
+
+    def tearDown(self):
+        """Stop the session"""
+        self.session.close()
+        hive_hook._cli_sessions.pop(FakeConnection.conn_id, None)
+
+    def test_run(self):
+        """Test that standard error is not part of the output"""
+        lines = list(self.session.run("SELECT 2"))
+        self.assertEqual(lines, ["n\tsquare", "0\t0", "1\t1"])
+        self.assertEqual(list(self.session.run("USE default")), [])
+
+    def test_error(self):
+        """Test that a failed statement leaves no output for the next one"""
+        with self.assertRaises(Exception) as context:
+            list(self.session.run("FAIL"))
+        self.assertIn("SemanticException", str(context.exception))
+        self.assertTrue(self.session.alive())
+        self.assertEqual(list(self.session.run("SELECT 1")), ["n\tsquare", "0\t0"])
+
+    def test_close_early(self):
+        """Test that a session is killed if its output is not read to the
+        end"""
+        lines = self.session.run("SELECT 1000")
+        self.assertEqual(next(lines), "n\tsquare")
+        lines.close()
+        self.assertFalse(self.session.alive())
+
+    def test_stream(self):
+        """Test that the header of a streamed result is the first line of
+        standard output"""
+        hook = HiveCliHook.__new__(HiveCliHook)
+        hook.conn = FakeConnection()
+        hive_hook._cli_sessions[FakeConnection.conn_id] = self.session
+
+        cur = hook.stream("SELECT 3")
+        self.assertEqual(cur.header, [("n", None), ("square", None)])
+        self.assertEqual(list(cur), [["0", "0"], ["1", "1"], ["2", "4"]])
+
+        # a cursor closed early is skipped, so the session can be reused
+        cur = hook.stream("SELECT 10")
+        next(cur)
+        cur.close()
+        self.assertEqual(list(hook.stream("SELECT 1")), [["0", "0"]])
+
+
+if __name__ == "__main__":
+    test()
@@ -2,6 +2,7 @@ import logging
 import os
 
 from hdfs import InsecureClient, HdfsError
+from hdfs.client import _Request
 
 from base_hook import BaseHook
 
@@ -134,16 +135,95 @@ class WebHDFSHook(BaseHook):
 
         logging.debug("Mkdir file {} ".format(path))
 
-    def write(self, fs, hdfs, **kwargs):
+    def is_dir(self, hdfs_path):
+        """
+        Check if path in HDFS is an existing directory.
+        """
+        c = self.get_conn()
+        status = c.status(hdfs_path, strict=False)
+        return bool(status) and status["type"] == "DIRECTORY"
+
+    def status(self, hdfs_path):
+        """
+        Return FileStatus of path in HDFS or None if it does not exist.
+        """
+        c = self.get_conn()
+        return c.status(hdfs_path, strict=False)
+
+    def list(self, hdfs_path):
+        """
+        Return names of files and directories in HDFS directory.
+        """
+        c = self.get_conn()
+        return c.list(hdfs_path)
+
+    def read(self, hdfs_path, offset=0, length=None, chunk_size=2**20):
+        """
+        Read part of a file in HDFS
+        :param hdfs_path: HDFS path
+        :type hdfs_path: str
+        :param offset: Starting byte position.
+        :type offset: int
+        :param length: Number of bytes to read, None reads until the end
+        :type length: int
+        :param chunk_size: Size of the yielded chunks in bytes
+        :type chunk_size: int
+        :return: Generator of chunks of bytes
+        """
+        c = self.get_conn()
+        with c.read(
+            hdfs_path, offset=offset, length=length, chunk_size=chunk_size
+        ) as reader:
+            for chunk in reader:
+                yield chunk
+
+    def rename(self, hdfs_src_path, hdfs_dst_path):
+        c = self.get_conn()
+        c.rename(hdfs_src_path, hdfs_dst_path)
+
+        logging.debug("Renamed {} to {}".format(hdfs_src_path, hdfs_dst_path))
+
+    def delete(self, hdfs_path, recursive=False):
+        c = self.get_conn()
+        return c.delete(hdfs_path, recursive=recursive)
+
+    def concat(self, hdfs_path, sources):
+        """
+        Append files in HDFS to an existing file and remove them (WebHDFS
+        CONCAT operation, which is not exposed by the hdfscli client).
+        :param hdfs_path: Target HDFS path
+        :type hdfs_path: str
+        :param sources: HDFS paths of files to append, in the same directory
+          as the target
+        :type sources: list
+        """
+        c = self.get_conn()
+        concat = _Request("POST").to_method("CONCAT")
+        concat(c, hdfs_path, sources=",".join(c.resolve(src) for src in sources))
+
+        logging.debug("Concatenated {} files to {}".format(len(sources), hdfs_path))
+
+    def write(self, hdfs, data, overwrite=True, encoding="utf-8", **kwargs):
+        """
+        Write data to a file in HDFS without a local copy
+        :param hdfs: Target HDFS path
+        :type hdfs: str
+        :param data: String or iterable of strings (e.g. generator) which are
+          streamed to HDFS as they come
+        :param overwrite: Overwrite existing file.
+        :type overwrite: bool
+        :param encoding: Encoding of strings, None to write bytes
+        :type encoding: str
+        :param \*\*kwargs: Keyword arguments forwarded to :meth:`write`.
+        """
         client = self.get_conn()
+        if isinstance(data, (str, bytes)):
+            data = [data]
 
-        client.delete(hdfs, recursive=True)
-        model = {
-            "(intercept)": 48.0,
-            "first_feature": 2.0,
-            "second_feature": 12.0,
-        }
+        with client.write(
+            hdfs, encoding=encoding, overwrite=overwrite, **kwargs
+        ) as writer:
+            for chunk in data:
+                writer.write(chunk)
 
-        with client.write(hdfs, encoding="utf-8") as writer:
-            for item in model.items():
-                writer.write("%s,%s\n" % item)
+        logging.debug("Written file {} ".format(hdfs))
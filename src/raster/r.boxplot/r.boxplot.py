@@ -279,16 +279,52 @@
 # % requires: -s, zones
 # %end
 
+# %option
+# % key: engine
+# % type: string
+# % label: Engine to compute the statistics
+# % description: The stream engine reads the input and zonal rasters once, without setting a MASK or creating temporary maps
+# % options: modules,stream
+# % descriptions: modules;compute the statistics and outliers with GRASS modules;stream;compute the statistics and outliers in a single pass over the rasters
+# % answer: modules
+# % required: no
+# % guisection: Statistics
+# %end
+
+# %option
+# % key: bins
+# % type: integer
+# % label: Number of bins (stream engine)
+# % description: Compute approximate quantiles from a histogram with this number of bins per zone instead of exact quantiles
+# % required: no
+# % guisection: Statistics
+# %end
+
+# %option
+# % key: max_outliers
+# % type: integer
+# % label: Maximum number of outliers (stream engine)
+# % description: Maximum number of lowest and of highest outliers kept per zone
+# % answer: 1000
+# % required: no
+# % guisection: Statistics
+# %end
+
 
 import atexit
 import sys
 import uuid
 from subprocess import PIPE
 
+import numpy as np
+
 import grass.script as gs
+from grass.pygrass.gis.region import Region
 from grass.pygrass.modules import Module
+from grass.pygrass.raster import RasterRow
 
 clean_maps = []
+CNULL = -2147483648  # null value for CELL maps
 
 
 def lazy_import_py_modules():
@@ -560,8 +596,19 @@ def bx_zonal_stats(zones, name, bx_sort):
     quantstats_str = quantstats_str.replace("\r", "").split("\n")
     quantstats_str = [_f for _f in quantstats_str if _f]
 
-    # Ordering boxplots
     quantstats = [list(map(float, _x.split(":"))) for _x in quantstats_str[1:]]
+    return quantstats, order_boxplots(quantstats, bx_sort)
+
+
+def order_boxplots(quantstats, bx_sort):
+    """Order the boxplots based on their median values
+
+    :param list quantstats: matrix of zonal stats
+    :param str bx_sort: sort order (ascending, descending or none)
+
+    :return list ordered_list: list with the order of the boxplots
+    """
+    # Ordering boxplots
     ids = []
     medians = []
     for zone_id, value in enumerate(quantstats):
@@ -573,7 +620,7 @@ def bx_zonal_stats(zones, name, bx_sort):
         ordered_list = [i for _, i in sorted(zip(medians, ids), reverse=False)]
     else:
         ordered_list = list(range(0, len(quantstats)))
-    return quantstats, ordered_list
+    return ordered_list
 
 
 def get_bx_stats(quantstats_i, whisker_range):
@@ -630,6 +677,18 @@ def compute_notch(rastername, quant2, iqr):
         "r.univar", flags=["g", "t"], map=rastername, stdout_=PIPE
     ).outputs.stdout
     n_values = int(univar.replace("\r", "").split("\n")[1].split("|")[0])
+    return notch_limits(quant2, iqr, n_values)
+
+
+def notch_limits(quant2, iqr, n_values):
+    """Compute notches of boxplots from the number of values
+
+    :param float quant2: 2nd quantile
+    :param float iqr: interquartile range
+    :param int n_values: number of values
+
+    :return list: list with lower and upper notch value
+    """
     lower_notch = quant2 - 1.57 * (iqr / n_values**0.5)
     upper_notch = quant2 + 1.57 * (iqr / n_values**0.5)
     return [lower_notch, upper_notch]
@@ -715,6 +774,281 @@ def compute_outliers(
     return fliers, vectornames
 
 
+def get_row_or_nan(raster, row_num):
+    """Read row of raster as float array with nan for null cells
+
+    :param raster: open RasterRow
+    :param int row_num: row number
+
+    :return array: row values
+    """
+    row = np.array(raster.get_row(row_num), dtype=np.float64)
+    if raster.mtype == "CELL":
+        row[row == CNULL] = np.nan
+    return row
+
+
+def keep_tails(zones, values, cells, max_outliers):
+    """Keep per zone the max_outliers lowest and highest values
+
+    :param array zones: zone of the values
+    :param array values: values
+    :param array cells: cell index (row * cols + col) of the values
+    :param int max_outliers: number of values kept at each tail
+
+    :return tuple: zones, values and cells of the kept values
+    """
+    order = np.lexsort((values, zones))
+    zones, values, cells = zones[order], values[order], cells[order]
+    _, start, count = np.unique(zones, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(start.size), count)
+    rank = np.arange(zones.size) - start[group]
+    keep = (rank < max_outliers) | (rank >= count[group] - max_outliers)
+    return zones[keep], values[keep], cells[keep]
+
+
+def sorted_quantiles(values, start, count, percentiles):
+    """Quantiles (linear interpolation between closest ranks) of the groups
+    of a sorted array
+
+    :param array values: values sorted by group and value
+    :param array start: start index of the groups
+    :param array count: number of values in the groups
+    :param list percentiles: percentiles
+
+    :return array: quantiles (groups x percentiles)
+    """
+    quants = np.empty((start.size, len(percentiles)))
+    for i, perc in enumerate(percentiles):
+        pos = (count - 1) * perc / 100.0
+        lower = np.floor(pos).astype(int)
+        upper = np.minimum(lower + 1, count - 1)
+        frac = pos - lower
+        quants[:, i] = (1 - frac) * values[start + lower] + frac * values[start + upper]
+    return quants
+
+
+def histogram_quantiles(hist, edges, count, minima, maxima, percentiles):
+    """Approximate quantiles from histograms, interpolating linearly within
+    the bins
+
+    :param array hist: histograms (groups x bins)
+    :param array edges: bin edges
+    :param array count: number of values in the groups
+    :param array minima: minimum of the groups
+    :param array maxima: maximum of the groups
+    :param list percentiles: percentiles
+
+    :return array: quantiles (groups x percentiles)
+    """
+    cumulative = np.cumsum(hist, axis=1)
+    quants = np.empty((hist.shape[0], len(percentiles)))
+    for i, perc in enumerate(percentiles):
+        target = count * perc / 100.0
+        idx = np.array(
+            [np.searchsorted(cum, t) for cum, t in zip(cumulative, target)]
+        ).clip(0, hist.shape[1] - 1)
+        groups = np.arange(hist.shape[0])
+        before = cumulative[groups, idx] - hist[groups, idx]
+        frac = np.where(
+            hist[groups, idx] > 0,
+            (target - before) / np.maximum(hist[groups, idx], 1),
+            0,
+        )
+        quants[:, i] = edges[idx] + frac * (edges[idx + 1] - edges[idx])
+    # the extremes are known exactly
+    return np.clip(quants, minima[:, None], maxima[:, None])
+
+
+def stream_stats(value_raster, zones_raster, whisker_range, bins, max_outliers):
+    """Compute boxplot statistics and outliers per zone in a single pass
+    over the rows of the value and zonal rasters. The MASK and the region
+    are respected by reading the rasters, so no temporary maps are needed.
+
+    :param str value_raster: name of the value raster
+    :param str zones_raster: name of the zonal raster (or None)
+    :param float whisker_range: wisker range
+    :param int bins: number of bins for approximate quantiles
+                     (0 for exact quantiles)
+    :param int max_outliers: maximum number of lowest and highest
+                             outliers kept per zone
+
+    :return dict: quantstats (zone, min, q1, q2, q3, max per zone), counts,
+                  outliers (array of values and coordinates per zone) and
+                  raster quantiles (min, q1, q2, q3, max of all values)
+    """
+    region = Region()
+    percentiles = [0, 25, 50, 75, 100]
+    if bins:
+        info = gs.raster_info(value_raster)
+        edges = np.linspace(float(info["min"]), float(info["max"]), bins + 1)
+        histograms = {}
+    else:
+        all_zones, all_values = [], []
+    tails = [np.empty(0, dtype=int), np.empty(0), np.empty(0, dtype=int)]
+    buffered = []
+
+    rasters = [RasterRow(value_raster)]
+    if zones_raster:
+        rasters.append(RasterRow(zones_raster))
+    try:
+        for rast in rasters:
+            rast.open()
+        for row in range(region.rows):
+            gs.percent(row, region.rows, 5)
+            values = get_row_or_nan(rasters[0], row)
+            if zones_raster:
+                zones = get_row_or_nan(rasters[1], row)
+            else:
+                zones = np.zeros(values.size)
+            valid = ~np.isnan(values) & ~np.isnan(zones)
+            cols = np.flatnonzero(valid)
+            if cols.size == 0:
+                continue
+            values = values[valid]
+            zones = zones[valid].astype(int)
+            if bins:
+                idx = np.searchsorted(edges, values, side="right") - 1
+                idx = idx.clip(0, bins - 1)
+                for zone in np.unique(zones):
+                    hist = np.bincount(idx[zones == zone], minlength=bins)
+                    if zone in histograms:
+                        histograms[zone] += hist
+                    else:
+                        histograms[zone] = hist
+            else:
+                all_zones.append(zones)
+                all_values.append(values)
+            buffered.append((zones, values, row * region.cols + cols))
+            if sum(len(b[0]) for b in buffered) > 10 * max_outliers + 2**20:
+                tails = keep_tails(
+                    *[
+                        np.concatenate([t] + [b[i] for b in buffered])
+                        for i, t in enumerate(tails)
+                    ],
+                    max_outliers,
+                )
+                buffered = []
+        gs.percent(1, 1, 1)
+    finally:
+        for rast in rasters:
+            if rast.is_open():
+                rast.close()
+
+    tail_zones, tail_values, tail_cells = keep_tails(
+        *[np.concatenate([t] + [b[i] for b in buffered]) for i, t in enumerate(tails)],
+        max_outliers,
+    )
+    if tail_zones.size == 0:
+        gs.fatal(_("There are no cells with values"))
+    zone_ids, tail_start, tail_count = np.unique(
+        tail_zones, return_index=True, return_counts=True
+    )
+    minima = tail_values[tail_start]
+    maxima = tail_values[tail_start + tail_count - 1]
+
+    # Quantiles per zone and of the whole raster
+    if bins:
+        hist = np.array([histograms[zone] for zone in zone_ids])
+        counts = hist.sum(axis=1)
+        quants = histogram_quantiles(hist, edges, counts, minima, maxima, percentiles)
+        raster_quants = histogram_quantiles(
+            hist.sum(axis=0)[None, :],
+            edges,
+            counts.sum(keepdims=True),
+            minima.min(keepdims=True),
+            maxima.max(keepdims=True),
+            percentiles,
+        )[0]
+    else:
+        all_zones = np.concatenate(all_zones)
+        all_values = np.concatenate(all_values)
+        order = np.lexsort((all_values, all_zones))
+        start, counts = np.unique(
+            all_zones[order], return_index=True, return_counts=True
+        )[1:]
+        quants = sorted_quantiles(all_values[order], start, counts, percentiles)
+        all_values.sort()
+        raster_quants = sorted_quantiles(
+            all_values, np.array([0]), np.array([all_values.size]), percentiles
+        )[0]
+
+    # Outliers per zone from the lowest and highest values
+    quantstats = []
+    outliers = []
+    for i, zone in enumerate(zone_ids):
+        quantstats_i = [zone] + list(quants[i])
+        quantstats.append(quantstats_i)
+        stats = get_bx_stats(quantstats_i, whisker_range)
+        tail = slice(tail_start[i], tail_start[i] + tail_count[i])
+        values, cells = tail_values[tail], tail_cells[tail]
+        lower = values < stats[6]
+        upper = values > stats[7]
+        if tail_count[i] == 2 * max_outliers and (
+            lower.sum() >= max_outliers or upper.sum() >= max_outliers
+        ):
+            gs.warning(
+                _(
+                    "Zone {}: only the {} most extreme outliers at each side are kept"
+                ).format(zone, max_outliers)
+            )
+        cells = cells[lower | upper]
+        rows, cols = np.divmod(cells, region.cols)
+        outliers.append(
+            np.column_stack(
+                [
+                    values[lower | upper],
+                    region.west + (cols + 0.5) * region.ewres,
+                    region.north - (rows + 0.5) * region.nsres,
+                ]
+            )
+        )
+    return {
+        "quantstats": quantstats,
+        "counts": counts,
+        "outliers": outliers,
+        "raster_quantiles": raster_quants,
+    }
+
+
+def write_outliers(name, stats, value_name, zones_name=None):
+    """Write the outliers of stream_stats to a point vector map
+
+    :param str name: name of the output vector map
+    :param dict stats: output of stream_stats
+    :param str value_name: name of the value raster
+    :param str zones_name: name of the zonal raster (or None)
+    """
+    lines = []
+    for quantstats_i, outliers_i in zip(stats["quantstats"], stats["outliers"]):
+        for value, x, y in outliers_i:
+            line = [x, y, len(lines) + 1, value]
+            if zones_name:
+                line.append(int(quantstats_i[0]))
+            lines.append("|".join(str(v) for v in line))
+    if not lines:
+        gs.message(_("\n--> There are no outliers"))
+        return
+    columns = "x double precision, y double precision, cat integer, {} double precision".format(
+        strip_mapset(value_name)
+    )
+    if zones_name:
+        columns += ", {} integer".format(strip_mapset(zones_name))
+    gs.write_command(
+        "v.in.ascii",
+        input="-",
+        output=name,
+        separator="pipe",
+        x=1,
+        y=2,
+        cat=3,
+        columns=columns,
+        stdin="\n".join(lines),
+        quiet=True,
+    )
+    gs.message("Point vector map '{}' created".format(name))
+
+
 def bxp_nozones_stats(rastername, whisker_range):
     """Compute boxplot statistics
 
@@ -775,6 +1109,17 @@ def bxp_nozones(opt):
     """
 
     # Compute boxplot stats
+    if opt["engine"] == "stream":
+        stats = stream_stats(
+            opt["value_raster"],
+            None,
+            opt["whisker_range"],
+            opt["bins"],
+            opt["max_outliers"],
+        )
+        bx_stats = get_bx_stats(stats["quantstats"][0], opt["whisker_range"])
+    else:
+        bx_stats = bxp_nozones_stats(opt["value_raster"], opt["whisker_range"])
     (
         min_value,
         quant1,
@@ -784,16 +1129,22 @@ def bxp_nozones(opt):
         iqr,
         lower_whisker,
         upper_whisker,
-    ) = bxp_nozones_stats(opt["value_raster"], opt["whisker_range"])
+    ) = bx_stats
 
     # Compute notch limits
-    if bool(opt["notch"]):
+    if bool(opt["notch"]) and opt["engine"] == "stream":
+        lower_notch, upper_notch = notch_limits(quant2, iqr, stats["counts"][0])
+    elif bool(opt["notch"]):
         lower_notch, upper_notch = compute_notch(opt["value_raster"], quant2, iqr)
     else:
         lower_notch = upper_notch = ""
 
     # Compute outliers
-    if bool(opt["outliers"]):
+    if bool(opt["outliers"]) and opt["engine"] == "stream":
+        fliers = list(stats["outliers"][0][:, 0])
+        if opt["name_outliers_map"]:
+            write_outliers(opt["name_outliers_map"], stats, opt["value_name"])
+    elif bool(opt["outliers"]):
         fliers, vect_name = compute_outliers(
             opt["value_raster"],
             min_value,
@@ -808,7 +1159,7 @@ def bxp_nozones(opt):
     else:
         fliers = []
 
-    if opt["name_outliers_map"] and bool(fliers):
+    if opt["name_outliers_map"] and bool(fliers) and opt["engine"] != "stream":
         print(vect_name)
         Module("v.db.dropcolumn", map=vect_name[0], columns=["value", "label"])
         Module("g.rename", vector=[vect_name[0], opt["name_outliers_map"]])
@@ -897,15 +1248,30 @@ def bxp_zones(opt):
     # Get labels
     labels, labelsids = bx_labels(opt["zones_raster"])
 
+    # Compute statistics
+    if opt["engine"] == "stream":
+        stats = stream_stats(
+            opt["value_raster"],
+            opt["zones_raster"],
+            opt["whisker_range"],
+            opt["bins"],
+            opt["max_outliers"],
+        )
+        quantstats = stats["quantstats"]
+        ordered_list = order_boxplots(quantstats, opt["bx_sort"])
+        # Match labels with the zones with values
+        zone_labels = dict(zip(labelsids, labels))
+        labelsids = [int(_x[0]) for _x in quantstats]
+        labels = [zone_labels.get(_x, str(_x)) for _x in labelsids]
+    else:
+        quantstats, ordered_list = bx_zonal_stats(
+            opt["zones_raster"], opt["value_raster"], opt["bx_sort"]
+        )
+
     # Get colors
     if opt["bx_zonalcolors"]:
         zones_rgb, txt_rgb = get_zonalcolors(opt["zones_raster"], labelsids)
 
-    # Compute statistics
-    quantstats, ordered_list = bx_zonal_stats(
-        opt["zones_raster"], opt["value_raster"], opt["bx_sort"]
-    )
-
     # Change the order of the colors of the boxplots and median to match the
     # order in which the boxplots will be plottted
     if opt["bx_zonalcolors"]:
@@ -932,13 +1298,17 @@ def bxp_zones(opt):
         ) = get_bx_stats(quantstats[i], opt["whisker_range"])
 
         # Compute notch limits
-        if opt["notch"]:
+        if opt["notch"] and opt["engine"] == "stream":
+            lower_notch, upper_notch = notch_limits(quant2, iqr, stats["counts"][i])
+        elif opt["notch"]:
             lower_notch, upper_notch = compute_notch(opt["value_raster"], quant2, iqr)
         else:
             lower_notch = upper_notch = ""
 
         # Compute outliers
-        if opt["outliers"]:
+        if opt["outliers"] and opt["engine"] == "stream":
+            fliers = list(stats["outliers"][i][:, 0])
+        elif opt["outliers"]:
             fliers, vectornames = compute_outliers(
                 opt["value_raster"],
                 min_value,
@@ -974,7 +1344,11 @@ def bxp_zones(opt):
         boxes.append(dict_i)
 
     # Save outlier vector layer
-    if bool(opt["name_outliers_map"]) and bool(vectornames):
+    if bool(opt["name_outliers_map"]) and opt["engine"] == "stream":
+        write_outliers(
+            opt["name_outliers_map"], stats, opt["value_name"], opt["zones_name"]
+        )
+    elif bool(opt["name_outliers_map"]) and bool(vectornames):
         if len(vectornames) == 1:
             Module("g.rename", vector=[vectornames[0], opt["name_outliers_map"]])
         else:
@@ -1012,9 +1386,13 @@ def bxp_zones(opt):
     _, ax = plt.subplots(figsize=opt["dimensions"])
 
     # Draw raster statistics
+    if bool(opt["plot_rast_stats"]) and opt["engine"] == "stream":
+        rast_quantiles = stats["raster_quantiles"]
+    elif bool(opt["plot_rast_stats"]):
+        rast_quantiles = raster_stats(name=opt["value_raster"])
     rast_median_alpha = min(1, opt["raster_stat_alpha"] + 0.1)
     if bool(opt["plot_rast_stats"]) and bool(opt["vertical"]):
-        _, quant1_r, quant2_r, quant3_r, _ = raster_stats(name=opt["value_raster"])
+        _, quant1_r, quant2_r, quant3_r, _ = rast_quantiles
         plot_rast_stats_l = opt["plot_rast_stats"].split(",")
         if "IQR" in plot_rast_stats_l:
             ax.axhspan(
@@ -1035,7 +1413,7 @@ def bxp_zones(opt):
                 linewidth=opt["median_lw"],
             )
     elif bool(opt["plot_rast_stats"]):
-        _, quant1_r, quant2_r, quant3_r, _ = raster_stats(name=opt["value_raster"])
+        _, quant1_r, quant2_r, quant3_r, _ = rast_quantiles
         plot_rast_stats_l = opt["plot_rast_stats"].split(",")
         if "IQR" in plot_rast_stats_l:
             ax.axvspan(
@@ -1153,9 +1531,15 @@ def main(options, flags):
     # raster stats
     raster_stat_color = get_valid_color(options["raster_stat_color"])
 
+    # The stream engine reads the rasters in the current region, respecting
+    # the mask, so no temporary rasters are needed
+    engine = options["engine"]
+    value_raster = options["input"]
+    mask_present = False
+
     # Create new value rasters if there is a mask or the value raster
     # extent and resolution do not match that of the current region
-    if bool(options["zones"]):
+    if bool(options["zones"]) and engine == "modules":
         mask_present = checkmask()
         valueraster_region = check_regionraster_match(options["input"])
         if mask_present or not valueraster_region:
@@ -1168,7 +1552,7 @@ def main(options, flags):
 
     # Create temporary zonal rasters if there is a mask or the zonal raster
     # extent and resolution do not match that of the current region
-    if bool(options["zones"]):
+    if bool(options["zones"]) and engine == "modules":
         zonalraster_region = check_regionraster_match(options["zones"])
         if mask_present or not zonalraster_region:
             zonal_raster = create_temporary_name("tmpinput")
@@ -1182,6 +1566,8 @@ def main(options, flags):
         if mask_present:
             backup_mask = create_temporary_name("maskbackup")
             Module("g.rename", raster=["MASK", backup_mask])
+    elif bool(options["zones"]):
+        zonal_raster = options["zones"]
 
     # Collect options
     base_options = {
@@ -1207,6 +1593,9 @@ def main(options, flags):
         "mask_present": mask_present,
         "median_lw": float(options["median_lw"]),
         "median_color": median_color,
+        "engine": engine,
+        "bins": int(options["bins"]) if options["bins"] else 0,
+        "max_outliers": int(options["max_outliers"]),
     }
     if bool(options["zones"]):
         zone_options = {
@@ -59,6 +59,13 @@
 # % guisection: Optional
 # %end
 
+# %flag
+# % key: t
+# % label: Predict tiles of the computational region in parallel
+# % description: The computational region is split into horizontal tiles that are predicted by separate processes and patched afterwards
+# % guisection: Optional
+# %end
+
 # %option
 # % key: chunksize
 # % type: integer
@@ -68,18 +75,141 @@
 # % guisection: Optional
 # %end
 
+# %option G_OPT_M_NPROCS
+# % description: Number of processes used to read and predict blocks of rows, or tiles if the t flag is set, in parallel
+# % answer: 1
+# % guisection: Optional
+# %end
+
+# %option
+# % key: tile_height
+# % type: integer
+# % label: Height of tiles (rows)
+# % description: Height of the tiles when the t flag is set. By default the region is split into one full-width tile per process
+# % required: no
+# % guisection: Optional
+# %end
+
+# %option
+# % key: mapset_prefix
+# % type: string
+# % description: Prefix of the temporary mapsets used for the tiles when the t flag is set
+# % required: no
+# % guisection: Optional
+# %end
+
 
 import grass.script as gs
 import numpy as np
 import math
 from grass.pygrass.gis.region import Region
+from grass.pygrass.modules.grid.grid import (
+    GridModule,
+    Location,
+    split_region_tiles,
+    rpatch_map,
+)
 from grass.pygrass.modules.shortcuts import raster as r
 
+try:
+    parallel_rpatch_available = True
+    from grass.pygrass.modules.grid.grid import rpatch_map_r_patch_backend
+except ImportError:
+    parallel_rpatch_available = False
+
 gs.utils.set_path(modulename="r.learn.ml2", dirname="rlearnlib", path="..")
 
 from rlearnlib.raster import RasterStack
 
 
+class PredictGridModule(GridModule):
+    """inherit GridModule, but patch all of the prediction outputs, including
+    the class probability maps which are named using the output as prefix"""
+
+    def __init__(self, *args, **kwargs):
+        self.output_maps = kwargs.pop("output_maps")
+        super().__init__(*args, **kwargs)
+
+    def patch(self):
+        """Patch the final results."""
+        bboxes = split_region_tiles(width=self.width, height=self.height)
+        loc = Location()
+        mset = loc[self.mset.name]
+        mset.visible.extend(loc.mapsets())
+
+        for output_map in self.output_maps:
+            if parallel_rpatch_available:
+                rpatch_map_r_patch_backend(
+                    raster=output_map,
+                    mset_str=self.msetstr,
+                    bbox_list=bboxes,
+                    overwrite=self.module.flags.overwrite,
+                    start_row=self.start_row,
+                    start_col=self.start_col,
+                    prefix=self.out_prefix,
+                    processes=self.processes,
+                )
+            else:
+                rpatch_map(
+                    raster=output_map,
+                    mapset=self.mset.name,
+                    mset_str=self.msetstr,
+                    bbox_list=bboxes,
+                    overwrite=self.module.flags.overwrite,
+                    start_row=self.start_row,
+                    start_col=self.start_col,
+                    prefix=self.out_prefix,
+                )
+
+
+def predict_tiled(
+    group,
+    model_load,
+    output,
+    output_maps,
+    module_flags,
+    chunksize,
+    nprocs,
+    height,
+    prefix,
+):
+    """Predict tiles of the computational region in parallel
+
+    Each tile is predicted by a separate r.learn.predict process with its own
+    region, which loads the model once, and the tiles are patched afterwards.
+    """
+    region = Region()
+
+    if not height:
+        height = math.ceil(region.rows / nprocs)
+
+    kwargs = {
+        "group": group,
+        "load_model": model_load,
+        "output": output,
+        "chunksize": chunksize,
+        "nprocs": 1,
+        "quiet": True,
+    }
+
+    if module_flags:
+        kwargs["flags"] = module_flags
+
+    grd = PredictGridModule(
+        "r.learn.predict",
+        width=region.cols,
+        height=height,
+        overlap=0,
+        processes=nprocs,
+        split=False,
+        mapset_prefix=prefix,
+        output_maps=output_maps,
+        overwrite=gs.overwrite(),
+        **kwargs,
+    )
+    grd.run()
+
+
 def string_to_rules(string):
     """Converts a string to a file for input as a GRASS Rules File"""
     tmp = gs.tempfile()
@@ -107,6 +237,10 @@ def main():
     probability = flags["p"]
     prob_only = flags["z"]
     chunksize = int(options["chunksize"])
+    nprocs = int(options["nprocs"])
+    tiled = flags["t"]
+    tile_height = int(options["tile_height"]) if options["tile_height"] else None
+    mapset_prefix = options["mapset_prefix"] if options["mapset_prefix"] else None
 
     # remove @ from output in case overwriting result
     if "@" in output:
@@ -131,17 +265,49 @@ def main():
     if row_incr >= region.rows:
         row_incr = None
 
+    if nprocs < 1:
+        gs.fatal("Number of processes must be at least 1")
+
+    # prediction of tiles in separate processes
+    if tiled is True:
+        output_maps = []
+
+        if prob_only is False:
+            output_maps.append(output)
+
+        if probability is True:
+            labels = np.unique(y)
+
+            if len(labels) == 2:
+                labels = [max(labels)]
+
+            output_maps += [output + "_" + str(label) for label in labels]
+
+        gs.message("Predicting tiles in parallel...")
+        predict_tiled(
+            group=group,
+            model_load=model_load,
+            output=output,
+            output_maps=output_maps,
+            module_flags="".join(k for k in ["p", "z"] if flags[k]),
+            chunksize=chunksize,
+            nprocs=nprocs,
+            height=tile_height,
+            prefix=mapset_prefix,
+        )
+
     # prediction
-    if prob_only is False:
+    if tiled is False and prob_only is False:
         gs.message("Predicting classification/regression raster...")
         stack.predict(
             estimator=estimator,
             output=output,
             height=row_incr,
             overwrite=gs.overwrite(),
+            nprocs=nprocs,
         )
 
-    if probability is True:
+    if tiled is False and probability is True:
         gs.message("Predicting class probabilities...")
         stack.predict_proba(
             estimator=estimator,
@@ -149,6 +315,7 @@ def main():
             class_labels=np.unique(y),
             overwrite=gs.overwrite(),
             height=row_incr,
+            nprocs=nprocs,
         )
 
     # assign categories for classification map
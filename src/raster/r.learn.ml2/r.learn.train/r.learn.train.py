@@ -50,6 +50,16 @@
 # % guisection: Required
 # %end
 
+# %option
+# % key: n_per_class
+# % type: integer
+# % label: Maximum number of labelled pixels per class
+# % description: Randomly sample at most this number of labelled pixels per unique value in training_map, e.g. to create a balanced training dataset (0 = use all labelled pixels)
+# % answer: 0
+# % required: no
+# % guisection: Required
+# %end
+
 # %option G_OPT_DB_COLUMN
 # % key: field
 # % label: Response attribute column
@@ -321,6 +331,14 @@
 # % guisection: Optional
 # %end
 
+# %option G_OPT_M_DIR
+# % key: cache_dir
+# % label: Directory of the training data cache
+# % description: Directory used to cache training data extracted from a training_map. Training data is not cached if no directory is given
+# % required: no
+# % guisection: Optional
+# %end
+
 # %option G_OPT_F_INPUT
 # % key: load_training
 # % label: Load training data from csv
@@ -439,6 +457,9 @@ def main():
         option_to_list,
         scoring_metrics,
         check_class_weights,
+        training_cache_key,
+        load_cached_training_data,
+        save_cached_training_data,
     )
     from rlearnlib.raster import RasterStack
 
@@ -494,6 +515,11 @@ def main():
     n_jobs = int(options["n_jobs"])
     balance = flags["b"]
     category_maps = option_to_list(options["category_maps"])
+    n_per_class = int(options["n_per_class"])
+    cache_dir = options["cache_dir"]
+
+    if n_per_class < 0:
+        gs.fatal("n_per_class must be a positive number or 0 to use all pixels")
 
     # define estimator --------------------------------------------------------
     hyperparams, param_grid = process_param_grid(hyperparams)
@@ -581,7 +607,29 @@ def main():
             stack.append(group_raster)
 
         if training_map != "":
-            X, y, cat = stack.extract_pixels(training_map)
+            if cache_dir != "":
+                cache_key = training_cache_key(
+                    stack.names,
+                    training_map,
+                    n_per_class=n_per_class,
+                    random_state=random_state,
+                )
+                cached = load_cached_training_data(cache_dir, cache_key)
+            else:
+                cached = None
+
+            if cached is not None:
+                gs.message("Loading training data from cache ...")
+                X, y, cat = cached
+            else:
+                X, y, cat = stack.extract_pixels(
+                    training_map,
+                    n_per_class=n_per_class if n_per_class > 0 else None,
+                    random_state=random_state,
+                )
+
+                if cache_dir != "":
+                    save_cached_training_data(cache_dir, cache_key, X, y, cat)
             y = y.flatten()
 
             with RasterRow(training_map) as src:
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import itertools
 import os
+from collections import deque
+from multiprocessing import Pool
 from subprocess import PIPE
 
 import grass.script as gs
@@ -8,7 +10,6 @@ import numpy as np
 from grass.pygrass.gis.region import Region
 from grass.pygrass.modules.shortcuts import general as g
 from grass.pygrass.modules.shortcuts import imagery as im
-from grass.pygrass.modules.shortcuts import raster as r
 from grass.pygrass.modules.shortcuts import vector as v
 from grass.pygrass.raster import RasterRow, numpy2raster
 from grass.pygrass.raster.buffer import Buffer
@@ -32,6 +33,50 @@ def import_pandas():
     return module
 
 
+# numpy data types that correspond to the GRASS raster data types
+_mtype_to_dtype = {"CELL": np.int32, "FCELL": np.float32, "DCELL": np.float64}
+
+# per-process state of the workers used by the parallel prediction engine
+_worker_state = {}
+
+
+def _init_predict_worker(names, estimator, func):
+    """Initialize a prediction worker process
+
+    The estimator is unpickled only once per worker, and each worker opens its
+    own RasterStack so that the raster maps are read independently of the
+    parent process.
+    """
+    _worker_state["stack"] = RasterStack(names)
+    _worker_state["estimator"] = estimator
+    _worker_state["func"] = func
+    _worker_state["buffers"] = None
+
+
+def _predict_window(rows):
+    """Read a window of rows and apply the prediction function to it
+
+    Parameters
+    ----------
+    rows : tuple
+        Tuple of (start_row, end_row) of the window to predict.
+
+    Returns
+    -------
+    numpy.ndarray
+        3d masked array with the result of the prediction function.
+    """
+    stack = _worker_state["stack"]
+    data, mask = stack.read_block(rows=rows, out=_worker_state["buffers"])
+
+    # keep the arrays of the first (largest) window for reuse
+    if _worker_state["buffers"] is None:
+        _worker_state["buffers"] = (data, mask)
+
+    img = np.ma.masked_array(data, mask=mask, copy=False)
+    return _worker_state["func"](img, _worker_state["estimator"])
+
+
 class RasterStack(StatisticsMixin):
     def __init__(self, rasters=None, group=None):
         """A RasterStack enables a collection of raster layers to be bundled
@@ -337,6 +382,13 @@ class RasterStack(StatisticsMixin):
 
             return new_raster
 
+    @property
+    def dtype(self):
+        """Return the smallest numpy data type that can hold the data of all
+        of the rasters in the RasterStack without loss of precision
+        """
+        return np.result_type(*[_mtype_to_dtype[i] for i in self.mtypes.values()])
+
     def read(self, row=None, rows=None):
         """Read data from RasterStack as a masked 3D numpy array
 
@@ -364,46 +416,102 @@ class RasterStack(StatisticsMixin):
         data : ndarray
             3d masked numpy array containing data from RasterStack rasters.
         """
+        if not rows and row:
+            rows = (row, row + 1)
+
+        data, mask = self.read_block(rows=rows, dtype=np.float64)
+
+        return np.ma.masked_array(data, mask=mask, copy=False)
+
+    def read_block(self, rows=None, dtype=None, out=None):
+        """Read data from RasterStack as a typed 3D numpy array and a
+        separate nodata mask
+
+        Notes
+        -----
+        In contrast to `read`, the data is not converted into a float64 masked
+        array. The rasters are read in their native data type, or in the
+        data type set by `dtype`, into an array that can be preallocated and
+        reused when reading successive blocks of rows.
+
+        Parameters
+        ----------
+        rows : tuple (opt)
+            Tuple of integers representing the start and end numbers of rows to
+            read as a single block of rows. If not specified then all rows of
+            the current region are read.
+
+        dtype : str, numpy.dtype (opt)
+            Data type of the returned array. By default the data type is given
+            by the `dtype` property of the RasterStack, i.e. int32 for CELL,
+            float32 for FCELL and float64 for DCELL rasters or the common data
+            type if the RasterStack contains rasters of different types.
+
+        out : tuple (opt)
+            Tuple of preallocated (data, mask) arrays, for example as returned
+            by a previous call of this method, to read the block of rows into.
+            The arrays need to have the dimensions (band, rows, columns) with
+            at least as many rows as the block. If the block is smaller than
+            the arrays then only the leading rows are used.
 
+        Returns
+        -------
+        data : ndarray
+            3d numpy array containing data from RasterStack rasters with the
+            dimensions in order of (band, row, column).
+
+        mask : ndarray
+            3d boolean array that is True for nodata cells.
+        """
         reg = Region()
 
-        # create numpy array to receive data
         if rows:
             row_start, row_stop = rows
-            width = reg.cols
-            height = abs(row_stop - row_start)
-            shape = (self.count, height, width)
-            rowincrs = [i for i in range(row_start, row_stop)]
-        elif row:
-            row_start = row
-            row_stop = row + 1
-            height = 1
-            shape = (self.count, height, reg.cols)
-            rowincrs = [i for i in range(row_start, row_stop)]
         else:
-            shape = (self.count, reg.rows, reg.cols)
+            row_start, row_stop = 0, reg.rows
+
+        height = abs(row_stop - row_start)
+        shape = (self.count, height, reg.cols)
 
-        data = np.zeros(shape)
+        if out is None:
+            if dtype is None:
+                dtype = self.dtype
 
-        # read from each RasterRow object
-        for band, (name, src) in enumerate(self.layers.items()):
+            data = np.empty(shape, dtype=dtype)
+            mask = np.empty(shape, dtype="bool")
+        else:
+            data, mask = out
+
+            if (
+                data.shape[0] != self.count
+                or data.shape[1] < height
+                or data.shape[2] != reg.cols
+                or mask.shape != data.shape
+            ):
+                raise ValueError(
+                    "Preallocated arrays of shape {} cannot hold a block of "
+                    "shape {}".format(data.shape, shape)
+                )
+
+            data = data[:, 0:height, :]
+            mask = mask[:, 0:height, :]
+
+        # read from each RasterRow object using a single row buffer per band
+        for band, src in enumerate(self.loc.values()):
             with RasterRow(src.fullname()) as f:
-                if row or rows:
-                    for i, row in enumerate(rowincrs):
-                        data[band, i, :] = f[row]
-                else:
-                    data[band, :, :] = np.asarray(f)
+                buffer = Buffer((reg.cols,), mtype=f.mtype)
 
-        # mask array
-        data = np.ma.masked_equal(data, self._cell_nodata)
-        data = np.ma.masked_invalid(data)
+                for i, row in enumerate(range(row_start, row_stop)):
+                    data[band, i, :] = f.get_row(row, buffer)
 
-        if isinstance(data.mask, np.bool_):
-            mask_arr = np.empty(data.shape, dtype="bool")
-            mask_arr[:] = False
-            data.mask = mask_arr
+                if f.mtype == "CELL":
+                    np.equal(data[band], self._cell_nodata, out=mask[band])
+                elif np.issubdtype(data.dtype, np.floating):
+                    np.isnan(data[band], out=mask[band])
+                else:
+                    mask[band] = False
 
-        return data
+        return data, mask
 
     @staticmethod
     def _pred_fun(img, estimator):
@@ -546,7 +654,76 @@ class RasterStack(StatisticsMixin):
 
         return result
 
-    def predict(self, estimator, output, height=None, overwrite=False):
+    def _predict_windows(self, estimator, func, height, nprocs=1):
+        """Generator of predictions for each row window of the RasterStack
+
+        If `nprocs` is larger than one, the windows are distributed across a
+        pool of worker processes which each read and predict their own
+        window, so that reading and prediction of the next windows overlap
+        with writing the current one. The results are yielded in window order
+        and the number of windows held in memory is bounded by 2 * `nprocs`.
+
+        Parameters
+        ----------
+        estimator : estimator object implementing 'fit'
+            The object to use to fit the data.
+
+        func : function
+            Prediction function to apply to each window.
+
+        height : int
+            Number of raster rows in each window.
+
+        nprocs : int (opt). Default is 1
+            Number of worker processes.
+
+        Yields
+        ------
+        tuple
+            Tuple of (window index, number of windows, result) where result
+            is the 3d masked array returned by `func`.
+        """
+        windows = list(self.row_windows(height=height))
+        n_windows = len(windows)
+
+        if nprocs <= 1:
+            buffers = None
+
+            for wi, rows in enumerate(windows):
+                data, mask = self.read_block(rows=rows, out=buffers)
+
+                if buffers is None:
+                    buffers = (data, mask)
+
+                img = np.ma.masked_array(data, mask=mask, copy=False)
+                yield wi, n_windows, func(img, estimator)
+            return
+
+        max_pending = 2 * nprocs
+
+        with Pool(
+            processes=nprocs,
+            initializer=_init_predict_worker,
+            initargs=(self.names, estimator, func),
+        ) as pool:
+            pending = deque(
+                pool.apply_async(_predict_window, (rows,))
+                for rows in windows[:max_pending]
+            )
+            next_window = len(pending)
+
+            for wi in range(n_windows):
+                result = pending.popleft().get()
+
+                if next_window < n_windows:
+                    pending.append(
+                        pool.apply_async(_predict_window, (windows[next_window],))
+                    )
+                    next_window += 1
+
+                yield wi, n_windows, result
+
+    def predict(self, estimator, output, height=None, overwrite=False, nprocs=1):
         """Prediction method for RasterStack class
 
         Parameters
@@ -564,6 +741,10 @@ class RasterStack(StatisticsMixin):
         overwrite : bool (opt). Default is False
             Option to overwrite an existing raster.
 
+        nprocs : int (opt). Default is 1
+            Number of processes used to read and predict row windows in
+            parallel. Only used if `height` is specified.
+
         Returns
         -------
         RasterStack
@@ -601,7 +782,15 @@ class RasterStack(StatisticsMixin):
 
         if len(indexes) > 1:
             result_stack = self._predict_multi(
-                estimator, reg, indexes, indexes, height, func, output, overwrite
+                estimator,
+                reg,
+                indexes,
+                indexes,
+                height,
+                func,
+                output,
+                overwrite,
+                nprocs,
             )
         else:
             if height is not None:
@@ -609,21 +798,16 @@ class RasterStack(StatisticsMixin):
                 with RasterRow(
                     output, mode="w", mtype=mtype, overwrite=overwrite
                 ) as dst:
-                    n_windows = len([i for i in self.row_windows(height=height)])
+                    newrow = Buffer((reg.cols,), mtype=mtype)
 
-                    data_gen = (
-                        (wi, self.read(rows=rows))
-                        for wi, rows in enumerate(self.row_windows(height=height))
-                    )
-
-                    for wi, arr in data_gen:
+                    for wi, n_windows, result in self._predict_windows(
+                        estimator, func, height, nprocs
+                    ):
                         gs.percent(wi, n_windows, 1)
-                        result = func(arr, estimator)
                         result = np.ma.filled(result, nodata)
 
                         # writing data to GRASS raster row-by-row
                         for i in range(result.shape[1]):
-                            newrow = Buffer((reg.cols,), mtype=mtype)
                             newrow[:] = result[0, i, :]
                             dst.put_row(newrow)
 
@@ -640,7 +824,13 @@ class RasterStack(StatisticsMixin):
         return result_stack
 
     def predict_proba(
-        self, estimator, output, class_labels=None, height=None, overwrite=False
+        self,
+        estimator,
+        output,
+        class_labels=None,
+        height=None,
+        overwrite=False,
+        nprocs=1,
     ):
         """Prediction method for RasterStack class
 
@@ -664,6 +854,10 @@ class RasterStack(StatisticsMixin):
         overwrite : bool (opt). Default is False
             Option to overwrite an existing raster(s)
 
+        nprocs : int (opt). Default is 1
+            Number of processes used to read and predict row windows in
+            parallel. Only used if `height` is specified.
+
         Returns
         -------
         RasterStack
@@ -686,43 +880,55 @@ class RasterStack(StatisticsMixin):
 
         # create and open rasters for writing
         result_stack = self._predict_multi(
-            estimator, reg, indexes, class_labels, height, func, output, overwrite
+            estimator,
+            reg,
+            indexes,
+            class_labels,
+            height,
+            func,
+            output,
+            overwrite,
+            nprocs,
         )
 
         return result_stack
 
     def _predict_multi(
-        self, estimator, region, indexes, class_labels, height, func, output, overwrite
+        self,
+        estimator,
+        region,
+        indexes,
+        class_labels,
+        height,
+        func,
+        output,
+        overwrite,
+        nprocs=1,
     ):
+        rasternames = [output + "_" + str(label) for label in class_labels]
+
         # create and open rasters for writing if incremental reading
         if height is not None:
             dst = []
 
-            for i, label in enumerate(class_labels):
-                rastername = output + "_" + str(label)
+            for i, rastername in enumerate(rasternames):
                 dst.append(RasterRow(rastername))
                 dst[i].open("w", mtype="FCELL", overwrite=overwrite)
 
-            # create data reader generator
-            n_windows = len([i for i in self.row_windows(height=height)])
-
-            data_gen = (
-                (wi, self.read(rows=rows))
-                for wi, rows in enumerate(self.row_windows(height=height))
-            )
+            newrow = Buffer((region.cols,), mtype="FCELL")
 
         # perform prediction
         try:
             if height is not None:
-                for wi, arr in data_gen:
+                for wi, n_windows, result in self._predict_windows(
+                    estimator, func, height, nprocs
+                ):
                     gs.percent(wi, n_windows, 1)
-                    result = func(arr, estimator)
                     result = np.ma.filled(result, np.nan)
 
                     # write multiple features to GRASS GIS rasters
                     for i, arr_index in enumerate(indexes):
                         for row in range(result.shape[1]):
-                            newrow = Buffer((region.cols,), mtype="FCELL")
                             newrow[:] = result[arr_index, row, :]
                             dst[i].put_row(newrow)
             else:
@@ -734,18 +940,18 @@ class RasterStack(StatisticsMixin):
                     numpy2raster(
                         result[arr_index, :, :],
                         mtype="FCELL",
-                        rastname=rastername[i],
+                        rastname=rasternames[i],
                         overwrite=overwrite,
                     )
-        except:
-            gs.fatal("Error in raster prediction")
+        except Exception as e:
+            gs.fatal("Error in raster prediction: {}".format(e))
 
         finally:
             if height is not None:
                 for i in dst:
                     i.close()
 
-        return RasterStack([i.name for i in dst])
+        return RasterStack(rasternames)
 
     def row_windows(self, region=None, height=25):
         """Returns an generator for row increments, tuple (startrow, endrow)
@@ -769,10 +975,25 @@ class RasterStack(StatisticsMixin):
 
         return windows
 
-    def extract_pixels(self, rast_name, use_cats=False, as_df=False):
+    def extract_pixels(
+        self,
+        rast_name,
+        use_cats=False,
+        as_df=False,
+        n_per_class=None,
+        random_state=None,
+    ):
         """Extract pixel values from a RasterStack using another RasterRow
         object of labelled pixels
 
+        Notes
+        -----
+        The raster of labelled pixels is streamed row by row to locate the
+        labelled pixels, and the values of the RasterStack are then read
+        directly into preallocated arrays, only for the rows that contain
+        (sampled) labelled pixels. Labelled pixels that are nodata in any of
+        the rasters of the RasterStack are removed.
+
         Parameters
         ----------
         rast_name : str
@@ -787,6 +1008,17 @@ class RasterStack(StatisticsMixin):
         as_df : bool (opt). Default is False
             Whether to return the extracted RasterStack pixels as a Pandas
             DataFrame.
+
+        n_per_class : int (opt)
+            Randomly sample at most this number of labelled pixels per unique
+            value in rast_name, for example to create a balanced training
+            dataset. The sampling is performed before the RasterStack is
+            read, so that pixels which are nodata in the RasterStack are
+            removed after sampling. If not specified then all labelled pixels
+            are extracted.
+
+        random_state : int (opt)
+            Seed to use for the random sampling of labelled pixels.
         """
         # some checks
         pd = import_pandas()
@@ -801,32 +1033,95 @@ class RasterStack(StatisticsMixin):
         if "" in labels.labels() or use_cats is False:
             labels = None
 
-        # extract predictor values at pixel locations
-        data = r.stats(
-            input=[rast_name] + self.names,
-            separator="pipe",
-            flags=["n", "g"],
-            stdout_=PIPE,
-        ).outputs.stdout
+        reg = Region()
+
+        # locate the labelled pixels
+        rows, cols, y = [], [], []
+
+        with RasterRow(rast_name) as src:
+            label_mtype = src.mtype
+            buffer = Buffer((reg.cols,), mtype=label_mtype)
+
+            for row in range(reg.rows):
+                arr = src.get_row(row, buffer)
+
+                if label_mtype == "CELL":
+                    idx = np.flatnonzero(arr != self._cell_nodata)
+                else:
+                    idx = np.flatnonzero(~np.isnan(arr))
 
-        if data == "":
+                if idx.shape[0] > 0:
+                    rows.append(np.full(idx.shape[0], row, dtype=np.int32))
+                    cols.append(idx)
+                    y.append(arr[idx])
+
+        if len(y) == 0:
             gs.fatal(
                 "The training pixel locations do not spatially "
                 "intersect any raster datasets"
             )
 
-        data = data.strip().split(os.linesep)
-        data = [i.split("|") for i in data]
-        data = np.asarray(data).astype("float32")
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+        y = np.concatenate(y)
+
+        # optionally sample a fixed number of labelled pixels per class
+        if n_per_class is not None:
+            rng = np.random.RandomState(random_state)
+            selected = []
+
+            for value in np.unique(y):
+                idx = np.flatnonzero(y == value)
+
+                if idx.shape[0] > n_per_class:
+                    idx = rng.choice(idx, size=n_per_class, replace=False)
+
+                selected.append(idx)
+
+            selected = np.sort(np.concatenate(selected))
+            rows, cols, y = rows[selected], cols[selected], y[selected]
 
-        # remove x,y columns from array indexes 1 and 2
-        data = data[:, 2:]
+        # read predictor values into preallocated arrays
+        X = np.empty((y.shape[0], self.count), dtype=np.float32)
+        valid = np.ones(y.shape[0], dtype="bool")
+        unique_rows, starts = np.unique(rows, return_index=True)
+        stops = np.append(starts[1:], rows.shape[0])
 
-        y = data[:, 0]
-        X = data[:, 1:]
+        srcs = [RasterRow(name) for name in self.names]
+        buffers = []
 
-        if (y % 1).all() == 0:
+        try:
+            for src in srcs:
+                src.open("r")
+                buffers.append(Buffer((reg.cols,), mtype=src.mtype))
+
+            for row, start, stop in zip(unique_rows, starts, stops):
+                row_cols = cols[start:stop]
+
+                for band, (src, buffer) in enumerate(zip(srcs, buffers)):
+                    values = src.get_row(row, buffer)[row_cols]
+
+                    if src.mtype == "CELL":
+                        valid[start:stop] &= values != self._cell_nodata
+                    else:
+                        valid[start:stop] &= ~np.isnan(values)
+
+                    X[start:stop, band] = values
+        finally:
+            for src in srcs:
+                if src.is_open():
+                    src.close()
+
+        X = X[valid]
+        y = y[valid]
+
+        if label_mtype == "CELL":
             y = y.astype("int")
+        else:
+            y = y.astype("float32")
+
+            if (y % 1).all() == 0:
+                y = y.astype("int")
 
         cat = np.arange(0, y.shape[0])
 
@@ -5,6 +5,12 @@
 with passing pre-defined scikit learn classifiers
 and other utilities for loading/saving training data."""
 
+import hashlib
+import json
+import os
+import tempfile
+
+import grass.script as gs
 import numpy as np
 from grass.pygrass.utils import get_mapset_raster
 
@@ -436,3 +442,139 @@ def load_training_data(file):
     X = training_data.drop(columns=["groups", "class_labels", "cat", "response"]).values
 
     return X, y, cat, class_labels, groups
+
+
+def raster_mtime(name):
+    """
+    Returns the modification timestamp of a GRASS raster map
+
+    Parameters
+    ----------
+    name : str
+        Name of a GRASS raster map
+
+    Returns
+    -------
+    mtime : float
+        Latest modification time of the header and data files of the raster
+    """
+    mtime = 0.0
+
+    for element in ["cellhd", "cell", "fcell"]:
+        path = gs.find_file(name, element=element)["file"]
+
+        if path and os.path.exists(path):
+            mtime = max(mtime, os.path.getmtime(path))
+
+    return mtime
+
+
+def training_cache_key(rasters, training_map, **kwargs):
+    """
+    Creates a content-addressed key for the training data extracted from a
+    list of rasters at the labelled pixels of a training map
+
+    The key is derived from the full names and modification timestamps of the
+    rasters and the training map, the current computational region and any
+    additional extraction settings, so that it changes whenever any of these
+    inputs is modified.
+
+    Parameters
+    ----------
+    rasters : list
+        Names of the GRASS raster maps that the training data is extracted
+        from
+
+    training_map : str
+        Name of the GRASS raster map containing labelled pixels
+
+    **kwargs : dict
+        Additional settings that affect the extracted data, e.g. the sampling
+        parameters
+
+    Returns
+    -------
+    key : str
+        Hexadecimal digest representing the cache key
+    """
+    names = [get_fullname(name) for name in rasters + [training_map]]
+    region = gs.region()
+
+    content = {
+        "rasters": [[name, raster_mtime(name)] for name in names],
+        "region": {k: str(v) for k, v in sorted(region.items())},
+        "settings": {k: str(v) for k, v in sorted(kwargs.items())},
+    }
+    content = json.dumps(content, sort_keys=True).encode("utf-8")
+
+    return hashlib.sha256(content).hexdigest()
+
+
+def load_cached_training_data(cache_dir, key):
+    """
+    Loads extracted training data from the cache
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path to the directory of the cache
+
+    key : str
+        Cache key as created by `training_cache_key`
+
+    Returns
+    -------
+    data : tuple or None
+        Tuple of the (X, y, cat) arrays, or None if the key is not present in
+        the cache
+    """
+    file = os.path.join(cache_dir, key + ".npz")
+
+    if not os.path.exists(file):
+        return None
+
+    try:
+        with np.load(file, allow_pickle=False) as data:
+            return data["X"], data["y"], data["cat"]
+    except (OSError, KeyError, ValueError):
+        gs.warning("Ignoring corrupt training data cache file {}".format(file))
+        return None
+
+
+def save_cached_training_data(cache_dir, key, X, y, cat):
+    """
+    Saves extracted training data to the cache in uncompressed numpy format
+
+    The file is written to a temporary name first and renamed, so that
+    concurrent runs never read a partially written file.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path to the directory of the cache
+
+    key : str
+        Cache key as created by `training_cache_key`
+
+    X : ndarray
+        2d numpy array containing predictor values
+
+    y : ndarray
+        1d numpy array containing labels
+
+    cat : ndarray
+        1d numpy array of the index of the samples
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(suffix=".npz", dir=cache_dir)
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, X=X, y=y, cat=cat)
+
+        os.replace(tmp_file, os.path.join(cache_dir, key + ".npz"))
+    except OSError:
+        gs.warning("Could not write training data cache in {}".format(cache_dir))
+
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
@@ -15,6 +15,7 @@ for details.
 """
 import tempfile
 import os
+import shutil
 
 import grass.script as gs
 
@@ -132,6 +133,68 @@ class TestClassification(TestCase):
 
         self.assertEqual(cats_input, cats_result)
 
+    def test_output_created_parallel(self):
+        """Checks that the output is created when predicting in parallel"""
+        self.assertModule(
+            "r.learn.train",
+            group=self.group,
+            training_map=self.labelled_pixels,
+            model_name="RandomForestClassifier",
+            n_estimators=100,
+            save_model=self.model_file,
+        )
+        self.assertFileExists(filename=self.model_file)
+
+        self.assertModule(
+            "r.learn.predict",
+            group=self.group,
+            load_model=self.model_file,
+            output=self.output,
+            chunksize=10000,
+            nprocs=2,
+        )
+        self.assertRasterExists(self.output, msg="Output was not created")
+
+    def test_output_created_n_per_class(self):
+        """Checks that a model is trained from a sample of pixels per class"""
+        self.assertModule(
+            "r.learn.train",
+            group=self.group,
+            training_map=self.labelled_pixels,
+            model_name="RandomForestClassifier",
+            n_estimators=100,
+            n_per_class=50,
+            save_model=self.model_file,
+        )
+        self.assertFileExists(filename=self.model_file)
+
+        self.assertModule(
+            "r.learn.predict",
+            group=self.group,
+            load_model=self.model_file,
+            output=self.output,
+        )
+        self.assertRasterExists(self.output, msg="Output was not created")
+
+    def test_training_cache(self):
+        """Checks that training data is cached and reused"""
+        cache_dir = tempfile.mkdtemp()
+
+        for i in range(2):
+            self.assertModule(
+                "r.learn.train",
+                group=self.group,
+                training_map=self.labelled_pixels,
+                model_name="RandomForestClassifier",
+                n_estimators=100,
+                cache_dir=cache_dir,
+                save_model=self.model_file,
+                overwrite=True,
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        shutil.rmtree(cache_dir)
+
     def test_output_created_prediction_points(self):
         """Checks that output is created"""
         self.assertModule(
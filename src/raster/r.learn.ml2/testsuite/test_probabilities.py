@@ -107,3 +107,68 @@ class TestProbabilties(TestCase):
         self.assertRasterExists(self.output_probs[4], msg="Output was not created")
         self.assertRasterExists(self.output_probs[5], msg="Output was not created")
         self.assertRasterExists(self.output_probs[6], msg="Output was not created")
+
+    def test_probabilities_tiled(self):
+        """Checks that class probabilities are produced for parallel tiles"""
+        self.assertModule(
+            "r.learn.train",
+            group=self.group,
+            training_map=self.labelled_pixels,
+            model_name="RandomForestClassifier",
+            n_estimators=100,
+            save_model=self.model_file,
+        )
+        self.assertFileExists(filename=self.model_file)
+
+        self.assertModule(
+            "r.learn.predict",
+            group=self.group,
+            load_model=self.model_file,
+            output=self.output,
+            nprocs=2,
+            flags="pzt",
+        )
+
+        for output_prob in self.output_probs:
+            self.assertRasterExists(output_prob, msg="Output was not created")
+
+    def test_probabilities_small_tiles(self):
+        """Checks that probabilities of tiles which are read at once are the
+        same as without tiles"""
+        self.assertModule(
+            "r.learn.train",
+            group=self.group,
+            training_map=self.labelled_pixels,
+            model_name="RandomForestClassifier",
+            n_estimators=100,
+            save_model=self.model_file,
+        )
+        self.assertFileExists(filename=self.model_file)
+
+        reference = "reference_result"
+        reference_probs = [reference + "_" + str(i) for i in range(1, 8)]
+        self.assertModule(
+            "r.learn.predict",
+            group=self.group,
+            load_model=self.model_file,
+            output=reference,
+            flags="pz",
+        )
+
+        # tiles are smaller than the chunksize
+        self.assertModule(
+            "r.learn.predict",
+            group=self.group,
+            load_model=self.model_file,
+            output=self.output,
+            nprocs=4,
+            tile_height=20,
+            flags="pzt",
+        )
+
+        for output_prob, reference_prob in zip(self.output_probs, reference_probs):
+            self.assertRastersNoDifference(
+                actual=output_prob, reference=reference_prob, precision=1e-6
+            )
+
+        self.runModule("g.remove", flags="f", type="raster", name=reference_probs)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""
+MODULE:    Test of r.learn.ml
+
+PURPOSE:   Test of r.learn.ml for reading blocks of rows of a RasterStack
+           object into typed arrays with a separate nodata mask
+
+COPYRIGHT: (C) 2026 by the GRASS Development Team
+
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+"""
+
+import numpy as np
+
+from grass.gunittest.case import TestCase
+from grass.gunittest.main import test
+from grass.pygrass.raster import raster2numpy
+from grass.script.utils import set_path
+
+set_path("r.learn.ml2", "rlearnlib")
+from rlearnlib.raster import RasterStack
+
+
+class TestReadBlock(TestCase):
+    """Test reading data of a RasterStack with read_block and read"""
+
+    cell = "read_block_cell"
+    fcell = "read_block_fcell"
+    dcell = "read_block_dcell"
+
+    @classmethod
+    def setUpClass(cls):
+        """Create CELL, FCELL and DCELL maps with nodata in a small region"""
+        cls.use_temp_region()
+        cls.runModule("g.region", n=20, s=0, e=30, w=0, res=1)
+        cls.runModule(
+            "r.mapcalc",
+            expression="{} = if(row() == 3 && col() < 5, null(), "
+            "row() * 100 + col())".format(cls.cell),
+        )
+        cls.runModule(
+            "r.mapcalc",
+            expression="{} = if(col() == 7, null(), float(row()) / col())".format(
+                cls.fcell
+            ),
+        )
+        cls.runModule(
+            "r.mapcalc",
+            expression="{} = double(row() + col()) / 3".format(cls.dcell),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the temporary region and maps"""
+        cls.runModule(
+            "g.remove", flags="f", type="raster", name=[cls.cell, cls.fcell, cls.dcell]
+        )
+        cls.del_temp_region()
+
+    @staticmethod
+    def reference(name):
+        """Return values and nodata mask of map read by pygrass"""
+        arr = raster2numpy(name)
+        if arr.dtype == np.int32:
+            mask = arr == -2147483648
+        else:
+            mask = np.isnan(arr)
+        return arr, mask
+
+    def test_dtype(self):
+        """Data type is the native type of the maps unless set"""
+        self.assertEqual(RasterStack([self.cell]).read_block()[0].dtype, np.int32)
+        self.assertEqual(RasterStack([self.fcell]).read_block()[0].dtype, np.float32)
+        self.assertEqual(
+            RasterStack([self.cell, self.fcell]).read_block()[0].dtype, np.float64
+        )
+        self.assertEqual(
+            RasterStack([self.cell]).read_block(dtype=np.float32)[0].dtype,
+            np.float32,
+        )
+
+    def test_mask(self):
+        """Nodata of CELL and FCELL maps is masked and values are unchanged"""
+        stack = RasterStack([self.cell, self.fcell, self.dcell])
+        data, mask = stack.read_block()
+        self.assertEqual(data.shape, (3, 20, 30))
+        self.assertEqual(mask.dtype, bool)
+
+        for band, name in enumerate([self.cell, self.fcell, self.dcell]):
+            values, nodata = self.reference(name)
+            np.testing.assert_array_equal(mask[band], nodata)
+            np.testing.assert_allclose(data[band][~nodata], values[~nodata])
+
+        self.assertEqual(mask[0].sum(), 4)
+        self.assertEqual(mask[1].sum(), 20)
+        self.assertFalse(mask[2].any())
+
+    def test_out(self):
+        """Preallocated arrays are reused for blocks of rows"""
+        stack = RasterStack([self.cell, self.fcell])
+        out = (np.empty((2, 10, 30)), np.empty((2, 10, 30), dtype=bool))
+
+        for rows in [(0, 10), (10, 20), (2, 6)]:
+            data, mask = stack.read_block(rows=rows, out=out)
+            self.assertTrue(np.shares_memory(data, out[0]))
+            self.assertTrue(np.shares_memory(mask, out[1]))
+            self.assertEqual(data.shape, (2, rows[1] - rows[0], 30))
+
+            expected_data, expected_mask = stack.read_block(rows=rows)
+            np.testing.assert_array_equal(mask, expected_mask)
+            np.testing.assert_array_equal(data[~mask], expected_data[~mask])
+
+        with self.assertRaises(ValueError):
+            stack.read_block(rows=(0, 11), out=out)
+
+    def test_read(self):
+        """read returns a float64 masked array of the same data"""
+        stack = RasterStack([self.cell, self.fcell, self.dcell])
+        arr = stack.read()
+        self.assertIsInstance(arr, np.ma.MaskedArray)
+        self.assertEqual(arr.dtype, np.float64)
+        self.assertEqual(arr.shape, (3, 20, 30))
+
+        for band, name in enumerate([self.cell, self.fcell, self.dcell]):
+            values, nodata = self.reference(name)
+            np.testing.assert_array_equal(np.ma.getmaskarray(arr[band]), nodata)
+            np.testing.assert_allclose(arr[band].compressed(), values[~nodata])
+
+        # single row and block of rows
+        np.testing.assert_array_equal(stack.read(row=3), arr[:, 3:4, :])
+        np.testing.assert_array_equal(stack.read(rows=(3, 8)), arr[:, 3:8, :])
+
+
+if __name__ == "__main__":
+    test()
@@ -49,6 +49,17 @@
 # %end
 #
 # %option
+# % key: tiling
+# % type: string
+# % label: Tiling mode
+# % description: Mode used to define the size of the tiles
+# % options: default,auto
+# % descriptions: default;tiles defined by width and height, or by GridModule if not provided; auto;full-width row strips computed from the region size, number of processes and cell type (width and height are ignored)
+# % answer: default
+# % required: no
+# %end
+#
+# %option
 # % key: overlap
 # % type: integer
 # % description: Overlap of tiles
@@ -85,8 +96,8 @@
 # % type: string
 # % label: Backend for patching computed tiles
 # % description: If backend is not specified, original serial implementation with RasterRow is used
-# % options: RasterRow,r.patch
-# % descriptions: RasterRow; serial patching with PyGRASS RasterRow; r.patch; parallelized r.patch (with zero overlap only)
+# % options: RasterRow,r.patch,stream
+# % descriptions: RasterRow; serial patching with PyGRASS RasterRow; r.patch; parallelized r.patch (with zero overlap only); stream; full-width row strips written into the output in order without temporary mapsets and without a separate patching step
 # % required: no
 # %end
 #
@@ -94,7 +105,17 @@
 # % exclusive: processes,nprocs
 # %end
 
+import math
+import os
+import re
+from collections import deque
+from multiprocessing import Pool
+
 import grass.script as gscript
+import numpy as np
+from grass.pygrass.gis.region import Region
+from grass.pygrass.raster import RasterRow
+from grass.pygrass.raster.buffer import Buffer
 from grass.pygrass.modules.grid.grid import (
     GridModule,
     Location,
@@ -109,6 +130,160 @@ except ImportError:
     parallel_rpatch_available = False
 
 
+# bytes per cell of the GRASS raster data types
+CELL_SIZES = {"CELL": 4, "FCELL": 4, "DCELL": 8}
+
+# upper limit of the memory/disk footprint of a single tile in auto mode
+MAX_TILE_SIZE = 256 * 1024**2
+
+
+def get_cell_size(expression):
+    """Estimate the number of bytes processed per cell by the expression
+
+    This is the sum of the cell sizes of all raster maps read by the
+    expression plus the size of the largest of these data types, which is
+    used for the output map.
+    """
+    rhs = "=".join(expression.split("=")[1:])
+    sizes = []
+    for token in set(re.findall(r"[A-Za-z_][\w.]*(?:@[\w.]+)?", rhs)):
+        if gscript.find_file(token, element="cell")["file"]:
+            sizes.append(CELL_SIZES[gscript.raster_info(token)["datatype"]])
+    if not sizes:
+        return CELL_SIZES["DCELL"]
+    return sum(sizes) + max(sizes)
+
+
+def auto_tile_size(rows, cols, processes, cell_size, overlap=0):
+    """Compute the width and height of the tiles for the auto tiling mode
+
+    Tiles are full-width row strips, which avoids splitting rows across
+    tiles and is faster than square tiles. The number of tiles is a multiple
+    of the number of processes so that the processes are evenly loaded, and
+    is increased until each tile stays below MAX_TILE_SIZE bytes.
+    """
+    n_tiles = math.ceil(rows * cols * cell_size / MAX_TILE_SIZE)
+    n_tiles = max(processes, processes * math.ceil(n_tiles / processes))
+    height = math.ceil(rows / min(n_tiles, rows))
+    # tiles much thinner than the overlap would mostly compute the overlap
+    height = max(height, 2 * overlap + 1)
+    return cols, min(height, rows)
+
+
+def compute_strip(expression, start_row, stop_row, overlap, tmp_name):
+    """Compute the expression for a full-width strip of rows
+
+    r.mapcalc is run in the current mapset with the region of the strip
+    extended by the overlap, passed through GRASS_REGION. The strip is
+    written to a temporary map, because r.mapcalc can only write to a
+    raster map. The rows of the strip without the overlap are read back
+    into an array and the temporary map is removed right away, also if
+    the computation fails.
+
+    :return: tuple of (start_row, raster type, list of the rows of the strip)
+    """
+    region = Region()
+    north = region.north - max(start_row - overlap, 0) * region.nsres
+    south = region.north - min(stop_row + overlap, region.rows) * region.nsres
+    env = os.environ.copy()
+    env["GRASS_REGION"] = gscript.region_env(n=north, s=south)
+    rhs = "=".join(expression.split("=")[1:])
+    try:
+        gscript.run_command(
+            "r.mapcalc",
+            expression="%s = %s" % (tmp_name, rhs),
+            overwrite=True,
+            quiet=True,
+            env=env,
+        )
+        # the strip is read in the full region, so that the rows of the
+        # temporary map line up with the rows of the output map
+        with RasterRow(tmp_name) as src:
+            mtype = src.mtype
+            rows = [np.array(src[row]) for row in range(start_row, stop_row)]
+    finally:
+        if gscript.find_file(tmp_name, element="cell", mapset=".")["file"]:
+            gscript.run_command(
+                "g.remove", type="raster", name=tmp_name, flags="f", quiet=True
+            )
+    return start_row, mtype, rows
+
+
+def stream_patch(expression, output, height, overlap, processes, overwrite):
+    """Compute full-width strips in parallel and write them into the output
+    in order
+
+    No temporary mapsets are created and no separate patching step is
+    needed, but every strip is still written once to a temporary map in the
+    current mapset and read back. Each finished strip is committed to the
+    output as soon as all previous strips have been written, and at most
+    2 * processes strips are held in memory. The strips are written to a
+    temporary map which replaces the output only when all strips succeeded,
+    so an existing output is kept and all temporary maps are removed if a
+    strip fails.
+    """
+    region = Region()
+    strips = [
+        (row, min(row + height, region.rows)) for row in range(0, region.rows, height)
+    ]
+    tmp_prefix = "tmp_rmapcalctiled_%d_" % os.getpid()
+    tmp_output = tmp_prefix + "output"
+    max_pending = 2 * processes
+    dst = None
+    buf = None
+
+    failed = True
+    try:
+        with Pool(processes=processes) as pool:
+            pending = deque()
+            next_strip = 0
+            for i in range(len(strips)):
+                while next_strip < len(strips) and len(pending) < max_pending:
+                    start_row, stop_row = strips[next_strip]
+                    pending.append(
+                        pool.apply_async(
+                            compute_strip,
+                            (
+                                expression,
+                                start_row,
+                                stop_row,
+                                overlap,
+                                tmp_prefix + str(next_strip),
+                            ),
+                        )
+                    )
+                    next_strip += 1
+                start_row, mtype, rows = pending.popleft().get()
+                if dst is None:
+                    dst = RasterRow(tmp_output)
+                    dst.open("w", mtype=mtype, overwrite=True)
+                    buf = Buffer((region.cols,), mtype=mtype)
+                for row in rows:
+                    buf[:] = row
+                    dst.put_row(buf)
+                gscript.percent(i + 1, len(strips), 1)
+        dst.close()
+        gscript.run_command(
+            "g.rename",
+            raster=(tmp_output, output),
+            overwrite=overwrite,
+            quiet=True,
+        )
+        failed = False
+    finally:
+        # the pool is terminated at this point
+        if dst is not None and dst.is_open():
+            dst.close()
+        if failed:
+            gscript.run_command(
+                "g.remove",
+                type="raster",
+                pattern=tmp_prefix + "*",
+                flags="f",
+                quiet=True,
+            )
+
+
 class MyGridModule(GridModule):
     """inherit GridModule, but handle the fact that the output name is in the expression"""
 
@@ -146,6 +321,8 @@ def main():
     expression = options["expression"]
     width = options["width"]
     height = options["height"]
+    tiling = options["tiling"]
+    patch_backend = options["patch_backend"]
     # v8.2 GridModule doesn't require tile size anymore
     # this is proxy for v8.2
     # can be removed in v9.0
@@ -153,7 +330,7 @@ def main():
         width = int(width)
     if height:
         height = int(height)
-    if not parallel_rpatch_available:
+    if not parallel_rpatch_available and tiling != "auto" and patch_backend != "stream":
         warning = False
         if not width:
             width = 1000
@@ -170,7 +347,6 @@ def main():
             )
     overlap = int(options["overlap"])
     processes = options["nprocs"]
-    patch_backend = options["patch_backend"]
     if not processes:
         processes = options["processes"]
         if processes:
@@ -180,6 +356,21 @@ def main():
     except ValueError:
         processes = 1
 
+    if tiling == "auto":
+        region = Region()
+        width, height = auto_tile_size(
+            region.rows,
+            region.cols,
+            processes,
+            get_cell_size(expression),
+            overlap,
+        )
+        gscript.verbose(
+            _("Auto tiling: tile size set to {h} rows x {w} cols.").format(
+                h=height, w=width
+            )
+        )
+
     output = None
     if options["output"]:
         output = options["output"]
@@ -190,13 +381,13 @@ def main():
     kwargs = {"expression": expression, "quiet": True}
 
     if not parallel_rpatch_available and patch_backend == "r.patch":
-        gs.warning(
+        gscript.warning(
             _(
                 "r.patch backend is not available in this version of GRASS GIS, using RasterRow"
             )
         )
     if patch_backend == "r.patch" and overlap > 0:
-        gs.fatal(_("Patching backend 'r.patch' doesn't work for overlap > 0"))
+        gscript.fatal(_("Patching backend 'r.patch' doesn't work for overlap > 0"))
     if parallel_rpatch_available:
         kwargs["patch_backend"] = patch_backend
 
@@ -205,6 +396,30 @@ def main():
     else:
         output_mapname = expression.split("=")[0].strip()
 
+    if patch_backend == "stream":
+        if mapset_prefix:
+            gscript.warning(_("Option mapset_prefix is ignored for stream backend"))
+        if not height:
+            height = math.ceil(Region().rows / processes)
+        if (
+            gscript.find_file(output_mapname, element="cell", mapset=".")["file"]
+            and not gscript.overwrite()
+        ):
+            gscript.fatal(
+                _(
+                    "Raster map <{}> already exists, use --overwrite to replace it"
+                ).format(output_mapname)
+            )
+        stream_patch(
+            expression=expression,
+            output=output_mapname,
+            height=height,
+            overlap=overlap,
+            processes=processes,
+            overwrite=gscript.overwrite(),
+        )
+        return
+
     grd = MyGridModule(
         "r.mapcalc",
         width=width,
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+############################################################################
+#
+# MODULE:	    Benchmark for tiling settings of r.mapcalc.tiled
+# AUTHOR(S):	GRASS Development Team
+#
+# PURPOSE:	    Run a fixed set of r.mapcalc expressions on synthetic rasters
+#               with different tile shapes, numbers of processes and
+#               patching backends
+# COPYRIGHT:	(C) 2026 by the GRASS Development Team
+#
+# 		This program is free software under the GNU General Public
+# 		License (>=v2). Read the file COPYING that comes with GRASS
+# 		for details.
+#############################################################################
+
+# python3 benchmark.py benchmark.ini
+
+import configparser
+import csv
+import grass.script as grass
+import os
+import sys
+import time
+
+if len(sys.argv) == 1:
+    configfile = "benchmark.ini"
+else:
+    configfile = sys.argv[1]
+    if not os.path.isfile(configfile):
+        grass.fatal("%s is no file and cannot be used as config file" % configfile)
+
+# get config
+config = configparser.ConfigParser()
+config.read(configfile)
+
+conf = {
+    "rows": "10000",
+    "cols": "10000",
+    "seed": "1",
+    "nprocs": ["1", "2", "4"],
+    "tiles": ["auto", "strips", "1000x1000"],
+    "backends": ["RasterRow", "r.patch", "stream"],
+    "csvfile": "rmapcalctiled_benchmark.csv",
+}
+
+if config.has_section("GENERAL"):
+    for key in ["rows", "cols", "seed"]:
+        if config.has_option("GENERAL", key):
+            conf[key] = config.get("GENERAL", key)
+
+if config.has_section("TESTPARAMETERS"):
+    for key in ["nprocs", "tiles", "backends"]:
+        if config.has_option("TESTPARAMETERS", key):
+            conf[key] = config.get("TESTPARAMETERS", key).split(",")
+    if config.has_option("TESTPARAMETERS", "csvfile"):
+        conf["csvfile"] = config.get("TESTPARAMETERS", "csvfile")
+
+# synthetic input rasters of each cell type
+inputs = {
+    "bench_cell": "round(rand(0, 255))",
+    "bench_fcell": "float(rand(0.0, 1.0))",
+    "bench_dcell": "rand(0.0, 1.0)",
+}
+
+# fixed set of expressions: cheap integer, float arithmetic and neighborhood
+expressions = {
+    "threshold": "if(bench_cell > 200, 1, 0)",
+    "arithmetic": "bench_fcell * bench_dcell + sqrt(bench_cell)",
+    "neighborhood": "(bench_dcell[-1,0] + bench_dcell[1,0] + bench_dcell[0,-1]"
+    " + bench_dcell[0,1]) / 4.0",
+}
+
+
+def sync():
+    """Force writing everything to disk to minimize caching affecting the
+    benchmarks"""
+    if not sys.platform == "win32":
+        os.sync()
+
+
+def run(module, **kwargs):
+    """Run a module and return the elapsed time"""
+    start = time.time()
+    grass.run_command(module, overwrite=True, quiet=True, **kwargs)
+    elapsed = time.time() - start
+    sync()
+    return elapsed
+
+
+def tile_size(tiles, region, nprocs):
+    """Translate a tile shape of the config into r.mapcalc.tiled options"""
+    if tiles == "auto":
+        return {"tiling": "auto"}
+    if tiles == "strips":
+        rows = int(region["rows"])
+        return {"width": region["cols"], "height": -(-rows // int(nprocs))}
+    width, height = tiles.split("x")
+    return {"width": width, "height": height}
+
+
+grass.use_temp_region()
+grass.run_command(
+    "g.region", s=0, n=conf["rows"], w=0, e=conf["cols"], res=1, flags="a"
+)
+region = grass.region()
+cells = str(region["cells"])
+
+print("create synthetic rasters with %s cells" % cells)
+for name, formula in inputs.items():
+    grass.mapcalc(
+        "%s = %s" % (name, formula), seed=int(conf["seed"]), overwrite=True, quiet=True
+    )
+
+fieldnames = [
+    "expression",
+    "number of cells",
+    "nprocs",
+    "tiles",
+    "backend",
+    "time_rmapcalc",
+    "time_rmapcalctiled",
+]
+with open(conf["csvfile"], "w", newline="") as f:
+    writer = csv.DictWriter(f, fieldnames=fieldnames)
+    writer.writeheader()
+    for key, formula in expressions.items():
+        name = "bench_%s" % key
+        print("compute r.mapcalc for expression: %s" % key)
+        time_rmapcalc = run("r.mapcalc", expression="%s = %s" % (name, formula))
+        print("r.mapcalc time %s" % str(time_rmapcalc))
+        grass.run_command("g.remove", flags="f", type="raster", name=name)
+        for nprocs in conf["nprocs"]:
+            for tiles in conf["tiles"]:
+                for backend in conf["backends"]:
+                    print(
+                        "compute r.mapcalc.tiled for expression: %s, nprocs: %s, "
+                        "tiles: %s, backend: %s" % (key, nprocs, tiles, backend)
+                    )
+                    name = "bench_%s_tiled" % key
+                    try:
+                        time_rmapcalctiled = run(
+                            "r.mapcalc.tiled",
+                            expression="%s = %s" % (name, formula),
+                            nprocs=nprocs,
+                            patch_backend=backend,
+                            **tile_size(tiles, region, nprocs),
+                        )
+                    except grass.CalledModuleError:
+                        print("r.mapcalc.tiled failed, skipping")
+                        continue
+                    print("r.mapcalc.tiled time %s" % str(time_rmapcalctiled))
+                    grass.run_command("g.remove", flags="f", type="raster", name=name)
+                    writer.writerow(
+                        {
+                            "expression": key,
+                            "number of cells": cells,
+                            "nprocs": nprocs,
+                            "tiles": tiles,
+                            "backend": backend,
+                            "time_rmapcalc": str(time_rmapcalc),
+                            "time_rmapcalctiled": str(time_rmapcalctiled),
+                        }
+                    )
+                    f.flush()
+
+grass.run_command("g.remove", flags="f", type="raster", name=list(inputs))
+grass.del_temp_region()
+
+print("<%s> created" % conf["csvfile"])
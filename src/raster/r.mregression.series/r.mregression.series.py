@@ -49,12 +49,28 @@
 # % answer: ols
 # % multiple: no
 # %end
+# %option
+# % key: engine
+# % type: string
+# % description: Engine: loop (cell by cell), vectorized (blocks of rows)
+# % options: loop,vectorized
+# % required: no
+# % answer: loop
+# % multiple: no
+# %end
+# %option G_OPT_M_NPROCS
+# % description: Number of processes fitting blocks of rows (vectorized engine only)
+# %end
+# %option G_OPT_MEMORYMB
+# % description: Maximum memory used by a block of rows per process (vectorized engine only)
+# %end
 
 
 import os
 import sys
 
 import csv
+from multiprocessing import Pool
 import numpy as np
 from numpy.linalg.linalg import LinAlgError
 
@@ -67,6 +83,7 @@ if "GISBASE" not in os.environ:
 import grass.script as grass
 from grass.pygrass import raster
 from grass.pygrass.gis.region import Region
+from grass.pygrass.raster.buffer import Buffer
 
 CNULL = -2147483648  # null value for CELL maps
 FNULL = np.nan  # null value for FCELL and DCELL maps
@@ -118,13 +135,100 @@ def fit(y, x, model="ols"):
     return coefs
 
 
+def fit_block(Y, X, model="ols"):
+    """Fit the model for many pixels at once.
+
+    :param Y:   SxP matrix of output values (S samples, P pixels)
+    :param X:   SxFxP array of data points (F factors)
+    :return:    FxP matrix of coefficients, NULL where the system
+                can't be solved
+    """
+    sample_count, factor_count, pixel_count = X.shape
+    coefs = np.full((factor_count, pixel_count), FNULL)
+    # Samples with no-data are excluded for every pixel separately
+    valid = ~np.logical_or(np.isnan(Y), np.isnan(X).any(axis=1))
+    solvable = valid.sum(axis=0) >= factor_count
+    if not solvable.any():
+        return coefs
+
+    if model != "ols":
+        for p in np.flatnonzero(solvable):
+            coefs[:, p] = fit(Y[:, p], X[:, :, p], model)
+        return coefs
+
+    # Zeroed samples don't contribute to the least squares solution, so
+    # the masked system gives the same pseudoinverse solution as OLS
+    # over the non-NULL samples only
+    mask = valid[:, solvable].T  # PxS
+    x = np.where(mask[:, :, None], np.moveaxis(X[:, :, solvable], 2, 0), 0.0)
+    y = np.where(mask, Y[:, solvable].T, 0.0)
+    try:
+        coefs[:, solvable] = np.matmul(np.linalg.pinv(x), y[:, :, None])[:, :, 0].T
+    except LinAlgError:
+        for num, p in enumerate(np.flatnonzero(solvable)):
+            try:
+                coefs[:, p] = np.linalg.pinv(x[num]).dot(y[num])
+            except LinAlgError:
+                pass
+    return coefs
+
+
+def _get_row_or_nan(map, row_num):
+    """Return row of the map as float array with nan for nulls"""
+    row = np.array(map.get_row(row_num), dtype=np.float64)
+    if map.mtype == "CELL":
+        row[row == CNULL] = FNULL
+    return row
+
+
+# input rasters and settings of the worker processes
+WORKER = {}
+
+
+def _init_worker(y_names, x_names, model):
+    WORKER["y"] = [raster.RasterRow(name) for name in y_names]
+    WORKER["x"] = [[raster.RasterRow(name) for name in names] for names in x_names]
+    for map in WORKER["y"] + sum(WORKER["x"], []):
+        map.open()
+    WORKER["model"] = model
+
+
+def _close_worker():
+    for map in WORKER.get("y", []) + sum(WORKER.get("x", []), []):
+        if map.is_open():
+            map.close()
+
+
+def _fit_rows(rows):
+    """Read block of rows of all input maps and fit the model for all
+    pixels of the block. Returns coefficients (factors x rows x cols)
+    """
+    start, stop = rows
+    Y = np.array(
+        [[_get_row_or_nan(y, r) for r in range(start, stop)] for y in WORKER["y"]]
+    )
+    X = np.array(
+        [
+            [[_get_row_or_nan(x, r) for r in range(start, stop)] for x in maps]
+            for maps in WORKER["x"]
+        ]
+    )
+    sample_count, block_rows, cols = Y.shape
+    coefs = fit_block(
+        Y.reshape(sample_count, -1),
+        X.reshape(sample_count, X.shape[1], -1),
+        WORKER["model"],
+    )
+    return coefs.reshape(-1, block_rows, cols)
+
+
 def get_sample_names(filename, delimiter=","):
     """
     Analyse settings file, returns
     """
     with open(filename) as settings:
         reader = csv.reader(settings, delimiter=delimiter)
-        headers = reader.next()
+        headers = next(reader)
         inputs = []
         outputs = []
         for row in reader:
@@ -254,11 +358,58 @@ class DataModel(object):
         finally:
             self.close_rasters()
 
+    def fit_blocks(self, model="ols", overwrite=None, nprocs=1, memory=300):
+        """Fit the model by blocks of rows, the blocks are fitted by
+        nprocs processes and the coefficients are written by whole rows
+        """
+        reg = Region()
+        # inputs and the masked design matrices of a block
+        row_size = 8 * 3 * reg.cols * self.sample_count * (self.factor_count + 1)
+        block_rows = max(1, min(int(memory * 2**20 / row_size), reg.rows))
+        blocks = [
+            (start, min(start + block_rows, reg.rows))
+            for start in range(0, reg.rows, block_rows)
+        ]
+
+        outputs = [raster.RasterRow(name) for name in self.b_names]
+        pool = None
+        try:
+            for b in outputs:
+                b.open("w", mtype=self.mtype, overwrite=overwrite)
+            initargs = (self.y_names, self.x_names, model)
+            if nprocs > 1:
+                pool = Pool(nprocs, initializer=_init_worker, initargs=initargs)
+                results = pool.imap(_fit_rows, blocks)
+            else:
+                _init_worker(*initargs)
+                results = map(_fit_rows, blocks)
+
+            for num, coefs in enumerate(results):
+                grass.percent(num, len(blocks), 1)
+                for b, rows in zip(outputs, coefs):
+                    for row in rows:
+                        # convert the coefficients to the type of the map
+                        buf = Buffer((reg.cols,), mtype=b.mtype)
+                        buf[:] = row
+                        b.put_row(buf)
+            grass.percent(1, 1, 1)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            _close_worker()
+            for b in outputs:
+                if b.is_open():
+                    b.close()
+
 
 def main(options, flags):
     samples = options["samples"]
     res_pref = options["result_prefix"]
     model_type = options["model"]
+    engine = options["engine"]
+    nprocs = int(options["nprocs"])
+    memory = int(options["memory"])
     if not os.path.isfile(samples):
         sys.stderr.write("File '%s' doesn't exist.\n" % (samples,))
         sys.exit(1)
@@ -266,7 +417,12 @@ def main(options, flags):
     headers, outputs, inputs = get_sample_names(samples)
 
     model = DataModel(headers, outputs, inputs, res_pref)
-    model.fit(model=model_type, overwrite=grass.overwrite())
+    if engine == "vectorized":
+        model.fit_blocks(
+            model=model_type, overwrite=grass.overwrite(), nprocs=nprocs, memory=memory
+        )
+    else:
+        model.fit(model=model_type, overwrite=grass.overwrite())
     sys.exit(0)
 
 
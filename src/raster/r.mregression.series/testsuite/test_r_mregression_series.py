@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""
+MODULE:    Test of r.mregression.series
+
+PURPOSE:   Test that the vectorized engine gives the same coefficients as
+           the loop engine
+
+COPYRIGHT: (C) 2026 by the GRASS Development Team
+
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+"""
+import grass.script as gs
+
+from grass.gunittest.case import TestCase
+from grass.gunittest.main import test
+
+
+class TestEngines(TestCase):
+    """Compare the engines of r.mregression.series"""
+
+    samples = 8
+    headers = ["y", "offset", "x"]
+    settings = gs.tempfile(create=False)
+
+    @classmethod
+    def setUpClass(cls):
+        """Create synthetic series with some NULL samples"""
+        cls.use_temp_region()
+        cls.runModule("g.region", n=20, s=0, e=300, w=0, res=1)
+        cls.runModule("r.mapcalc", expression="mreg_ones = 1.0")
+        lines = [",".join(cls.headers)]
+        for t in range(cls.samples):
+            cls.runModule(
+                "r.mapcalc",
+                expression="mreg_x_{t} = float((row() + 1) * {t} + col())".format(t=t),
+            )
+            cls.runModule(
+                "r.mapcalc",
+                expression="mreg_y_{t} = if(row() == {t} && col() < 5, null(), "
+                "2.5 * mreg_x_{t} + 0.1 * col() + rand(-1.0, 1.0))".format(t=t),
+                seed=t + 1,
+            )
+            lines.append("mreg_y_{t},mreg_ones,mreg_x_{t}".format(t=t))
+        with open(cls.settings, "w") as settings:
+            settings.write("\n".join(lines) + "\n")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the temporary region and maps"""
+        cls.del_temp_region()
+        cls.runModule("g.remove", flags="f", type="raster", pattern="mreg_*")
+
+    def test_vectorized(self):
+        """Vectorized engine with one and more processes matches the loop"""
+        self.assertModule(
+            "r.mregression.series",
+            samples=self.settings,
+            result_prefix="mreg_loop.",
+            engine="loop",
+        )
+        for nprocs in (1, 3):
+            prefix = "mreg_vect{}.".format(nprocs)
+            self.assertModule(
+                "r.mregression.series",
+                samples=self.settings,
+                result_prefix=prefix,
+                engine="vectorized",
+                nprocs=nprocs,
+                memory=1,
+            )
+            for name in self.headers[1:]:
+                self.assertRastersNoDifference(
+                    actual=prefix + name,
+                    reference="mreg_loop." + name,
+                    precision=1e-4,
+                )
+
+
+if __name__ == "__main__":
+    test()
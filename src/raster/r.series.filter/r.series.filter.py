@@ -107,10 +107,28 @@
 # % description: Number of iterations
 # % answer: 1
 # %end
+# %option
+# % key: engine
+# % type: string
+# % required: no
+# % multiple: no
+# % options: loop,vectorized
+# % answer: loop
+# % description: Filtering engine
+# % descriptions: loop; Filter every pixel time series separately; vectorized; Filter blocks of rows at once along the time axis
+# %end
+# %option G_OPT_M_NPROCS
+# % description: Number of processes filtering blocks of rows (vectorized engine only)
+# %end
+# %option G_OPT_MEMORYMB
+# % description: Maximum memory used by a block of rows per process (vectorized engine only)
+# %end
 
 
 import os
 import sys
+import time
+from multiprocessing import Pool
 
 if "GISBASE" not in os.environ:
     sys.stderr.write("You must be in GRASS GIS to run this program.\n")
@@ -316,7 +334,7 @@ def _optimize_savgol(input_data, diff_penalty, deriv_penalty, itercount):
     map_count, npoints = input_data.shape
     best = np.inf
     best_winsize = best_order = None
-    for winsize in range(5, map_count / 2, 2):
+    for winsize in range(5, map_count // 2, 2):
         for order in range(
             2, min(winsize - 2, 10)
         ):  # 10 is a 'magic' number: we don't want very hight polynomyal fitting usually
@@ -340,7 +358,7 @@ def _optimize_median(input_data, diff_penalty, deriv_penalty, itercount):
     map_count, npoints = input_data.shape
     best = np.inf
     best_winsize = order = None
-    for winsize in range(3, map_count / 2, 2):
+    for winsize in range(3, map_count // 2, 2):
         test_data = np.copy(input_data)
         test_data = _filter("median", test_data, winsize, order, itercount, False)
         penalty = fitting_quality(input_data, test_data, diff_penalty, deriv_penalty)
@@ -378,6 +396,129 @@ def filter(method, names, winsize, order, prefix, itercount, fit_up):
         close_rasters(inputs)
 
 
+def sample_points(names, npoints):
+    """Read time series of 'npoints' random pixels with some data into
+    contiguous array (maps x points). Every needed row of every map is
+    read only once.
+    """
+    reg = Region()
+    inputs = [raster.RasterRow(name) for name in names]
+    samples = []
+    count = 0
+    try:
+        open_rasters(inputs)
+        while count < npoints:
+            rows = np.random.randint(reg.rows, size=npoints - count)
+            cols = np.random.randint(reg.cols, size=npoints - count)
+            order = np.argsort(rows, kind="stable")
+            rows, cols = rows[order], cols[order]
+            data = np.empty((len(inputs), rows.size))
+            for map_num, map in enumerate(inputs):
+                for row in np.unique(rows):
+                    sel = rows == row
+                    data[map_num, sel] = _get_row_or_nan(map, int(row))[cols[sel]]
+            valid = ~np.isnan(data).all(axis=0)
+            if not valid.any():
+                grass.fatal("Can't find points with non NULL data.")
+            if not valid.all():
+                grass.warning(
+                    "%d selected points contain NULL values in all input maps. "
+                    "Performing of selection another points." % np.sum(~valid)
+                )
+            samples.append(data[:, valid])
+            count += np.sum(valid)
+    finally:
+        close_rasters(inputs)
+
+    return np.ascontiguousarray(np.concatenate(samples, axis=1))
+
+
+def _init_scorer(samples, params):
+    WORKER["samples"] = samples
+    WORKER["params"] = params
+
+
+def _score_candidate(candidate):
+    """Filter the sampled series with one (winsize, order) candidate.
+    Returns winsize, order, penalty and elapsed time
+    """
+    winsize, order = candidate
+    params = WORKER["params"]
+    samples = WORKER["samples"]
+    start = time.time()
+    fitted = _filter_block(
+        params["method"], samples, winsize, order, params["itercount"], False
+    )
+    penalty = fitting_quality(
+        samples, fitted, params["diff_penalty"], params["deriv_penalty"]
+    )
+    return winsize, order, penalty, time.time() - start
+
+
+def optimize_params_batch(
+    method, names, npoints, diff_penalty, deriv_penalty, itercount, nprocs
+):
+    """Find winsize and order that minimize the quality function like
+    optimize_params, but the samples are read only once and all
+    candidates are scored by nprocs processes
+    """
+    map_count = len(names)
+    if method == "savgol":
+        # 10 is a 'magic' number: we don't want very hight polynomyal fitting usually
+        candidates = [
+            (winsize, order)
+            for winsize in range(5, map_count // 2, 2)
+            for order in range(2, min(winsize - 2, 10))
+        ]
+    elif method == "median":
+        candidates = [(winsize, None) for winsize in range(3, map_count // 2, 2)]
+    else:
+        grass.fatal("The method is not implemented")
+
+    start = time.time()
+    samples = sample_points(names, npoints)
+    grass.verbose(
+        "%d points sampled in %.2f s" % (samples.shape[1], time.time() - start)
+    )
+
+    params = dict(
+        method=method,
+        itercount=itercount,
+        diff_penalty=diff_penalty,
+        deriv_penalty=deriv_penalty,
+    )
+    if nprocs > 1:
+        pool = Pool(nprocs, initializer=_init_scorer, initargs=(samples, params))
+        results = pool.imap(_score_candidate, candidates)
+    else:
+        pool = None
+        _init_scorer(samples, params)
+        results = map(_score_candidate, candidates)
+
+    best = np.inf
+    best_winsize = best_order = None
+    try:
+        for winsize, order, penalty, elapsed in results:
+            grass.message(
+                "winsize=%d order=%s penalty=%f time=%.3f s"
+                % (winsize, order, penalty, elapsed)
+            )
+            if penalty < best:
+                best = penalty
+                best_winsize, best_order = winsize, order
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if best_winsize is not None:
+        grass.message(
+            "Optimal parameters: winsize=%d order=%s penalty=%f (%.2f s)"
+            % (best_winsize, best_order, best, time.time() - start)
+        )
+    return best_winsize, best_order
+
+
 def get_val_or_nan(map, row, col):
     """
     Return map value of the cell or FNULL (if the cell is null)
@@ -394,10 +535,177 @@ def _get_row_or_nan(raster, row_num):
         return row
     nans = row == CNULL
     row = row.astype(np.float64)
-    row[nans.astype(np.bool)] = np.nan
+    row[nans] = np.nan
     return row
 
 
+def _fill_nulls_block(data):
+    """Fill no-data values of every column of 2d array by linear
+    interpolation along the first (time) axis, like _fill_nulls.
+    Columns without any data are left unchanged.
+    """
+    valid = ~np.isnan(data)
+    if valid.all():
+        return data
+    size = data.shape[0]
+    idx = np.arange(size)[:, None]
+    prev = np.maximum.accumulate(np.where(valid, idx, -1), axis=0)
+    nxt = np.minimum.accumulate(np.where(valid, idx, size)[::-1], axis=0)[::-1]
+    # constant extrapolation at both ends of the series
+    prev_ok = prev >= 0
+    next_ok = nxt < size
+    prev = np.where(prev_ok, prev, nxt)
+    nxt = np.where(next_ok, nxt, prev)
+    empty = ~valid.any(axis=0)
+    prev[:, empty] = nxt[:, empty] = 0
+    cols = np.arange(data.shape[1])
+    prev_val = data[prev, cols]
+    next_val = data[nxt, cols]
+    span = np.where(nxt > prev, nxt - prev, 1)
+    filled = prev_val + (next_val - prev_val) * (idx - prev) / span
+    return np.where(valid | empty, data, filled)
+
+
+def _smooth_block(method, data, winsize, order):
+    """Run one pass of the filter along the time axis of 2d array"""
+    if method == "savgol":
+        return savgol_filter(data, winsize, order, axis=0, mode="nearest")
+    elif method == "median":
+        # the kernel spans the time axis only
+        return medfilt(data, kernel_size=[winsize, 1])
+    grass.fatal("The method is not implemented")
+
+
+def _filter_up_block(method, data, winsize, order):
+    """Vectorized version of _filter_up for all columns of 2d array.
+    Every column stops iterating when its own optimum was found.
+    """
+    init_data = np.copy(data)
+    arr = np.copy(data)
+    result = np.copy(data)
+    old_arr = np.copy(data)
+    cols = data.shape[1]
+    active = np.ones(cols, dtype=bool)
+    old_f = np.full(cols, np.inf)
+    cur_f = np.full(cols, np.inf)
+
+    while winsize > order + 2 and active.any():
+        trend = _smooth_block(method, arr[:, active], winsize, order)
+        difference = trend - init_data[:, active]
+        above = difference > 0
+        max_diff = np.max(difference, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            wk = np.where(above, 1.0 - difference / max_diff, 1.0)
+
+        old_arr[:, active] = arr[:, active]
+        arr[:, active] = np.where(above, trend, arr[:, active])
+
+        f = np.sum(np.abs(difference) * wk, axis=0)
+        found = (old_f[active] > cur_f[active]) & (cur_f[active] < f)
+        # old_arr contains the optimal results of the finished columns
+        done = np.flatnonzero(active)[found]
+        result[:, done] = old_arr[:, done]
+        old_f[active] = cur_f[active]
+        cur_f[active] = f
+        active[done] = False
+        winsize -= 2
+
+    result[:, active] = old_arr[:, active]
+    return result
+
+
+def _filter_block(method, data, winsize, order, itercount, fit_up):
+    """Filter 2d array of pixel time series (time x pixels) at once.
+    Gives the same results as _filter.
+    """
+    result = np.copy(data)
+    cols = np.flatnonzero(~np.isnan(data).all(axis=0))
+    if cols.size == 0:
+        return result
+    arr = _fill_nulls_block(data[:, cols])
+    if fit_up:
+        arr = _filter_up_block(method, arr, winsize, order)
+    else:
+        for j in range(itercount):
+            arr = _smooth_block(method, arr, winsize, order)
+    result[:, cols] = arr
+    return result
+
+
+# rasters and parameters of the worker processes
+WORKER = {}
+
+
+def _init_worker(names, params):
+    WORKER["inputs"] = [raster.RasterRow(name) for name in names]
+    open_rasters(WORKER["inputs"])
+    WORKER["params"] = params
+
+
+def _filter_rows(rows):
+    """Read block of rows of all input maps and filter it.
+    Returns filtered data (maps x rows x cols)
+    """
+    start, stop = rows
+    inputs = WORKER["inputs"]
+    data = np.array(
+        [[_get_row_or_nan(r, i) for i in range(start, stop)] for r in inputs],
+        dtype=np.float64,
+    )
+    shape = data.shape
+    filtered = _filter_block(data=data.reshape(shape[0], -1), **WORKER["params"])
+    return filtered.reshape(shape)
+
+
+def filter_vectorized(
+    method, names, winsize, order, prefix, itercount, fit_up, nprocs, memory
+):
+    """Filter the series by blocks of rows, the blocks are filtered by
+    nprocs processes and written in order of the rows
+    """
+    reg = Region()
+    # the block is held several times during filtering
+    block_rows = int(memory * 2**20 / (8 * 4 * len(names) * reg.cols))
+    block_rows = max(1, min(block_rows, reg.rows))
+    blocks = [
+        (start, min(start + block_rows, reg.rows))
+        for start in range(0, reg.rows, block_rows)
+    ]
+    params = dict(
+        method=method,
+        winsize=winsize,
+        order=order,
+        itercount=itercount,
+        fit_up=fit_up,
+    )
+
+    outputs = [raster.RasterRow(prefix + name) for name in names]
+    pool = None
+    try:
+        open_rasters(outputs, write=True)
+        if nprocs > 1:
+            pool = Pool(nprocs, initializer=_init_worker, initargs=(names, params))
+            results = pool.imap(_filter_rows, blocks)
+        else:
+            _init_worker(names, params)
+            results = map(_filter_rows, blocks)
+
+        for num, filtered in enumerate(results):
+            grass.percent(num, len(blocks), 1)
+            for out_map, rows in zip(outputs, filtered):
+                for row in rows:
+                    buf = Buffer((reg.cols,), mtype=out_map.mtype)
+                    buf[:] = row
+                    out_map.put_row(buf)
+        grass.percent(1, 1, 1)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        close_rasters(WORKER.get("inputs", []))
+        close_rasters(outputs)
+
+
 def main(options, flags):
 
     optimize = flags["c"]
@@ -430,6 +738,10 @@ def main(options, flags):
 
     res_prefix = options["result_prefix"]
 
+    engine = options["engine"]
+    nprocs = int(options["nprocs"])
+    memory = int(options["memory"])
+
     N = len(xnames)
     if N < winsize:
         grass.fatal(
@@ -444,13 +756,37 @@ def main(options, flags):
         grass.fatal("Order of the filter must be less than window length")
 
     if optimize:
-        winsize, order = optimize_params(
-            method, xnames, opt_points, diff_penalty, deriv_penalty, itercount
-        )
+        if engine == "vectorized":
+            winsize, order = optimize_params_batch(
+                method,
+                xnames,
+                opt_points,
+                diff_penalty,
+                deriv_penalty,
+                itercount,
+                nprocs,
+            )
+        else:
+            winsize, order = optimize_params(
+                method, xnames, opt_points, diff_penalty, deriv_penalty, itercount
+            )
         if winsize is None:
             grass.fatal("Optimization procedure doesn't convergence.")
 
-    filter(method, xnames, winsize, order, res_prefix, itercount, fit_up)
+    if engine == "vectorized":
+        filter_vectorized(
+            method,
+            xnames,
+            winsize,
+            order,
+            res_prefix,
+            itercount,
+            fit_up,
+            nprocs,
+            memory,
+        )
+    else:
+        filter(method, xnames, winsize, order, res_prefix, itercount, fit_up)
 
 
 if __name__ == "__main__":
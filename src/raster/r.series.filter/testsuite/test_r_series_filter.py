@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+"""
+MODULE:    Test of r.series.filter
+
+PURPOSE:   Test that the vectorized engine gives the same results as the
+           loop engine
+
+COPYRIGHT: (C) 2026 by the GRASS Development Team
+
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+"""
+from grass.gunittest.case import TestCase
+from grass.gunittest.main import test
+
+
+class TestEngines(TestCase):
+    """Compare the engines of r.series.filter"""
+
+    count = 20
+    names = ["sfilter_{:02d}".format(t) for t in range(count)]
+
+    @classmethod
+    def setUpClass(cls):
+        """Create a noisy series with some NULL cells"""
+        cls.use_temp_region()
+        cls.runModule("g.region", n=20, s=0, e=300, w=0, res=1)
+        for t, name in enumerate(cls.names):
+            cls.runModule(
+                "r.mapcalc",
+                expression="{name} = if(row() == {t} && col() < 10, null(), "
+                "sin({t} * 18 + col()) + rand(-0.3, 0.3))".format(name=name, t=t),
+                seed=t + 1,
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the temporary region and maps"""
+        cls.del_temp_region()
+        cls.runModule("g.remove", flags="f", type="raster", pattern="*sfilter_*")
+
+    def compare_engines(self, prefix, **kwargs):
+        """Run both engines and compare the filtered series"""
+        self.assertModule(
+            "r.series.filter",
+            input=self.names,
+            result_prefix="loop_" + prefix,
+            engine="loop",
+            **kwargs,
+        )
+        for nprocs in (1, 3):
+            vect_prefix = "vect{}_{}".format(nprocs, prefix)
+            self.assertModule(
+                "r.series.filter",
+                input=self.names,
+                result_prefix=vect_prefix,
+                engine="vectorized",
+                nprocs=nprocs,
+                memory=1,
+                **kwargs,
+            )
+            for name in self.names:
+                self.assertRastersNoDifference(
+                    actual=vect_prefix + name,
+                    reference="loop_" + prefix + name,
+                    precision=1e-8,
+                )
+
+    def test_savgol(self):
+        """Savitzky-Golay filter"""
+        self.compare_engines("savgol_", method="savgol", winsize=9, order=2)
+
+    def test_median_upper(self):
+        """Median filter fitting the upper boundary"""
+        self.compare_engines("median_", method="median", winsize=5, flags="u")
+
+
+if __name__ == "__main__":
+    test()
@@ -32,9 +32,9 @@
 # %option
 # % key: method
 # % type: string
-# % description: Texture method to apply
+# % description: Texture method(s) to apply
 # % required: yes
-# % multiple: no
+# % multiple: yes
 # % options: asm,contrast,corr,var,idm,sa,sv,se,entr,dv,de,moc1,moc2
 # %end
 #
@@ -88,6 +88,8 @@
 
 
 import math
+from multiprocessing import Pool
+
 import grass.script as gscript
 from grass.pygrass.modules.grid.grid import *
 
@@ -116,21 +118,32 @@ class MyGridModule(GridModule):
         }
         mset = loc[self.mset.name]
         mset.visible.extend(loc.mapsets())
-        method = self.module.inputs["method"].value[0]
+        methods = self.module.inputs["method"].value
+        if isinstance(methods, str):
+            methods = methods.split(",")
+        outputs = []
         for otmap in self.module.outputs:
             otm = self.module.outputs[otmap]
             if otm.typedesc == "raster" and otm.value:
-                otm.value = "%s_%s" % (otm.value, methods_dic[method])
-                rpatch_map(
-                    otm.value,
-                    self.mset.name,
-                    self.msetstr,
-                    bboxes,
-                    self.module.flags.overwrite,
-                    self.start_row,
-                    self.start_col,
-                    self.out_prefix,
+                outputs.extend(
+                    "%s_%s" % (otm.value, methods_dic[method]) for method in methods
                 )
+        # each method has its own output map, so they can be patched in parallel
+        args = [
+            (
+                output,
+                self.mset.name,
+                self.msetstr,
+                bboxes,
+                self.module.flags.overwrite,
+                self.start_row,
+                self.start_col,
+                self.out_prefix,
+            )
+            for output in outputs
+        ]
+        with Pool(processes=max(1, min(self.processes, len(args)))) as pool:
+            pool.starmap(rpatch_map, args)
 
 
 def main():
@@ -139,7 +152,7 @@ def main():
     outputprefix = options["output"]
     windowsize = int(options["size"])
     distance = int(options["distance"])
-    texture_method = options["method"]
+    texture_methods = options["method"].split(",")
     width = int(options["tile_width"])
     height = int(options["tile_height"])
     overlap = math.ceil(windowsize / 2.0)
@@ -153,7 +166,7 @@ def main():
         "output": outputprefix,
         "size": windowsize,
         "distance": distance,
-        "method": texture_method,
+        "method": texture_methods,
         "flags": "n",
         "quiet": True,
     }
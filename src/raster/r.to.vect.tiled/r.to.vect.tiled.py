@@ -103,11 +103,94 @@
 # % guisection: Tiling
 # %end
 
+# %option G_OPT_M_NPROCS
+# % answer: 1
+# % guisection: Tiling
+# %end
+
+import math
+import os
 import sys
+from multiprocessing import Pool
 
 import grass.script as grass
 
 
+def vectorize_tile(tile):
+    """Convert a single tile to vector in its own region
+
+    The region of the tile is passed to the modules through GRASS_REGION,
+    so that the current region is not modified and the tiles can be
+    processed in parallel.
+
+    :return: name of the vector tile, or None if the clipped tile is empty
+    """
+    env = os.environ.copy()
+    env["GRASS_REGION"] = grass.region_env(**tile["region"])
+    grass.run_command(
+        "r.to.vect",
+        input=tile["input"],
+        output=tile["tilename"],
+        type=tile["type"],
+        column=tile["column"],
+        flags=tile["flags"],
+        env=env,
+    )
+
+    outname = tile["outname"]
+    if tile["clip_region"] is None:
+        # write cmd history:
+        grass.vector_history(outname)
+        return outname
+
+    tilename = tile["tilename"]
+    if grass.vector_info_topo(tilename)["areas"] > 0:
+        env["GRASS_REGION"] = grass.region_env(**tile["clip_region"])
+        extname = tile["extname"]
+        grass.run_command("v.in.region", output=extname, flags="d", env=env)
+        grass.run_command(
+            "v.overlay",
+            ainput=tilename,
+            binput=extname,
+            output=outname,
+            operator="and",
+            olayer="0,1,0",
+        )
+        grass.run_command(
+            "g.remove", flags="f", type="vector", name=extname, quiet=True
+        )
+    else:
+        outname = None
+
+    grass.run_command("g.remove", flags="f", type="vector", name=tilename, quiet=True)
+
+    return outname
+
+
+def patch_tiles(inputs, output):
+    """Patch a group of vector tiles and remove them"""
+    grass.run_command("v.patch", input=inputs, output=output, flags="e")
+    grass.run_command("g.remove", flags="f", type="vector", name=inputs, quiet=True)
+
+
+def merge_tiles(vtiles, output, pool, nprocs):
+    """Patch the vector tiles as a parallel merge tree
+
+    The tiles are first patched in parallel into nprocs intermediate maps
+    which are finally patched into the output.
+    """
+    level = 0
+    while nprocs > 1 and len(vtiles) > nprocs:
+        size = int(math.ceil(len(vtiles) / float(nprocs)))
+        groups = [vtiles[i : i + size] for i in range(0, len(vtiles), size)]
+        names = ["%s_merge_%d_%d" % (output, level, i) for i in range(len(groups))]
+        pool.starmap(patch_tiles, zip(groups, names))
+        vtiles = names
+        level += 1
+
+    patch_tiles(vtiles, output)
+
+
 def main():
     input = options["input"]
     output = options["output"]
@@ -115,6 +198,7 @@ def main():
     ftype = options["type"]
     xtiles = int(options["x"])
     ytiles = int(options["y"])
+    nprocs = int(options["nprocs"])
 
     rtvflags = ""
     for key in "sbtvz":
@@ -126,10 +210,11 @@ def main():
         grass.fatal(_("Number of tiles in x direction must be > 0"))
     if ytiles < 0:
         grass.fatal(_("Number of tiles in y direction must be > 0"))
+    if nprocs <= 0:
+        grass.fatal(_("Number of processes must be > 0"))
     if grass.find_file(name=input)["name"] == "":
         grass.fatal(_("Input raster %s not found") % input)
 
-    grass.use_temp_region()
     curr = grass.region()
     width = int(curr["cols"] / xtiles)
     if width <= 1:
@@ -160,8 +245,7 @@ def main():
     if s >= n:
         grass.fatal(_("Overlap is too large"))
 
-    datatype = grass.raster_info(input)["datatype"]
-    vtiles = None
+    tiles = []
 
     # north to south
     for ytile in range(ytiles):
@@ -177,8 +261,6 @@ def main():
             if xtile == xtiles - 1:
                 e = curr["e"]
 
-            grass.run_command("g.region", n=n, s=s, e=e, w=w, nsres=nsres, ewres=ewres)
-
             if do_clip:
                 tilename = output + "_stile_" + str(ytile) + str(xtile)
             else:
@@ -186,15 +268,7 @@ def main():
 
             outname = output + "_tile_" + str(ytile) + str(xtile)
 
-            grass.run_command(
-                "r.to.vect",
-                input=input,
-                output=tilename,
-                type=ftype,
-                column=column,
-                flags=rtvflags,
-            )
-
+            clip_region = None
             if do_clip:
                 n2 = curr["n"] - ytile * height * nsres - yoverlap2
                 s2 = n2 - height * nsres
@@ -212,49 +286,29 @@ def main():
                 if xtile == xtiles - 1:
                     e2 = curr["e"]
 
-                tilename = output + "_stile_" + str(ytile) + str(xtile)
-                if grass.vector_info_topo(tilename)["areas"] > 0:
-                    grass.run_command(
-                        "g.region", n=n2, s=s2, e=e2, w=w2, nsres=nsres, ewres=ewres
-                    )
-
-                    extname = "extent_tile_" + str(ytile) + str(xtile)
-                    grass.run_command("v.in.region", output=extname, flags="d")
-                    outname = output + "_tile_" + str(ytile) + str(xtile)
-                    grass.run_command(
-                        "v.overlay",
-                        ainput=tilename,
-                        binput=extname,
-                        output=outname,
-                        operator="and",
-                        olayer="0,1,0",
-                    )
-                    grass.run_command(
-                        "g.remove", flags="f", type="vector", name=extname, quiet=True
-                    )
-
-                    if vtiles is None:
-                        vtiles = outname
-                    else:
-                        vtiles = vtiles + "," + outname
-
-                grass.run_command(
-                    "g.remove", flags="f", type="vector", name=tilename, quiet=True
-                )
-
-            else:
-                # write cmd history:
-                grass.vector_history(outname)
-                if vtiles is None:
-                    vtiles = outname
-                else:
-                    vtiles = vtiles + "," + outname
+                clip_region = dict(n=n2, s=s2, e=e2, w=w2, nsres=nsres, ewres=ewres)
+
+            tiles.append(
+                {
+                    "input": input,
+                    "type": ftype,
+                    "column": column,
+                    "flags": rtvflags,
+                    "region": dict(n=n, s=s, e=e, w=w, nsres=nsres, ewres=ewres),
+                    "clip_region": clip_region,
+                    "tilename": tilename,
+                    "outname": outname,
+                    "extname": "extent_tile_" + str(ytile) + str(xtile),
+                }
+            )
 
-    if flags["p"]:
-        grass.run_command("v.patch", input=vtiles, output=output, flags="e")
+    with Pool(processes=nprocs) as pool:
+        vtiles = [i for i in pool.map(vectorize_tile, tiles) if i is not None]
 
-        grass.run_command("g.remove", flags="f", type="vector", name=vtiles, quiet=True)
+        if flags["p"]:
+            merge_tiles(vtiles, output, pool, nprocs)
 
+    if flags["p"]:
         if grass.vector_info_topo(output)["boundaries"] > 0:
             outpatch = output + "_patch"
             grass.run_command("g.rename", vector=(output, outpatch))
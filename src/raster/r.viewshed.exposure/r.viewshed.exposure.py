@@ -155,6 +155,18 @@ for details.
 # % guisection: Sampling
 # %end
 
+# %option
+# % key: engine
+# % type: string
+# % required: no
+# % key_desc: name
+# % label: Engine used to compute the binary viewsheds
+# % description: r.viewshed runs r.viewshed for each point, numpy computes the line of sight in-process (fast for short exposure ranges)
+# % options: r.viewshed, numpy
+# % answer: r.viewshed
+# % guisection: Viewshed
+# %end
+
 # %flag
 # % key: r
 # % label: Consider the effect of atmospheric refraction
@@ -184,7 +196,7 @@ import math
 import atexit
 import sys
 import subprocess
-from multiprocessing import Pool
+from multiprocessing import Lock, Pool
 from copy import deepcopy
 import numpy as np
 import itertools
@@ -204,6 +216,10 @@ from grass.script import utils as grassutils
 # Declare global variables
 # random name of binary viewshed
 TEMPNAME = grass.tempname(12)
+# Earth radius used for curvature correction (WGS84 semi-major axis)
+EARTH_RADIUS = 6378137.0
+# Locks of the row blocks of the shared cumulative viewshed, set per worker
+ACC_LOCKS = None
 
 
 def cleanup():
@@ -285,13 +301,158 @@ def clean_temp(pid):
             rmtree(path)
 
 
+def dsm_to_npy(r_dsm, dsm_type, filename):
+    """Write digital surface model in computational region to a .npy file
+    which can be memory-mapped read-only by all workers
+    :param r_dsm: Name of digital surface model raster
+    :type r_dsm: string
+    :param dsm_type: Raster map precision type
+    :type dsm_type: string
+    :param filename: Path of .npy file to write
+    :type filename: string
+    :return: Path of .npy file
+    :rtype: string
+    """
+    reg = Region()
+    np_dsm = np.lib.format.open_memmap(
+        filename, mode="w+", dtype=np.single, shape=(reg.rows, reg.cols)
+    )
+
+    # Read DSM row by row with single precision and replace NoData
+    with RasterRow(r_dsm) as dsm:
+        for row in range(reg.rows):
+            np_dsm[row] = dsm[row]
+
+    if dsm_type == "CELL":
+        np_dsm[np_dsm == -2147483648] = np.nan
+
+    np_dsm.flush()
+    del np_dsm
+
+    return filename
+
+
+def numpy_viewshed(
+    np_dsm,
+    t_row,
+    t_col,
+    nsres,
+    ewres,
+    max_distance,
+    v_elevation,
+    curvature,
+    refr_coeff,
+):
+    """Compute binary viewshed from an exposure source point in-process.
+    Lines of sight from the source point to all cells of the local region are
+    sampled where they cross rows or columns of the DSM (R3-style), processed
+    ring by ring around the source point.
+    Like r.viewshed -b, the source point is elevated by 0 and the target cells
+    by the observer elevation.
+    :param np_dsm: 2D array of digital surface model in local region
+    :type np_dsm: ndarray
+    :param t_row: Row of exposure source point in local region
+    :type t_row: int
+    :param t_col: Column of exposure source point in local region
+    :type t_col: int
+    :param nsres: North-south resolution of the region
+    :type nsres: float
+    :param ewres: East-west resolution of the region
+    :type ewres: float
+    :param max_distance: Exposure range
+    :type max_distance: float
+    :param v_elevation: Observer height
+    :type v_elevation: float
+    :param curvature: Consider the curvature of the earth
+    :type curvature: bool
+    :param refr_coeff: Refraction coefficient, 0 to ignore refraction
+    :type refr_coeff: float
+    :return: 2D array of binary viewshed, visible = 1, invisible = 0,
+             NaN beyond exposure range and for NoData
+    :rtype: ndarray
+    """
+    rows, cols = np_dsm.shape
+    np_viewshed = np.full((rows, cols), np.nan, dtype=np.single)
+
+    z_t = np_dsm[t_row, t_col]
+    if np.isnan(z_t):
+        return np_viewshed
+
+    d_row, d_col = np.indices((rows, cols))
+    d_row -= t_row
+    d_col -= t_col
+    # horizontal distance in map units, lines of sight are straight in cell
+    # space as well, so the sweep below does not depend on the resolution
+    dist = np.hypot(d_row * nsres, d_col * ewres)
+
+    # elevation relative to source point, corrected for curvature
+    z_rel = np_dsm - z_t
+    if curvature:
+        z_rel -= dist**2 / (2 * EARTH_RADIUS) * (1 - refr_coeff)
+
+    # Process cells in rings of increasing distance from the source point
+    steps = np.maximum(np.abs(d_row), np.abs(d_col)).ravel()
+    in_range = dist.ravel() <= max_distance
+    order = np.flatnonzero(in_range)
+    order = order[np.argsort(steps[order], kind="stable")]
+    bounds = np.searchsorted(steps[order], np.arange(steps.max() + 2))
+
+    visible = np.ones(rows * cols, dtype=bool)
+    z_flat = z_rel.ravel()
+    z_cols = np.ascontiguousarray(z_rel.T)
+    d_row = d_row.ravel()
+    d_col = d_col.ravel()
+    for k in range(2, steps.max() + 1):
+        ring = order[bounds[k] : bounds[k + 1]]
+        if ring.size == 0:
+            continue
+
+        # Lines of sight cross rows if they are steeper than 45 degrees and
+        # columns otherwise. Sample the elevation at every crossing and
+        # interpolate it linearly between the two neighbouring cells
+        fraction = np.arange(1, k)[:, np.newaxis] / k
+        horizon = np.empty(ring.size)
+        row_major = np.abs(d_row[ring]) == k
+        for lines, major, minor, t_major, t_minor, z_lines in (
+            (row_major, d_row, d_col, t_row, t_col, z_rel),
+            (~row_major, d_col, d_row, t_col, t_row, z_cols),
+        ):
+            if not lines.any():
+                continue
+            s_major = t_major + np.arange(1, k)[:, np.newaxis] * np.sign(
+                major[ring[lines]]
+            )
+            s_minor = t_minor + fraction * minor[ring[lines]]
+            m_0 = np.floor(s_minor).astype(int)
+            weight = s_minor - m_0
+            m_1 = np.minimum(m_0 + 1, z_lines.shape[1] - 1)
+            z_s = z_lines[s_major, m_0] * (1 - weight) + z_lines[s_major, m_1] * weight
+
+            # Steepest gradient along the line of sight, NoData does not block
+            horizon[lines] = np.fmax.reduce(z_s / fraction, axis=0)
+
+        visible[ring] = ~(z_flat[ring] + v_elevation < horizon)
+
+    np_viewshed.ravel()[order] = visible[order]
+    np_viewshed[np.isnan(np_dsm)] = np.nan
+
+    return np_viewshed
+
+
+def init_worker(locks):
+    """Make locks of the shared accumulator available to a worker process
+    :param locks: Locks of the row blocks of the shared accumulator
+    :type locks: list
+    """
+    global ACC_LOCKS
+    ACC_LOCKS = locks
+
+
 def do_it_all(global_vars, target_pts_np):
-    """Conduct weighted and parametrised partial viewshed and cummulate it with
-    the previous partial viewsheds
+    """Conduct weighted and parametrised partial viewshed and cummulate it
+    into the shared cumulative viewshed
     :param target_pts_np: Array of target points in global coordinate system
     :type target_pts_np: ndarray
-    :return: 2D array of weighted parametrised cumulative viewshed
-    :rtype: ndarray
     """
     # Set counter
     counter = 1
@@ -300,20 +461,27 @@ def do_it_all(global_vars, target_pts_np):
     reg = global_vars["region"]
     exp_range = global_vars["range"]
     flagstring = global_vars["flagstring"]
+    engine = global_vars["engine"]
     r_dsm = global_vars["r_dsm"]
+    dsm_file = global_vars["dsm_file"]
     v_elevation = global_vars["observer_elevation"]
     refr_coeff = global_vars["refr_coeff"]
     memory = global_vars["memory"]
     parametrise_viewshed = global_vars["param_viewshed"]
-    dsm_type = global_vars["dsm_type"]
     b_1 = global_vars["b_1"]
     cores = global_vars["cores"]
     tempname = global_vars["tempname"]
+    acc_file = global_vars["acc_file"]
+    lock_rows = global_vars["lock_rows"]
+
+    # Map DSM of the global region once for all points, read-only
+    np_dsm_glob = np.load(dsm_file, mmap_mode="r")
 
-    # Create empty viewshed
-    np_cum = np.empty((reg.rows, reg.cols), dtype=np.single)
-    np_cum[:] = np.nan
+    # Map cumulative viewshed shared by all workers
+    np_cum = np.load(acc_file, mmap_mode="r+")
     tmp_vs = "{}_{}".format(tempname, os.getpid())
+    curvature = "c" in flagstring
+    refraction = "r" in flagstring
 
     for target_pnt in target_pts_np:
 
@@ -364,34 +532,19 @@ def do_it_all(global_vars, target_pts_np):
 
         lreg_shape = [lreg.rows, lreg.cols]
 
-        # ======================================================================
-        # 2. Calculate binary viewshed and convert to numpy
-        # ======================================================================
-        vs = grass.pipe_command(
-            "r.viewshed",
-            flags="b" + flagstring,
-            input=r_dsm,
-            output=tmp_vs,
-            coordinates="{},{}".format(t_glob[0], t_glob[1]),
-            observer_elevation=0.0,
-            target_elevation=v_elevation,
-            max_distance=exp_range,
-            refraction_coeff=refr_coeff,
-            memory=int(round(memory / cores)),
-            quiet=True,
-            overwrite=True,
-            env=c_env,
-        )
-        vs.communicate()
-        # Workaround for https://github.com/OSGeo/grass/issues/1436
-        clean_temp(vs.pid)
+        # Determine position of local region within global region
+        o_2 = [
+            int(round((reg.north - loc_reg_n) / reg.nsres)),  # NS (rows)
+            int(round((loc_reg_w - reg.west) / reg.ewres)),  # EW (cols)
+        ]
 
-        # Read viewshed into numpy with single precision and replace NoData
-        np_viewshed = raster2numpy(tmp_vs).astype(np.single)
-        np_viewshed[np_viewshed == -2147483648] = np.nan
+        # Slice DSM of local region out of the shared global DSM
+        np_dsm = np_dsm_glob[
+            o_2[0] : o_2[0] + lreg_shape[0], o_2[1] : o_2[1] + lreg_shape[1]
+        ]
 
         # ======================================================================
-        # 3. Prepare local coordinates and attributes of target point T
+        # 2. Prepare local coordinates and attributes of target point T
         # ======================================================================
         # Calculate how much of rows/cols of local region lies
         # outside global region
@@ -410,6 +563,46 @@ def do_it_all(global_vars, target_pts_np):
             t_glob[2:],
         )
 
+        # ======================================================================
+        # 3. Calculate binary viewshed and convert to numpy
+        # ======================================================================
+        if engine == "numpy":
+            # Compute line of sight in-process on the DSM of the local region
+            np_viewshed = numpy_viewshed(
+                np_dsm,
+                int(t_loc[0]),
+                int(t_loc[1]),
+                reg.nsres,
+                reg.ewres,
+                exp_range,
+                v_elevation,
+                curvature,
+                refr_coeff if refraction else 0.0,
+            )
+        else:
+            vs = grass.pipe_command(
+                "r.viewshed",
+                flags="b" + flagstring,
+                input=r_dsm,
+                output=tmp_vs,
+                coordinates="{},{}".format(t_glob[0], t_glob[1]),
+                observer_elevation=0.0,
+                target_elevation=v_elevation,
+                max_distance=exp_range,
+                refraction_coeff=refr_coeff,
+                memory=int(round(memory / cores)),
+                quiet=True,
+                overwrite=True,
+                env=c_env,
+            )
+            vs.communicate()
+            # Workaround for https://github.com/OSGeo/grass/issues/1436
+            clean_temp(vs.pid)
+
+            # Read viewshed into numpy with single precision and replace NoData
+            np_viewshed = raster2numpy(tmp_vs).astype(np.single)
+            np_viewshed[np_viewshed == -2147483648] = np.nan
+
         # ======================================================================
         # 4. Parametrise viewshed
         # ======================================================================
@@ -419,8 +612,7 @@ def do_it_all(global_vars, target_pts_np):
             np_viewshed,
             reg,
             exp_range,
-            r_dsm,
-            dsm_type,
+            np_dsm,
             v_elevation,
             b_1,
         ).astype(np.single)
@@ -428,51 +620,34 @@ def do_it_all(global_vars, target_pts_np):
         # ======================================================================
         # 5. Cummulate viewsheds
         # ======================================================================
-        # Determine position of local parametrised viewshed within
-        # global cumulative viewshed
-        o_2 = [
-            int(round((reg.north - loc_reg_n) / reg.nsres)),  # NS (rows)
-            int(round((loc_reg_w - reg.west) / reg.ewres)),  # EW (cols)
-        ]
-
         # Add local parametrised viewshed to global cumulative viewshed
-        # replace nans with 0 in processed regions, keep nan where both are nan
-        all_nan = np.all(
-            np.isnan(
-                [
-                    np_cum[
-                        o_2[0] : o_2[0] + lreg_shape[0], o_2[1] : o_2[1] + lreg_shape[1]
-                    ],
-                    np_viewshed,
-                ]
-            ),
-            axis=0,
-        )
-
-        np_cum[
-            o_2[0] : o_2[0] + lreg_shape[0], o_2[1] : o_2[1] + lreg_shape[1]
-        ] = np.nansum(
-            [
-                np_cum[
-                    o_2[0] : o_2[0] + lreg_shape[0], o_2[1] : o_2[1] + lreg_shape[1]
-                ],
-                np_viewshed,
-            ],
-            axis=0,
-        )
-
-        np_cum[o_2[0] : o_2[0] + lreg_shape[0], o_2[1] : o_2[1] + lreg_shape[1]][
-            all_nan
-        ] = np.nan
+        # replace nans with 0 in processed regions, keep nan where both are nan.
+        # Row blocks overlapped by the local region are locked in ascending
+        # order, so that concurrent workers do not lose updates
+        first_lock = o_2[0] // lock_rows
+        last_lock = (o_2[0] + lreg_shape[0] - 1) // lock_rows
+        locks = ACC_LOCKS[first_lock : last_lock + 1]
+        vs_valid = ~np.isnan(np_viewshed)
+
+        for lock in locks:
+            lock.acquire()
+        try:
+            np_cum_local = np_cum[
+                o_2[0] : o_2[0] + lreg_shape[0], o_2[1] : o_2[1] + lreg_shape[1]
+            ]
+            np_cum_local[vs_valid & np.isnan(np_cum_local)] = 0
+            np_cum_local[vs_valid] += np_viewshed[vs_valid]
+        finally:
+            for lock in reversed(locks):
+                lock.release()
 
         counter += 1
 
-    return np_cum
+    np_cum.flush()
+    del np_cum
 
 
-def binary(
-    lreg_shape, t_loc, np_viewshed, reg, exp_range, r_dsm, dsm_type, v_elevation, b_1
-):
+def binary(lreg_shape, t_loc, np_viewshed, reg, exp_range, np_dsm, v_elevation, b_1):
     """Weight binary viewshed by constant weight
     :param lreg_shape: Dimensions of local computational region
     :type lreg_shape: list
@@ -484,10 +659,8 @@ def binary(
     :type reg: Region()
     :param exp_range: exposure range
     :type reg: float
-    :param r_dsm: Name of digital surface model raster
-    :type r_dsm: string
-    :param dsm_type: Raster map precision type
-    :type dsm_type: string
+    :param np_dsm: 2D array of digital surface model in local region
+    :type np_dsm: ndarray
     :param v_elevation: Observer height
     :type v_elevation: float
     :param b_1: radius in fuzzy viewshed parametrisation
@@ -500,7 +673,7 @@ def binary(
 
 
 def solid_angle_reverse(
-    lreg_shape, t_loc, np_viewshed, reg, exp_range, r_dsm, dsm_type, v_elevation, b_1
+    lreg_shape, t_loc, np_viewshed, reg, exp_range, np_dsm, v_elevation, b_1
 ):
     """Calculate solid angle from viewpoints to target based on
     Domingo-Santos et al. (2011) and use it to parametrise binary viewshed
@@ -514,10 +687,8 @@ def solid_angle_reverse(
     :type reg: Region()
     :param exp_range: exposure range
     :type reg: float
-    :param r_dsm: Name of digital surface model raster
-    :type r_dsm: string
-    :param dsm_type: Raster map precision type
-    :type dsm_type: string
+    :param np_dsm: 2D array of digital surface model in local region
+    :type np_dsm: ndarray
     :param v_elevation: Observer height
     :type v_elevation: float
     :param b_1: radius in fuzzy viewshed parametrisation
@@ -525,14 +696,7 @@ def solid_angle_reverse(
     :return: 2D array of weighted parametrised viewshed
     :rtype: ndarray
     """
-    # 1. Convert DSM to numpy
-    np_dsm = raster2numpy(r_dsm)
-
-    # Ensure that values are represented as float (in case of CELL
-    # data type) and replace integer NaN with numpy NaN
-    if dsm_type == "CELL":
-        np_dsm = np_dsm.astype(np.float32)
-        np_dsm[np_dsm == -2147483648] = np.nan
+    # 1. DSM in local region is sliced from the DSM shared by all points
 
     # 2. local row, col coordinates and global Z coordinate of observer points V
     #    3D array (lreg_shape[0] x lreg_shape[1] x 3)
@@ -646,7 +810,7 @@ def solid_angle_reverse(
 
 
 def distance_decay_reverse(
-    lreg_shape, t_loc, np_viewshed, reg, exp_range, r_dsm, dsm_type, v_elevation, b_1
+    lreg_shape, t_loc, np_viewshed, reg, exp_range, np_dsm, v_elevation, b_1
 ):
     """Calculates distance decay weights to target based on
     Gret-Regamey et al. (2007) and Chamberlain & Meitner (2013) and use these
@@ -661,10 +825,8 @@ def distance_decay_reverse(
     :type reg: Region()
     :param exp_range: exposure range
     :type reg: float
-    :param r_dsm: Name of digital surface model raster
-    :type r_dsm: string
-    :param dsm_type: Raster map precision type
-    :type dsm_type: string
+    :param np_dsm: 2D array of digital surface model in local region
+    :type np_dsm: ndarray
     :param v_elevation: Observer height
     :type v_elevation: float
     :param b_1: radius in fuzzy viewshed parametrisation
@@ -707,7 +869,7 @@ def distance_decay_reverse(
 
 
 def fuzzy_viewshed_reverse(
-    lreg_shape, t_loc, np_viewshed, reg, exp_range, r_dsm, dsm_type, v_elevation, b_1
+    lreg_shape, t_loc, np_viewshed, reg, exp_range, np_dsm, v_elevation, b_1
 ):
     """Calculates fuzzy viewshed weights from viewpoints to target based on
     Fisher (1994) and use these to parametrise binary viewshed
@@ -721,10 +883,8 @@ def fuzzy_viewshed_reverse(
     :type reg: Region()
     :param exp_range: exposure range
     :type reg: float
-    :param r_dsm: Name of digital surface model raster
-    :type r_dsm: string
-    :param dsm_type: Raster map precision type
-    :type dsm_type: string
+    :param np_dsm: 2D array of digital surface model in local region
+    :type np_dsm: ndarray
     :param v_elevation: Observer height
     :type v_elevation: float
     :param b_1: radius in fuzzy viewshed parametrisation
@@ -769,7 +929,7 @@ def fuzzy_viewshed_reverse(
 
 
 def visual_magnitude_reverse(
-    lreg_shape, t_loc, np_viewshed, reg, exp_range, r_dsm, dsm_type, v_elevation, b_1
+    lreg_shape, t_loc, np_viewshed, reg, exp_range, np_dsm, v_elevation, b_1
 ):
     """Calculate visual magnitude from viewpoints to target based on
     Chamberlain (2011) and Chamberlain & Meither (2013) and use it to
@@ -784,10 +944,8 @@ def visual_magnitude_reverse(
     :type reg: Region()
     :param exp_range: exposure range
     :type reg: float
-    :param r_dsm: Name of digital surface model raster
-    :type r_dsm: string
-    :param dsm_type: Raster map precision type
-    :type dsm_type: string
+    :param np_dsm: 2D array of digital surface model in local region
+    :type np_dsm: ndarray
     :param v_elevation: Observer height
     :type v_elevation: float
     :param b_1: radius in fuzzy viewshed parametrisation
@@ -795,16 +953,7 @@ def visual_magnitude_reverse(
     :return: 2D array of weighted parametrised viewshed
     :rtype: ndarray
     """
-    # 1. Convert DSM to numpy
-    np_dsm = raster2numpy(r_dsm)
-
-    # Ensure that values are represented as float (in case of CELL
-    # data type) and replace integer NaN with numpy NaN
-    dsm_type = grass.parse_command("r.info", map=r_dsm, flags="g")["datatype"]
-
-    if dsm_type == "CELL":
-        np_dsm = np_dsm.astype(np.float32)
-        np_dsm[np_dsm == -2147483648] = np.nan
+    # 1. DSM in local region is sliced from the DSM shared by all points
 
     # 2. local row, col coordinates and global Z coordinate of observer points V
     #    3D array (lreg_shape[0] x lreg_shape[1] x 3)
@@ -1093,6 +1242,7 @@ def main():
     v_elevation = float(options["observer_elevation"])
     b_1 = float(options["b1_distance"])
     pfunction = options["function"]
+    engine = options["engine"]
     refr_coeff = float(options["refraction_coeff"])
     flagstring = ""
     if flags["r"]:
@@ -1341,6 +1491,25 @@ def main():
     else:
         parametrise_viewshed = binary
 
+    # Store DSM once for all workers
+    dsm_file = dsm_to_npy(
+        r_dsm, dsm_type, "{}.npy".format(grass.tempfile(create=False))
+    )
+
+    # Create cumulative viewshed shared by all workers, split into row blocks
+    # guarded by one lock each
+    acc_file = "{}.npy".format(grass.tempfile(create=False))
+    np_acc = np.lib.format.open_memmap(
+        acc_file, mode="w+", dtype=np.single, shape=(reg.rows, reg.cols)
+    )
+    np_acc[:] = np.nan
+    np_acc.flush()
+    del np_acc
+
+    n_locks = min(reg.rows, 8 * cores)
+    lock_rows = math.ceil(reg.rows / n_locks)
+    locks = [Lock() for i in range(math.ceil(reg.rows / lock_rows))]
+
     # Collect variables that will be used in do_it_all() into a dictionary
     global_vars = {
         "region": reg,
@@ -1351,8 +1520,11 @@ def main():
         "memory": memory,
         "refr_coeff": refr_coeff,
         "flagstring": flagstring,
+        "engine": engine,
         "r_dsm": r_dsm,
-        "dsm_type": dsm_type,
+        "dsm_file": dsm_file,
+        "acc_file": acc_file,
+        "lock_rows": lock_rows,
         "cores": cores,
         "tempname": TEMPNAME,
     }
@@ -1364,15 +1536,14 @@ def main():
     combo = list(zip(itertools.repeat(global_vars), target_pnts))
 
     # Calculate partial cumulative viewshed
-    with Pool(cores) as pool:
-        np_sum = pool.starmap(do_it_all, combo)
+    with Pool(cores, initializer=init_worker, initargs=(locks,)) as pool:
+        pool.starmap(do_it_all, combo)
         pool.close()
         pool.join()
 
-    # We should probably use nansum here?
-    all_nan = np.all(np.isnan(np_sum), axis=0)
-    np_sum = np.nansum(np_sum, axis=0, dtype=np.single)
-    np_sum[all_nan] = np.nan
+    os.remove(dsm_file)
+
+    np_sum = np.load(acc_file, mmap_mode="r")
 
     grass.verbose("Writing final result and cleaning up...")
 
@@ -1383,6 +1554,8 @@ def main():
 
     # Convert numpy array of cumulative viewshed to raster
     numpy2raster(np_sum, mtype="FCELL", rastname=r_output, overwrite=True)
+    del np_sum
+    os.remove(acc_file)
 
     # Remove temporary files and reset mask if needed
     cleanup()
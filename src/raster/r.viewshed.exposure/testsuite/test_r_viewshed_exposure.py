@@ -38,6 +38,9 @@ class TestFunctions(TestCase):
         "Visual_magnitude",
     ]
 
+    # Minimum share of cells in which the numpy engine and r.viewshed agree
+    min_agreement = 0.95
+
     r_viewshed = SimpleModule(
         "r.viewshed.exposure",
         flags="cr",
@@ -279,6 +282,63 @@ class TestFunctions(TestCase):
             precision=1e-4,
         )
 
+    def test_points_numpy(self):
+        """Test that the numpy viewshed engine agrees with r.viewshed
+
+        Both engines sample the lines of sight differently, so like in
+        validation/validate_viewshed_engine.py only the share of agreeing
+        cells is checked.
+        """
+
+        # Use of of the input dsm to set computational region
+        gs.run_command("g.region", raster=self.dsm, align=self.dsm)
+
+        function = "Binary"
+
+        # Input datasets
+        self.r_viewshed.inputs.input = self.dsm
+        self.r_viewshed.inputs.source = None
+        self.r_viewshed.inputs.sampling_points = self.source_points
+        self.r_viewshed.inputs.function = function
+
+        # Reference computed with r.viewshed
+        reference = "test_points_numpy_reference"
+        self.r_viewshed.outputs.output = reference
+        self.r_viewshed.inputs.engine = "r.viewshed"
+        self.assertModule(self.r_viewshed)
+
+        # Output datasets
+        output = "test_points_numpy"
+        self.r_viewshed.outputs.output = output
+        self.r_viewshed.inputs.engine = "numpy"
+
+        # Check that the module runs
+        self.assertModule(self.r_viewshed)
+        self.r_viewshed.inputs.engine = "r.viewshed"
+
+        # Check to see if output is in mapset
+        self.assertRasterExists(output, msg="Output was not created")
+
+        # Cells agree if both engines see the same number of points or both
+        # are NoData, computed like in validation/validate_viewshed_engine.py
+        agreement = "test_points_numpy_agreement"
+        self.runModule(
+            "r.mapcalc",
+            expression="{agree} = if(isnull({a}) && isnull({b}), 1, "
+            "if(isnull({a}) || isnull({b}), 0, {a} == {b}))".format(
+                agree=agreement, a=reference, b=output
+            ),
+        )
+        stats = gs.parse_command("r.univar", map=agreement, flags="g")
+        self.assertGreaterEqual(float(stats["mean"]), self.min_agreement)
+
+        self.runModule(
+            "g.remove",
+            flags="f",
+            type="raster",
+            name=[output, reference, agreement],
+        )
+
 
 if __name__ == "__main__":
     test()
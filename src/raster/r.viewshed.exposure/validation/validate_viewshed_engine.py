@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+"""
+Validation of the numpy viewshed engine of r.viewshed.exposure against
+r.viewshed
+
+Computes the binary viewshed of every validation point with both engines of
+r.viewshed.exposure and writes the share of agreeing cells together with the
+computation times to a CSV file.
+"""
+# python3 validate_viewshed_engine.py input=dsm points=validation_points \
+#     ranges=50,100,300 output=validation_engine.csv
+
+# %module
+# % description: Compares binary viewsheds of the numpy and r.viewshed engines of r.viewshed.exposure
+# %end
+
+# %option G_OPT_R_INPUT
+# % label: Name of input digital surface raster map
+# %end
+
+# %option G_OPT_V_INPUT
+# % key: points
+# % label: Name of input vector map of validation points
+# %end
+
+# %option
+# % key: ranges
+# % type: double
+# % multiple: yes
+# % label: Exposure ranges to test
+# % answer: 50,100,300
+# %end
+
+# %option
+# % key: observer_elevation
+# % type: double
+# % label: Observer elevation above the ground
+# % answer: 1.5
+# %end
+
+# %option G_OPT_F_OUTPUT
+# % label: Name of CSV file to store the validation results
+# %end
+
+# %flag
+# % key: c
+# % label: Consider the curvature of the earth (current ellipsoid)
+# %end
+
+# %flag
+# % key: r
+# % label: Consider the effect of atmospheric refraction
+# %end
+
+import csv
+import sys
+import time
+
+from grass.pygrass.vector import VectorTopo
+import grass.script as grass
+
+
+def run_engine(engine, dsm, point, r, elev, flagstring, output):
+    """Compute binary viewshed of a single point with one engine
+    :param engine: Name of the engine
+    :param dsm: Input DSM
+    :param point: Vector map containing the point
+    :param r: Exposure range
+    :param elev: Observer elevation
+    :param flagstring: Flags passed to r.viewshed.exposure
+    :param output: Name of the output raster map
+    :return: Elapsed time in seconds
+    """
+    start = time.time()
+    grass.run_command(
+        "r.viewshed.exposure",
+        flags=flagstring,
+        input=dsm,
+        output=output,
+        sampling_points=point,
+        observer_elevation=elev,
+        range=r,
+        function="Binary",
+        engine=engine,
+        nprocs=1,
+        overwrite=True,
+        quiet=True,
+    )
+    return time.time() - start
+
+
+def main():
+    dsm = options["input"]
+    v_points = options["points"]
+    radii = [float(r) for r in options["ranges"].split(",")]
+    elev = float(options["observer_elevation"])
+    val_file = options["output"]
+    flagstring = "".join(flag for flag in "cr" if flags[flag])
+
+    tmp_name = grass.tempname(12)
+    tmp_point = "{}_pt".format(tmp_name)
+    tmp_rviewshed = "{}_rviewshed".format(tmp_name)
+    tmp_numpy = "{}_numpy".format(tmp_name)
+    tmp_agree = "{}_agree".format(tmp_name)
+
+    nsres = grass.raster_info(dsm)["nsres"]
+    ewres = grass.raster_info(dsm)["ewres"]
+
+    grass.use_temp_region()
+
+    # new VectorTopo object
+    val_pts_topo = VectorTopo(v_points)
+    val_pts_topo.open("r")
+
+    no_points = val_pts_topo.number_of("points")
+    counter = 0
+
+    # open file where validation outputs will be written
+    with open(val_file, "w", newline="") as outfile:
+        fieldnames = [
+            "pt_id",
+            "radius",
+            "cells",
+            "agreement",
+            "time_rviewshed",
+            "time_numpy",
+        ]
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+
+        # iterate over points
+        for pt in val_pts_topo.viter("points"):
+
+            grass.percent(counter, no_points, 1)
+            counter += 1
+
+            grass.run_command(
+                "v.extract",
+                input=v_points,
+                output=tmp_point,
+                cats=pt.cat,
+                overwrite=True,
+                quiet=True,
+            )
+
+            # iterate over radii
+            for r in radii:
+
+                # set region around processed point
+                grass.run_command(
+                    "g.region",
+                    align=dsm,
+                    n=pt.y + (r + nsres / 2.0),
+                    s=pt.y - (r + nsres / 2.0),
+                    e=pt.x + (r + ewres / 2.0),
+                    w=pt.x - (r + ewres / 2.0),
+                )
+
+                time_rviewshed = run_engine(
+                    "r.viewshed", dsm, tmp_point, r, elev, flagstring, tmp_rviewshed
+                )
+                time_numpy = run_engine(
+                    "numpy", dsm, tmp_point, r, elev, flagstring, tmp_numpy
+                )
+
+                # cells are in agreement if both are equal or both are NoData
+                grass.mapcalc(
+                    "{agree} = if(isnull({a}) && isnull({b}), 1, "
+                    "if(isnull({a}) || isnull({b}), 0, {a} == {b}))".format(
+                        agree=tmp_agree, a=tmp_rviewshed, b=tmp_numpy
+                    ),
+                    overwrite=True,
+                    quiet=True,
+                )
+                univar = grass.parse_command("r.univar", map=tmp_agree, flags="g")
+
+                row = {
+                    "pt_id": pt.cat,
+                    "radius": r,
+                    "cells": univar["n"],
+                    "agreement": float(univar["mean"]),
+                    "time_rviewshed": time_rviewshed,
+                    "time_numpy": time_numpy,
+                }
+                writer.writerow(row)
+                grass.message(",".join(str(row[key]) for key in fieldnames))
+
+    # Close vector access
+    val_pts_topo.close()
+
+    grass.run_command(
+        "g.remove",
+        flags="f",
+        type="raster",
+        name=[tmp_rviewshed, tmp_numpy, tmp_agree],
+        quiet=True,
+    )
+    grass.run_command("g.remove", flags="f", type="vector", name=tmp_point, quiet=True)
+    grass.del_temp_region()
+
+    return
+
+
+if __name__ == "__main__":
+    options, flags = grass.parser()
+    sys.exit(main())
@@ -79,6 +79,16 @@
 # % guisection: Sample options
 # %end
 
+# %option
+# % key: engine
+# % type: string
+# % description: Method to compute the vif
+# % descriptions: regression;fit a regression for every variable in every round;matrix;invert the correlation matrix of the variables once and update the inverse after each removal
+# % options: regression,matrix
+# % answer: regression
+# % guisection: Input
+# %end
+
 # %flag
 # % key: s
 # % description: Generate random seed (result is non-deterministic)
@@ -120,6 +130,10 @@ try:
 except ImportError:
     from cStringIO import StringIO
 import grass.script as gs
+from grass.pygrass.gis.region import Region
+from grass.pygrass.raster import RasterRow
+
+CNULL = -2147483648  # null value for CELL maps
 
 
 # Functions
@@ -216,7 +230,7 @@ def compute_vif(mapx, mapy):
     unused, resid = np.linalg.lstsq(x_i, mapy, rcond=None)[:2]
     if resid.size == 0:
         resid = 0
-    r2 = float(1 - resid / (mapy.size * mapy.var()))
+    r2 = float(1 - np.sum(resid) / (mapy.size * mapy.var()))
     if float(r2) > 0.9999999999:
         vif = float("inf")
         sqrtvif = float("inf")
@@ -242,6 +256,102 @@ def compute_vif2(mapx, mapy):
     return [vif, sqrtvif]
 
 
+def stream_correlation(raster):
+    """Compute the correlation matrix of the raster layers row by row, using
+    only cells without null values in any of the layers. The row statistics
+    are merged with the pairwise update of the means and co-moments, so the
+    data is never held in memory as a whole."""
+    gs.message("Computing the correlation matrix ...")
+    rasters = [RasterRow(name) for name in raster]
+    nvar = len(rasters)
+    count = 0
+    mean = np.zeros(nvar)
+    comoment = np.zeros((nvar, nvar))
+    try:
+        for rast in rasters:
+            rast.open()
+        reg = Region()
+        rows = reg.rows
+        for row in range(rows):
+            gs.percent(row, rows, 5)
+            values = np.empty((reg.cols, nvar))
+            for k, rast in enumerate(rasters):
+                values[:, k] = rast.get_row(row)
+                if rast.mtype == "CELL":
+                    values[values[:, k] == CNULL, k] = np.nan
+            values = values[~np.isnan(values).any(axis=1)]
+            row_count = values.shape[0]
+            if row_count == 0:
+                continue
+            row_mean = values.mean(axis=0)
+            centered = values - row_mean
+            delta = row_mean - mean
+            total = count + row_count
+            comoment += np.dot(centered.T, centered) + np.outer(delta, delta) * (
+                count * row_count / total
+            )
+            mean += delta * row_count / total
+            count = total
+        gs.percent(1, 1, 1)
+    finally:
+        for rast in rasters:
+            if rast.is_open():
+                rast.close()
+    if count < 2:
+        gs.fatal("Not enough cells with values in all input layers.")
+    std = np.sqrt(np.diag(comoment))
+    return comoment / np.outer(std, std)
+
+
+def invert_correlation(corr):
+    """Return the inverse of the correlation matrix, or None if the matrix
+    is singular."""
+    try:
+        return np.linalg.inv(corr)
+    except np.linalg.LinAlgError:
+        return None
+
+
+def vif_from_correlation(corr, inverse):
+    """Compute vif and sqrt(vif) of all variables. The vif of a variable is
+    the diagonal element of the inverse of the correlation matrix. If the
+    matrix is singular, the rsqr of each variable is computed from the
+    correlations with the other variables."""
+    nvar = corr.shape[0]
+    if inverse is not None:
+        vif = np.diag(inverse).copy()
+    else:
+        vif = np.empty(nvar)
+        for k in range(nvar):
+            other = np.delete(np.arange(nvar), k)
+            rxy = corr[other, k]
+            rsqr = rxy.dot(np.linalg.pinv(corr[np.ix_(other, other)])).dot(rxy)
+            vif[k] = 1 / (1 - rsqr) if rsqr < 1 else float("inf")
+    # same limit as rsqr > 0.9999999999 in compute_vif
+    vif[~(vif < 1e10)] = float("inf")
+    return [[v, math.sqrt(v)] for v in vif]
+
+
+def remove_from_inverse(corr, inverse, index):
+    """Remove a variable from the correlation matrix and update its inverse
+    in O(k^2) by the block inversion formula. The inverse is computed again
+    if the update is not accurate (nearly singular matrix)."""
+    corr = np.delete(np.delete(corr, index, axis=0), index, axis=1)
+    if inverse is None:
+        return corr, invert_correlation(corr)
+    pivot = inverse[index, index]
+    if not pivot < 1e10:
+        # the update would lose all precision
+        return corr, invert_correlation(corr)
+    col = np.delete(inverse[:, index], index)
+    inverse = np.delete(np.delete(inverse, index, axis=0), index, axis=1)
+    inverse -= np.outer(col, col) / pivot
+    # the diagonal of the inverse of a correlation matrix is >= 1
+    if not np.all(np.diag(inverse) >= 1 - 1e-8):
+        inverse = invert_correlation(corr)
+    return corr, inverse
+
+
 # main function
 def main(options, flags):
     """Main function, called at execution time."""
@@ -267,6 +377,7 @@ def main(options, flags):
     flag_v = flags["v"]
     flag_f = flags["f"]
     flag_s = flags["s"]
+    engine = options["engine"]
 
     # Determine maximum width of the columns to be printed to std output
     name_lengths = []
@@ -275,7 +386,15 @@ def main(options, flags):
     nlength = max(name_lengths)
 
     # Read in data
-    if not flag_f:
+    if engine == "matrix":
+        # Without sampling, the correlation matrix is computed row by row
+        if number_points and not flag_f:
+            p = read_data(raster=input_maps, n=number_points, flag_s=flag_s, seed=seed)
+            corr = np.corrcoef(p, rowvar=False)
+        else:
+            corr = stream_correlation(input_maps)
+        inverse = invert_correlation(corr)
+    elif not flag_f:
         p = read_data(raster=input_maps, n=number_points, flag_s=flag_s, seed=seed)
 
     # Create arrays to hold results (which will be written to file at end)
@@ -293,9 +412,14 @@ def main(options, flags):
         )
 
         # Compute the VIF
+        if engine == "matrix":
+            vifstats = vif_from_correlation(corr, inverse)
         for i, e in enumerate(input_map_names):
+            # Compute vif from the correlation matrix
+            if engine == "matrix":
+                vifstat = vifstats[i]
             # Compute vif using full rasters
-            if flag_f:
+            elif flag_f:
                 y = input_maps[i]
                 x = input_maps[:]
                 del x[i]
@@ -347,9 +471,14 @@ def main(options, flags):
                 )
 
             # Compute the VIF and sqrt(vif) for all variables in this round
+            if engine == "matrix":
+                vifstats = vif_from_correlation(corr, inverse)
             for k, e in enumerate(input_map_names):
+                # Compute vif from the correlation matrix
+                if engine == "matrix":
+                    vifstat = vifstats[k]
                 # Compute vif using full rasters
-                if flag_f:
+                elif flag_f:
                     y = input_maps[k]
                     x = input_maps[:]
                     del x[k]
@@ -396,7 +525,9 @@ def main(options, flags):
                 remove_variable = input_map_names[rvifindex]
                 del input_maps[rvifindex]
                 del input_map_names[rvifindex]
-                if not flag_f:
+                if engine == "matrix":
+                    corr, inverse = remove_from_inverse(corr, inverse, rvifindex)
+                elif not flag_f:
                     p = np.delete(p, rvifindex, axis=1)
 
         # Write final selected variables to std output
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+MODULE:    Test of r.vif
+
+PURPOSE:   Test that the matrix engine gives the same vif values as the
+           regression engine
+
+COPYRIGHT: (C) 2026 by the GRASS Development Team
+
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+"""
+import csv
+
+import grass.script as gs
+
+from grass.gunittest.case import TestCase
+from grass.gunittest.main import test
+
+
+class TestEngines(TestCase):
+    """Compare the engines of r.vif"""
+
+    maps = ["rvif_a", "rvif_b", "rvif_c", "rvif_d", "rvif_e"]
+    expressions = [
+        "rand(0.0, 10.0)",
+        "rand(0.0, 10.0)",
+        "rvif_a + rand(-2.0, 2.0)",
+        "rvif_a + rvif_b + rand(-1.0, 1.0)",
+        "if(row() < 5 && col() < 5, null(), rand(0.0, 10.0))",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        """Create correlated layers; the region used for the computation
+        has a coarser resolution than the layers"""
+        cls.use_temp_region()
+        cls.runModule("g.region", n=100, s=0, e=120, w=0, res=1)
+        for seed, (name, expression) in enumerate(zip(cls.maps, cls.expressions)):
+            cls.runModule(
+                "r.mapcalc", expression="{} = {}".format(name, expression), seed=seed
+            )
+        cls.runModule("g.region", n=90, s=10, e=110, w=0, res=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the temporary region and maps"""
+        cls.del_temp_region()
+        cls.runModule("g.remove", flags="f", type="raster", name=cls.maps)
+
+    def run_vif(self, engine, **kwargs):
+        """Run r.vif and return the rows of the output file"""
+        output = gs.tempfile(create=False)
+        self.assertModule("r.vif", maps=self.maps, engine=engine, file=output, **kwargs)
+        with open(output) as stats:
+            return list(csv.DictReader(stats))
+
+    def compare_engines(self, **kwargs):
+        """Compare the statistics of both engines"""
+        regression = self.run_vif("regression", **kwargs)
+        matrix = self.run_vif("matrix", **kwargs)
+        self.assertEqual(len(regression), len(matrix))
+        for reference, actual in zip(regression, matrix):
+            self.assertEqual(reference["variable"], actual["variable"])
+            self.assertEqual(reference.get("removed"), actual.get("removed"))
+            self.assertAlmostEqual(
+                float(reference["vif"]) / float(actual["vif"]), 1.0, places=5
+            )
+
+    def test_all_cells(self):
+        """Correlation matrix streamed over the raster rows"""
+        self.compare_engines()
+
+    def test_all_cells_stepwise(self):
+        """Stepwise selection with the streamed correlation matrix"""
+        self.compare_engines(maxvif=2)
+
+    def test_sample(self):
+        """Correlation matrix of a sample"""
+        self.compare_engines(n=500, seed=1)
+
+    def test_sample_stepwise(self):
+        """Stepwise selection with the correlation matrix of a sample"""
+        self.compare_engines(n=500, seed=1, maxvif=2)
+
+
+if __name__ == "__main__":
+    test()
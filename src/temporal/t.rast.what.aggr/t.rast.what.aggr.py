@@ -99,6 +99,16 @@
 # % answer: 1
 # %end
 
+# %option
+# % key: engine
+# % type: string
+# % label: Engine used to sample and aggregate the values
+# % description: The vectorized engine samples all dates at once and writes the attribute table in a single transaction
+# % options: loop,vectorized
+# % descriptions: loop;Sample and aggregate every date separately and update every value with v.db.update;vectorized;Sample all dates in one pass and aggregate all features at once
+# % answer: loop
+# %end
+
 # %option
 # % key: date_format
 # % type: string
@@ -187,6 +197,194 @@ def return_value(vals, met):
         return
 
 
+def return_values(vals, met):
+    """Return the values according the choosen method for every row of a
+    2D array with features as rows and maps as columns"""
+    if vals.shape[1] == 1:
+        return vals[:, 0]
+    if met == "average":
+        return vals.mean(axis=1)
+    elif met == "median":
+        return np.median(vals, axis=1)
+    elif met == "mode":
+        try:
+            from scipy import stats
+
+            m = stats.mode(vals, axis=1)
+            return np.asarray(m.mode).reshape(-1)
+        except ImportError:
+            gscript.fatal(_("For method 'mode' you need to install scipy"))
+    elif met == "minimum":
+        return vals.min(axis=1)
+    elif met == "maximum":
+        return vals.max(axis=1)
+    elif met == "stddev":
+        return vals.std(axis=1)
+    elif met == "sum":
+        return vals.sum(axis=1)
+    elif met == "variance":
+        return vals.var(axis=1)
+    elif met == "quart1":
+        return np.percentile(vals, 25, axis=1)
+    elif met == "quart3":
+        return np.percentile(vals, 75, axis=1)
+    elif met == "perc90":
+        return np.percentile(vals, 90, axis=1)
+    elif met == "quantile":
+        return np.full(vals.shape[0], None)
+
+
+def time_window(data, temporal_type, dateformat, td, after):
+    """Return the starting date, the final date and the start and the end
+    of the time window to aggregate for a date (and final date) string"""
+    try:
+        start, final = data.split("|")
+    except ValueError:
+        start = data
+        final = None
+    if temporal_type == "absolute":
+        fdata = datetime.strptime(start, dateformat)
+    else:
+        fdata = int(start)
+    if final:
+        sdata = datetime.strptime(final, dateformat)
+    elif after:
+        sdata = fdata + td
+    else:
+        sdata = fdata
+        fdata = sdata - td
+    return start, final, fdata, sdata
+
+
+def aggregate_vectorized(
+    sp, dbif, invect, strds, windows, feats, mets, separator, nprocs, stdout
+):
+    """Sample all time windows in one pass and aggregate them with numpy
+
+    :param windows: list of (start, final, window start, window end) tuples
+    :param feats: list with sets of categories to aggregate for each window
+    :return: text for stdout or a list of (start, final, cat, results)
+             tuples with the results of all methods for updating the table
+    """
+    import grass.pygrass.modules as pymod
+
+    mwhere = "start_time >= '{inn}' and start_time < " "'{out}'".format(
+        inn=min(window[2] for window in windows),
+        out=max(window[3] for window in windows),
+    )
+    maps = sp.get_registered_maps_as_objects(
+        where=mwhere, order="start_time", dbif=dbif
+    )
+    times = np.array([mapp.get_temporal_extent_as_tuple()[0] for mapp in maps or []])
+
+    # Sample all maps at once into a (features x maps) array
+    lines = []
+    if maps:
+        try:
+            r_what = pymod.Module(
+                "t.rast.what",
+                points=invect,
+                strds=strds,
+                layout="timerow",
+                separator=separator,
+                flags="v",
+                where=mwhere,
+                quiet=True,
+                stdout_=PI,
+                stderr_=PI,
+                nprocs=nprocs,
+            )
+            lines = r_what.outputs["stdout"].value.splitlines()
+        except CalledModuleError:
+            gscript.warning("t.rast.what faild with where='{}'".format(mwhere))
+    cats = []
+    values = np.full((len(lines), len(times)), np.nan)
+    for row, line in enumerate(lines):
+        vals = line.split(separator)
+        cats.append(vals[0])
+        for col, val in enumerate(vals[3 : 3 + len(times)]):
+            try:
+                values[row, col] = float(val)
+            except ValueError:
+                # No data are kept as NaN
+                pass
+    cats = np.array(cats, dtype=str)
+
+    outtxt = "" if stdout else []
+    for (start, final, fdata, sdata), wfeats in zip(windows, feats):
+        in_window = np.array(
+            [fdata <= time < sdata for time in times], dtype=bool
+        ).reshape(-1)
+        in_feats = np.isin(cats, list(wfeats))
+        wvals = values[in_feats][:, in_window]
+        wcats = cats[in_feats]
+        # Features with no data in any map of the window are not aggregated
+        valid = ~np.isnan(wvals).any(axis=1) if in_window.any() else None
+        results = []
+        if valid is not None and valid.any():
+            for met in mets:
+                result = np.full(len(wcats), None)
+                result[valid] = list(return_values(wvals[valid], met))
+                results.append(result)
+        for row, cat in enumerate(wcats):
+            if valid is None or not valid[row]:
+                if stdout:
+                    outtxt += "{di}{sep}{da}".format(di=cat, da=start, sep=separator)
+                    for n in range(len(mets)):
+                        outtxt += "{sep}{val}".format(val="*", sep=separator)
+                    outtxt += "\n"
+                continue
+            if stdout:
+                outtxt += "{di}{sep}{da}".format(di=cat, da=start, sep=separator)
+                for n in range(len(mets)):
+                    result = results[n][row]
+                    if not result:
+                        result = "*"
+                    outtxt += "{sep}{val}".format(val=result, sep=separator)
+                outtxt += "\n"
+            else:
+                outtxt.append(
+                    (start, final, cat, [results[n][row] for n in range(len(mets))])
+                )
+    return outtxt
+
+
+def write_updates(invect, cols, incol, endcol, updates):
+    """Write aggregated values to the attribute table in a single transaction
+
+    :param updates: list of (start, final, cat, results) tuples
+    """
+    db_info = gscript.vector_db(invect)[1]
+    cmd = ["BEGIN TRANSACTION"]
+    for start, final, cat, results in updates:
+        mywhe = ""
+        if incol:
+            mywhe = "{dc}='{da}' AND ".format(da=start, dc=incol)
+            if endcol:
+                mywhe += "{dc}='{da}' AND ".format(da=final, dc=endcol)
+        mywhe += "cat={ca}".format(ca=cat)
+        values = ", ".join(
+            "{col}={val}".format(col=col, val="NULL" if result is None else result)
+            for col, result in zip(cols, results)
+        )
+        cmd.append(
+            "UPDATE {table} SET {values} WHERE {where};".format(
+                table=db_info["table"], values=values, where=mywhe
+            )
+        )
+    cmd.append("END TRANSACTION")
+    try:
+        gscript.write_command(
+            "db.execute",
+            input="-",
+            database=db_info["database"],
+            driver=db_info["driver"],
+            stdin="\n".join(cmd),
+        )
+    except CalledModuleError:
+        gscript.fatal(_("db.execute return an error"))
+
+
 def main(options, flags):
     import grass.pygrass.modules as pymod
     import grass.temporal as tgis
@@ -216,6 +414,7 @@ def main(options, flags):
     separator = gscript.separator(options["separator"])
     update = flags["u"]
     create = flags["c"]
+    engine = options["engine"]
 
     stdout = False
     if output != "-" and update:
@@ -343,25 +542,59 @@ def main(options, flags):
         )
         myfeats = qfeat.outputs["stdout"].value.splitlines()
 
+    if engine == "vectorized":
+        windows = [
+            time_window(data, sp.get_temporal_type(), dateformat, td, flags["a"])
+            for data in mydates
+        ]
+        if incol:
+            # Features of all dates with a single query
+            if endcol:
+                mysql = "SELECT cat,{dc},{ec} from {vmap} order by cat".format(
+                    vmap=invect, dc=incol, ec=endcol
+                )
+            else:
+                mysql = "SELECT cat,{dc} from {vmap} order by cat".format(
+                    vmap=invect, dc=incol
+                )
+            try:
+                qfeat = pymod.Module(
+                    "db.select", flags="c", stdout_=PI, stderr_=PI, sql=mysql
+                )
+            except CalledModuleError:
+                gscript.fatal(_("db.select returned an error"))
+            datefeats = {}
+            for line in qfeat.outputs["stdout"].value.splitlines():
+                cat, data = line.split("|", 1)
+                datefeats.setdefault(data, set()).add(cat)
+            feats = [datefeats.get(data, set()) for data in mydates]
+        else:
+            feats = [set(myfeats)] * len(mydates)
+        outtxt = aggregate_vectorized(
+            sp,
+            dbif,
+            invect,
+            strds,
+            windows,
+            feats,
+            mets,
+            separator,
+            nprocs,
+            stdout,
+        )
+        if stdout:
+            print(outtxt)
+        else:
+            write_updates(output, cols, incol, endcol, outtxt)
+        dbif.close()
+        return
+
     if stdout:
         outtxt = ""
     for data in mydates:
-        try:
-            start, final = data.split("|")
-        except ValueError:
-            start = data
-            final = None
-        if sp.get_temporal_type() == "absolute":
-            fdata = datetime.strptime(start, dateformat)
-        else:
-            fdata = int(start)
-        if final:
-            sdata = datetime.strptime(final, dateformat)
-        elif flags["a"]:
-            sdata = fdata + td
-        else:
-            sdata = fdata
-            fdata = sdata - td
+        start, final, fdata, sdata = time_window(
+            data, sp.get_temporal_type(), dateformat, td, flags["a"]
+        )
         mwhere = "start_time >= '{inn}' and start_time < " "'{out}'".format(
             inn=fdata, out=sdata
         )
@@ -204,6 +204,47 @@ A_average
 2|2001/05/01|200.0|300.0
 3|2001/05/01|200.0|300.0
 
+"""
+        self.assertLooksLike(text, t_rast_what.outputs.stdout)
+
+    def test_vectorized(self):
+        """Testing vectorized engine with more methods"""
+        t_rast_what = SimpleModule(
+            "t.rast.what.aggr",
+            strds="A",
+            input="points",
+            date="2001-05-01",
+            granularity="3 months",
+            overwrite=True,
+            method=["minimum", "maximum"],
+            engine="vectorized",
+            verbose=True,
+        )
+        self.assertModule(t_rast_what)
+        text = """1|2001-05-01|200.0|300.0
+2|2001-05-01|200.0|300.0
+3|2001-05-01|200.0|300.0
+
+"""
+        self.assertLooksLike(text, t_rast_what.outputs.stdout)
+
+    def test_vectorized_date_column(self):
+        """Testing vectorized engine with date_column option"""
+        t_rast_what = SimpleModule(
+            "t.rast.what.aggr",
+            strds="A",
+            input="points",
+            date_column="data",
+            granularity="3 months",
+            overwrite=True,
+            engine="vectorized",
+            verbose=True,
+        )
+        self.assertModule(t_rast_what)
+        text = """2|2001-04-08|250.0
+1|2001-05-10|350.0
+3|2001-06-01|400.0
+
 """
         self.assertLooksLike(text, t_rast_what.outputs.stdout)
 
@@ -76,6 +76,51 @@ class TestVDbPyUpdate(TestCase):
                 else:
                     self.assertTrue(row["display_phone"] is None)
 
+    def test_script_engine(self):
+        """Check that script engine gives the same result"""
+        self.runModule(
+            "v.db.addcolumn", map=self.vector_name, columns="display_phone text"
+        )
+        self.assertModule(
+            "v.db.pyupdate",
+            map=self.vector_name,
+            column="display_phone",
+            expression="f'Phone num. {phone}'",
+            engine="script",
+            chunk_size=7,
+        )
+        table = json.loads(
+            gs.read_command("v.db.select", map=self.vector_name, format="json")
+        )["records"]
+        for row in table:
+            self.assertTrue(
+                row["display_phone"].startswith("Phone num. "),
+                msg="Table does not have expected values for row: {row}".format(
+                    **locals()
+                ),
+            )
+
+    def test_vectorized(self):
+        """Check evaluation over whole columns"""
+        self.runModule("v.db.addcolumn", map=self.vector_name, columns="cat2 integer")
+        self.assertModule(
+            "v.db.pyupdate",
+            map=self.vector_name,
+            column="cat2",
+            expression="cat * 2",
+            condition="cat > 10",
+            chunk_size=7,
+            flags="v",
+        )
+        table = json.loads(
+            gs.read_command("v.db.select", map=self.vector_name, format="json")
+        )["records"]
+        for row in table:
+            if row["cat"] > 10:
+                self.assertEqual(row["cat2"], row["cat"] * 2)
+            else:
+                self.assertIsNone(row["cat2"])
+
 
 if __name__ == "__main__":
     test()
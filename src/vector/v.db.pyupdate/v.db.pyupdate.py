@@ -69,6 +69,27 @@ This executable script is a GRASS GIS module to run in a GRASS GIS session.
 # % description: This file can contain imports and it will loaded before expression and condition are evaluated
 # % required: no
 # %end
+# %option
+# % key: engine
+# % type: string
+# % label: Engine used to read and update the attribute table
+# % description: Direct engine runs parameterised updates through SQLite or PostgreSQL connection
+# % options: auto,direct,script
+# % descriptions: auto;Use direct engine if the database driver allows it, otherwise script;direct;Read records in chunks and run parameterised updates through a direct database connection;script;Generate SQL script and execute it using db.execute
+# % answer: auto
+# %end
+# %option
+# % key: chunk_size
+# % type: integer
+# % label: Number of records processed at once
+# % description: Records are read, evaluated and updated in chunks of this size
+# % answer: 10000
+# %end
+# %flag
+# % key: v
+# % label: Evaluate expression and condition over whole columns
+# % description: Attributes are NumPy arrays holding a column of a chunk of records (e.g. np.sqrt(area) or name == 'A')
+# %end
 # %flag
 # % key: s
 # % label: Import all functions from specificed packages
@@ -90,6 +111,8 @@ import csv
 # Importing so that it available to the expression.
 import math  # noqa: F401 pylint: disable=unused-import
 
+import numpy as np
+
 import grass.script as gs
 
 
@@ -113,35 +136,74 @@ SQL_FLOAT_TYPES = [
 ]
 
 
-def python_to_transaction(
-    table,
+def row_to_kwargs(row, ensure_lowercase):
+    """Create variables for expression and condition from a record"""
+    kwargs = {}
+    for key, value in row.items():
+        kwargs[key] = value
+        if ensure_lowercase:
+            kwargs[key.lower()] = value
+        # TODO: fix variables which are Python keywords
+    return kwargs
+
+
+def fix_select_nulls(table_contents):
+    """Translate NULL representation of v.db.select to None"""
+    for row in table_contents:
+        for key, value in row.items():
+            # TODO: Is this just a workaround for a bug in v.db.select -j?
+            if value == key:
+                row[key] = None
+    return table_contents
+
+
+def expression_error(expression, kwargs, error):
+    """End with an error message showing the relevant attributes"""
+    attributes = []
+    for key, value in kwargs.items():
+        # Limit the number of attributes shown in the message.
+        max_attrs_show = 3
+        if len(attributes) >= max_attrs_show:
+            attributes.append("...")
+            break
+        # Try to show the relevant attributes. The "relevant" does not
+        # apply when they are misspelled.
+        # TODO: Merge with the case for all misspelled where this won't show
+        # any.
+        if key in expression:
+            attributes.append(f"{key}={value}")
+    if not attributes:
+        # TODO: needs to be more systematic regarding number of items and format str/int/float
+        attributes = [f"{key}={value}" for key, value in kwargs.items()][:3]
+        attributes.append("...")
+    gs.fatal(
+        _(
+            "Evaluation of expression <{expression}...>"
+            " where {attributes} failed with: {error}"
+        ).format(
+            expression=expression[:20],  # TODO: short expressions without ...
+            attributes=", ".join(attributes),
+            error=error,
+        )
+    )
+
+
+def evaluate_rows(
     table_contents,
-    column,
-    column_type,
     expression,
     expression_function,
     condition,
     condition_function,
     ensure_lowercase,
+    key_column="cat",
 ):
-    """Apply Python functions and create SQL"""
-    not_quoted_types = SQL_INT_TYPES + SQL_FLOAT_TYPES
-    cmd = ["BEGIN TRANSACTION"]  # Makes execution significantly faster
+    """Apply Python functions to each record
+
+    Returns list of (value, key) pairs for records to update.
+    """
+    updates = []
     for row in table_contents:
-        kwargs = {}
-        for key, value in row.items():
-            # Translate NULL representation to None
-            # TODO: Is this just a workaround for a bug in v.db.select -j?
-            if value == key:
-                kwargs[key] = None
-                if ensure_lowercase:
-                    kwargs[key.lower()] = None
-            else:
-                # Type is determined through JSON, so assuming it is correct.
-                kwargs[key] = value
-                if ensure_lowercase:
-                    kwargs[key.lower()] = value
-            # TODO: fix variables which are Python keywords
+        kwargs = row_to_kwargs(row, ensure_lowercase)
         if condition and not condition_function(**kwargs):
             # No Python condition or condition evaluates as False
             continue
@@ -149,45 +211,168 @@ def python_to_transaction(
         try:
             value = expression_function(**kwargs)
         except Exception as error:  # pylint: disable=broad-except
-            attributes = []
-            for key, value in kwargs.items():
-                # Limit the number of attributes shown in the message.
-                max_attrs_show = 3
-                if len(attributes) >= max_attrs_show:
-                    attributes.append("...")
-                    break
-                # Try to show the relevant attributes. The "relevant" does not
-                # apply when they are misspelled.
-                # TODO: Merge with the case for all misspelled where this won't show
-                # any.
-                if key in expression:
-                    attributes.append(f"{key}={value}")
-            if not attributes:
-                # TODO: needs to be more systematic regarding number of items and format str/int/float
-                attributes = [f"{key}={value}" for key, value in kwargs.items()][:3]
-                attributes.append("...")
-            gs.fatal(
-                _(
-                    "Evaluation of expression <{expression}...>"
-                    " where {attributes} failed with: {error}"
-                ).format(
-                    expression=expression[:20],  # TODO: short expressions without ...
-                    attributes=", ".join(attributes),
-                    error=error,
+            expression_error(expression, kwargs, error)
+        updates.append((value, row[key_column]))
+    return updates
+
+
+def records_to_columns(table_contents, ensure_lowercase):
+    """Convert records to NumPy arrays, one for each column
+
+    Columns with only numbers are numeric arrays, NULL is represented by NaN
+    (so integer columns with NULLs are float). Other columns are object
+    arrays with None for NULL.
+    """
+    columns = {}
+    for key in table_contents[0]:
+        values = [row[key] for row in table_contents]
+        present = [value for value in values if value is not None]
+        if present and all(
+            isinstance(value, (int, float)) and not isinstance(value, bool)
+            for value in present
+        ):
+            if len(present) == len(values):
+                array = np.array(values)
+            else:
+                array = np.array(
+                    [np.nan if value is None else value for value in values],
+                    dtype=float,
                 )
+        else:
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+        columns[key] = array
+        if ensure_lowercase:
+            columns[key.lower()] = array
+    return columns
+
+
+def evaluate_columns(
+    table_contents,
+    expression,
+    expression_function,
+    condition,
+    condition_function,
+    ensure_lowercase,
+    key_column="cat",
+):
+    """Apply Python functions once to whole columns of the records
+
+    Returns list of (value, key) pairs for records to update.
+    """
+    if not table_contents:
+        return []
+    size = len(table_contents)
+    kwargs = records_to_columns(table_contents, ensure_lowercase)
+    try:
+        values = np.broadcast_to(expression_function(**kwargs), (size,)).tolist()
+        if condition:
+            selected = np.broadcast_to(
+                np.asarray(condition_function(**kwargs), dtype=bool), (size,)
             )
-        if value is None:
-            # Translate None to SQL NULL
-            value = "NULL"
-        elif column_type.upper() not in not_quoted_types:
-            # Quote strings
-            # TODO: We need a robust SQL escape function here.
-            value = f"'{value}'"
-        cat_column = "cat"
-        cat = row[cat_column]
-        cmd.append(f"UPDATE {table} SET {column} = {value} WHERE {cat_column} = {cat};")
-    cmd.append("END TRANSACTION")
-    return cmd
+        else:
+            selected = np.ones(size, dtype=bool)
+    except Exception as error:  # pylint: disable=broad-except
+        gs.fatal(
+            _(
+                "Evaluation of expression <{expression}> or condition <{condition}>"
+                " over whole columns failed with: {error}"
+            ).format(expression=expression, condition=condition, error=error)
+        )
+    updates = []
+    for value, row, select in zip(values, table_contents, selected):
+        if not select:
+            continue
+        if isinstance(value, float) and math.isnan(value):
+            # Translate NaN back to NULL
+            value = None
+        updates.append((value, row[key_column]))
+    return updates
+
+
+def update_statement(table, column, column_type, key_column, value, key):
+    """Create SQL UPDATE statement for one record"""
+    not_quoted_types = SQL_INT_TYPES + SQL_FLOAT_TYPES
+    if value is None:
+        # Translate None to SQL NULL
+        value = "NULL"
+    elif column_type.upper() not in not_quoted_types:
+        # Quote strings
+        # TODO: We need a robust SQL escape function here.
+        value = f"'{value}'"
+    return f"UPDATE {table} SET {column} = {value} WHERE {key_column} = {key};"
+
+
+def connect(driver, database):
+    """Open direct connection to the database if the driver allows it
+
+    Returns connection and parameter placeholder, or None and None when
+    the table can be updated only using db.execute.
+    """
+    if driver == "sqlite":
+        import sqlite3  # pylint: disable=import-outside-toplevel
+
+        env = gs.gisenv()
+        for variable in ("GISDBASE", "LOCATION_NAME", "MAPSET"):
+            database = database.replace(f"${variable}", env[variable])
+        return sqlite3.connect(database), "?"
+    if driver == "pg":
+        try:
+            import psycopg2  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            gs.verbose(_("Python package psycopg2 is not installed"))
+            return None, None
+        # GRASS GIS uses comma-separated or plain database name
+        if "=" in database:
+            dsn = database.replace(",", " ")
+        else:
+            dsn = f"dbname={database}"
+        try:
+            return psycopg2.connect(dsn), "%s"
+        except psycopg2.Error as error:
+            gs.verbose(_("Connection to PostgreSQL failed: {}").format(error))
+            return None, None
+    return None, None
+
+
+def read_chunks(connection, driver, table, where, chunk_size):
+    """Read records using direct connection in chunks (lists of dicts)"""
+    if driver == "pg":
+        # Named cursor keeps the result on the server
+        cursor = connection.cursor(name="v_db_pyupdate")
+    else:
+        cursor = connection.cursor()
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    cursor.execute(sql)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        names = [description[0] for description in cursor.description]
+        yield [dict(zip(names, row)) for row in rows]
+    cursor.close()
+
+
+def execute_updates(connection, driver, sql, updates):
+    """Run parameterised update for list of (value, key) pairs"""
+    parameters = []
+    for value, key in updates:
+        # Values of other types are passed the same way as in SQL script
+        if value is not None and not isinstance(value, (int, float, str, bytes)):
+            value = str(value)
+        parameters.append((value, key))
+    cursor = connection.cursor()
+    if driver == "pg":
+        from psycopg2.extras import (  # pylint: disable=import-outside-toplevel
+            execute_batch,
+        )
+
+        execute_batch(cursor, sql, parameters, page_size=1000)
+    else:
+        cursor.executemany(sql, parameters)
+    cursor.close()
 
 
 def csv_loads(text, delimeter, quotechar='"', null=None):
@@ -294,10 +479,68 @@ def main():
         with open(functions_file) as file:
             exec(file.read(), globals(), globals())  # pylint: disable=exec-used
 
-    # Get table contents
+    engine = options["engine"]
+    chunk_size = int(options["chunk_size"])
+    if chunk_size < 1:
+        gs.fatal(_("Option chunk_size must be a positive number"))
+    key_column = db_info["key"]
+    ensure_lowercase = not flags["u"]
+    evaluate = evaluate_columns if flags["v"] else evaluate_rows
+
+    connection = None
+    if engine != "script":
+        connection, placeholder = connect(driver, database)
+        if not connection and engine == "direct":
+            gs.fatal(
+                _(
+                    "Direct connection is not available for driver <{driver}>."
+                    " Use engine=script instead."
+                ).format(driver=driver)
+            )
+
     if not where:
         # The condition needs to be None, an empty string is passed through.
         where = None
+
+    if connection:
+        gs.verbose(
+            _("Updating table <{table}> using direct connection").format(**locals())
+        )
+        sql = (
+            f"UPDATE {table} SET {column} = {placeholder}"
+            f" WHERE {key_column} = {placeholder}"
+        )
+        num_updated = 0
+        try:
+            for table_contents in read_chunks(
+                connection, driver, table, where, chunk_size
+            ):
+                updates = evaluate(
+                    table_contents=table_contents,
+                    expression=expression,
+                    expression_function=expression_function,
+                    condition=condition,
+                    condition_function=condition_function,
+                    ensure_lowercase=ensure_lowercase,
+                    key_column=key_column,
+                )
+                execute_updates(connection, driver, sql, updates)
+                num_updated += len(updates)
+                gs.verbose(_("{} rows updated").format(num_updated))
+            connection.commit()
+        except Exception as error:  # pylint: disable=broad-except
+            connection.rollback()
+            gs.fatal(_("Updating table <{table}> failed: {error}").format(**locals()))
+        finally:
+            connection.close()
+        if not num_updated:
+            gs.message(
+                "No rows to update. Try a different SQL where or Python condition."
+            )
+        gs.vector_history(vector)
+        return
+
+    # Get table contents
     if gs.version()["version"] < "7.9":
         sep = "|"  # Only one char sep for Python csv package.
         null = "NULL"
@@ -315,18 +558,24 @@ def main():
             "v.db.select", map=vector, layer=layer, format="json", where=where
         )
         table_contents = json.loads(json_text)["records"]
+    table_contents = fix_select_nulls(table_contents)
 
-    cmd = python_to_transaction(
-        table=table,
-        table_contents=table_contents,
-        column=column,
-        column_type=column_type,
-        expression=expression,
-        expression_function=expression_function,
-        condition=condition,
-        condition_function=condition_function,
-        ensure_lowercase=not flags["u"],
-    )
+    cmd = ["BEGIN TRANSACTION"]  # Makes execution significantly faster
+    for start in range(0, len(table_contents), chunk_size):
+        updates = evaluate(
+            table_contents=table_contents[start : start + chunk_size],
+            expression=expression,
+            expression_function=expression_function,
+            condition=condition,
+            condition_function=condition_function,
+            ensure_lowercase=ensure_lowercase,
+            key_column=key_column,
+        )
+        for value, key in updates:
+            cmd.append(
+                update_statement(table, column, column_type, key_column, value, key)
+            )
+    cmd.append("END TRANSACTION")
 
     # Messages
     if len(cmd) == 2:
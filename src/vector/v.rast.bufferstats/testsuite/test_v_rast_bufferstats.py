@@ -524,6 +524,107 @@ class TestBufferstats(TestCase):
         bufferstats.run()
         self.assertLooksLike(bufferstats.outputs.stdout, self.point_attrs)
 
+    def test_points_nprocs(self):
+        """Test parallel processing gives the same statistics"""
+        self.runModule("g.region", vector=self.inpoint_tmp, align=self.inrast_cont_1)
+        bufferstats = SimpleModule(
+            "v.rast.bufferstats",
+            input=self.inpoint_tmp,
+            raster=[self.inrast_cont_1, self.inrast_cont_2],
+            buffers=[30, 50],
+            type="points",
+            column_prefix=["elev", "aspect"],
+            methods=["sum", "maximum", "minimum", "average"],
+            nprocs=2,
+            output="-",
+        )
+        bufferstats.run()
+        self.assertLooksLike(bufferstats.outputs.stdout, self.points_cont)
+
+    def test_points_bulk(self):
+        """Test bulk mode gives the same statistics as the per geometry mode"""
+        self.runModule("g.region", vector=self.inpoint_tmp, align=self.inrast_cont_1)
+        bufferstats = SimpleModule(
+            "v.rast.bufferstats",
+            flags="b",
+            input=self.inpoint_tmp,
+            raster=[self.inrast_cont_1, self.inrast_cont_2],
+            buffers=[30, 50],
+            type="points",
+            column_prefix=["elev", "aspect"],
+            methods=["sum", "maximum", "minimum", "average"],
+            output="-",
+        )
+        bufferstats.run()
+        self.assertLooksLike(bufferstats.outputs.stdout, self.points_cont)
+
+        # All statistics, incl. number of NULL cells in the region of the
+        # bounding box of a buffer and extended statistics
+        methods = [
+            "number",
+            "number_null",
+            "minimum",
+            "maximum",
+            "range",
+            "sum",
+            "average",
+            "average_abs",
+            "stddev",
+            "variance",
+            "coeff_var",
+            "first_quartile",
+            "median",
+            "third_quartile",
+        ]
+        stats = {}
+        for flags in ("", "b"):
+            bufferstats = SimpleModule(
+                "v.rast.bufferstats",
+                flags=flags,
+                input=self.inpoint_tmp,
+                raster=[self.inrast_cont_1, self.inrast_cont_2],
+                buffers=[30, 50],
+                type="points",
+                column_prefix=["elev", "aspect"],
+                methods=methods,
+                percentile=[10, 90],
+                output="-",
+            )
+            bufferstats.run()
+            lines = bufferstats.outputs.stdout.strip().splitlines()[1:]
+            stats[flags] = {
+                tuple(line.split("|")[:4]): float(line.split("|")[4]) for line in lines
+            }
+        self.assertEqual(sorted(stats["b"]), sorted(stats[""]))
+        self.assertEqual(
+            {key[3] for key in stats[""]},
+            set(methods) | {"percentile_10", "percentile_90"},
+        )
+        for key, value in stats[""].items():
+            self.assertAlmostEqual(
+                stats["b"][key],
+                value,
+                delta=abs(value) * 1e-6,
+                msg="Statistic {} differs in bulk mode".format("|".join(key)),
+            )
+
+    def test_points_bulk_tabulate(self):
+        """Test bulk mode gives the same tabulated statistics as the per
+        geometry mode"""
+        self.runModule("g.region", vector=self.inpoint_tmp, align=self.inrast_label)
+        bufferstats = SimpleModule(
+            "v.rast.bufferstats",
+            flags="btupl",
+            input=self.inpoint_tmp,
+            raster=[self.inrast_label, self.inrast_no_label],
+            buffers=[30, 50],
+            type="points",
+            column_prefix=["lc", "basin"],
+            output="-",
+        )
+        bufferstats.run()
+        self.assertLooksLike(bufferstats.outputs.stdout, self.points_tab)
+
     def test_lines(self):
         """Test buffering lines"""
         self.runModule("g.region", vector=self.inline_tmp, align=self.inrast_cont_1)
@@ -18,7 +18,6 @@ COPYRIGHT: (C) 2021 by the GRASS Development Team
 
 
 To Dos:
-- parallelize
 - consider adding distance weights
 - add neighborhood stats ???
 - add where clause
@@ -125,6 +124,16 @@ To Dos:
 # % description: Use labels for column names if possible
 # %end
 
+# %flag
+# % key: b
+# % label: Compute statistics for all geometries at once (bulk mode)
+# % description: Rasterizes buffers of non-overlapping geometries into zone maps and computes statistics for all zones in a single pass
+# %end
+
+# %option G_OPT_M_NPROCS
+# % description: Number of geometries processed in parallel (ignored in bulk mode)
+# %end
+
 # %option G_OPT_F_OUTPUT
 # % description: Name for output file (if "-" output to stdout)
 # % required: no
@@ -140,7 +149,10 @@ import sys
 import os
 import atexit
 import math
-from subprocess import PIPE
+import shutil
+from glob import glob
+from multiprocessing import Pool
+from types import SimpleNamespace
 import grass.script as grass
 from grass.pygrass.vector import VectorTopo
 from grass.pygrass.raster.abstract import RasterAbstractBase
@@ -148,10 +160,10 @@ from grass.pygrass.raster import RasterRow
 from grass.pygrass.gis import Mapset
 from grass.pygrass.vector.geometry import Boundary
 from grass.pygrass.vector.geometry import Centroid
+from grass.pygrass.vector.basic import Bbox
 from grass.pygrass.gis.region import Region
 
 # from grass.pygrass.vector.table import *
-from grass.pygrass.modules.interface.module import Module
 from itertools import chain
 
 # PY2/PY3 compat
@@ -163,6 +175,12 @@ if "GISBASE" not in os.environ.keys():
     sys.exit(1)
 
 TMP_MAPS = []
+TMP_MAPSETS = False
+
+# State of worker processes, see init_worker()
+WORKER = None
+
+EMPTY_BUFFER_WARNING = "No data in raster map {} within buffer {} around geometry {}"
 
 
 def cleanup():
@@ -182,6 +200,21 @@ def cleanup():
     except:
         pass
 
+    # remove temporary vector maps and mapsets of worker processes
+    if TMP_MAPSETS:
+        grass.run_command(
+            "g.remove",
+            flags="f",
+            type="vector",
+            pattern="{}_*".format(tmp_map),
+            quiet=True,
+        )
+        env = grass.gisenv()
+        for mapset_path in glob(
+            os.path.join(env["GISDBASE"], env["LOCATION_NAME"], "{}_*".format(tmp_map))
+        ):
+            shutil.rmtree(mapset_path, ignore_errors=True)
+
     if RasterRow("MASK", Mapset().name).exist():
         grass.run_command("r.mask", flags="r", quiet=True)
     reset_mask()
@@ -229,6 +262,21 @@ def align_current(region, bbox):
     return region
 
 
+def aligned_region(extent, bbox):
+    """Align region to bounding box and count its rows and columns
+
+    :param extent: dictionary with north, south, east, west, nsres and ewres
+                   of the region
+    :param bbox: PyGRASS Bbox object
+    :returns: aligned region, number of rows and number of columns
+    :rtype: tuple
+    """
+    aligned = align_current(SimpleNamespace(**extent), bbox)
+    rows = int(round((aligned.north - aligned.south) / aligned.nsres))
+    cols = int(round((aligned.east - aligned.west) / aligned.ewres))
+    return aligned, rows, cols
+
+
 def random_name(length):
     """Generate a random name of length "length" starting with a letter
 
@@ -318,6 +366,811 @@ def raster_type(raster, tabulate, use_label):
     return rmap_type, valid_lab, rcats
 
 
+def buffer_geometry(geom, buf):
+    """Buffer a geometry
+
+    :param geom: PyGRASS geometry object
+    :param buf: buffer distance
+    :returns: tuple with boundary, centroid and isles of the buffer
+    """
+    if buf <= 0:
+        return geom
+    return geom.buffer(buf)
+
+
+def write_buffer(vect, buffer_geom, cat):
+    """Write buffered geometry as area with category to an open vector map
+
+    :param vect: PyGRASS VectorTopo object opened in write mode
+    :param buffer_geom: tuple with boundary, centroid and isles of the buffer
+    :param cat: category of the area
+    """
+    vect.write(Boundary(points=buffer_geom[0].to_list()))
+    centroid = buffer_geom[1]() if callable(buffer_geom[1]) else buffer_geom[1]
+    vect.write(Centroid(x=centroid.x, y=centroid.y), cat=int(cat))
+
+
+def iter_geometries(vect, types):
+    """Iterate over geometries of all selected types
+
+    :param vect: PyGRASS VectorTopo object opened in read mode
+    :param types: list of geometry types
+    :returns: iterator of PyGRASS geometry objects
+    """
+    return chain.from_iterable(
+        vect.viter(geom_type) for geom_type in types if vect.number_of(geom_type) > 0
+    )
+
+
+class BufferStats:
+    """Statistics of raster maps within the buffer around a single geometry
+
+    The buffer is rasterized to a MASK in the current mapset of the given
+    environment and the computational region is passed through GRASS_REGION
+    in the environment, so that instances can run in parallel in separate
+    mapsets without touching the region or MASK of the user.
+    """
+
+    def __init__(
+        self,
+        raster_maps,
+        column_prefix,
+        methods,
+        int_dict,
+        percentile,
+        tabulate,
+        percent,
+        valid_labels,
+        output,
+        sep,
+        mask_map,
+    ):
+        self.raster_maps = raster_maps
+        self.column_prefix = column_prefix
+        self.methods = methods
+        self.int_dict = int_dict
+        self.percentile = percentile
+        self.tabulate = tabulate
+        self.percent = percent
+        self.valid_labels = valid_labels
+        self.output = output
+        self.sep = sep
+        self.mask_map = mask_map
+        self.mapset = Mapset().name
+
+        # Add extended statistics if requested
+        self.extended = percentile is not None or bool(
+            set(methods).intersection(
+                set(["first_quartile", "median", "third_quartile"])
+            )
+        )
+
+        # Current region as template for GRASS_REGION
+        self.region = [
+            item.split(":", 1) for item in grass.region_env().split(";") if item
+        ]
+        region = dict(self.region)
+        self.extent = {
+            "north": float(region["north"]),
+            "south": float(region["south"]),
+            "east": float(region["east"]),
+            "west": float(region["west"]),
+            "nsres": float(region["n-s resol"]),
+            "ewres": float(region["e-w resol"]),
+        }
+
+    def region_env(self, bbox):
+        """Return GRASS_REGION string for the current region aligned to bbox
+
+        :param bbox: PyGRASS Bbox object
+        :returns: string for the GRASS_REGION environment variable
+        :rtype: string
+        """
+        aligned, rows, cols = aligned_region(self.extent, bbox)
+        values = {
+            "north": aligned.north,
+            "south": aligned.south,
+            "east": aligned.east,
+            "west": aligned.west,
+            "rows": rows,
+            "cols": cols,
+            "rows3": rows,
+            "cols3": cols,
+            "n-s resol3": aligned.nsres,
+            "e-w resol3": aligned.ewres,
+        }
+        return ";".join(
+            "{}:{}".format(key, values.get(key, value)) for key, value in self.region
+        )
+
+    def compute(self, cat, buf, buffer_geom, vect_name, env):
+        """Compute statistics of all raster maps within a buffer
+
+        :param cat: category of the geometry
+        :param buf: buffer distance
+        :param buffer_geom: buffered geometry
+        :param vect_name: name for the temporary vector map (current mapset
+                          of the process)
+        :param env: environment to run raster modules in
+        :returns: list of column assignments for the UPDATE statement and list
+                  of lines for the output
+        :rtype: tuple
+        """
+        b_str = str(buf).replace(".", "_")
+        sep = self.sep
+        output = self.output
+        int_dict = self.int_dict
+        percentile = self.percentile
+
+        # Create temporary vector map with buffered geometry
+        tmp_vect = VectorTopo(vect_name, quiet=True)
+        tmp_vect.open(mode="w")
+        write_buffer(tmp_vect, buffer_geom, cat)
+
+        #################################################
+        # How to silence VectorTopo???
+        #################################################
+
+        # Save current stdout
+        # original = sys.stdout
+
+        # f = open(os.devnull, 'w')
+        # with open('output.txt', 'w') as f:
+        # sys.stdout = io.BytesIO()
+        # sys.stdout.fileno() = os.devnull
+        # sys.stderr = f
+        # os.environ.update(dict(GRASS_VERBOSE='0'))
+        tmp_vect.close(build=False)
+        grass.run_command("v.build", map=vect_name, quiet=True)
+        # os.environ.update(dict(GRASS_VERBOSE='1'))
+
+        # Set region to the extent of the buffer
+        env = dict(env)
+        env["GRASS_REGION"] = self.region_env(buffer_geom[0].bbox())
+        env.pop("WIND_OVERRIDE", None)
+
+        # Check if the following is needed
+        # needed specially with r.stats -p
+        # grass.run_command('g.region', vector=tmp_map, flags='a')
+
+        # Create a MASK from buffered geometry
+        vect_full_name = "{}@{}".format(vect_name, self.mapset)
+        if self.mask_map:
+            grass.run_command(
+                "v.to.rast",
+                input=vect_full_name,
+                output=vect_name,
+                use="val",
+                value=int(cat),
+                overwrite=True,
+                quiet=True,
+                env=env,
+            )
+            mc_expression = "MASK=if(!isnull({0}) && !isnull({1}), {2}, null())".format(
+                vect_name, self.mask_map, cat
+            )
+            grass.run_command(
+                "r.mapcalc", expression=mc_expression, quiet=True, env=env
+            )
+        else:
+            grass.run_command(
+                "v.to.rast",
+                input=vect_full_name,
+                output="MASK",
+                use="val",
+                value=int(cat),
+                quiet=True,
+                env=env,
+            )
+
+        updates = []
+        out_lines = []
+        # Compute statistics for every raster map
+        for rm, rmap in enumerate(self.raster_maps):
+            prefix = self.column_prefix[rm]
+
+            if self.tabulate:
+                # Get statistics on occurrence of raster categories within buffer
+                t_stats = (
+                    grass.read_command(
+                        "r.stats",
+                        flags="lpn" if self.percent else "la",
+                        input=rmap,
+                        sort="desc",
+                        null_value="null",
+                        quiet=True,
+                        env=env,
+                    )
+                    .rstrip(os.linesep)
+                    .replace("  ", " ")
+                    .replace("no data", "no_data")
+                    .replace(" ", "_b{} = ".format(b_str))
+                    .split(os.linesep)
+                )
+                if t_stats == [""]:
+                    grass.warning(EMPTY_BUFFER_WARNING.format(rmap, buf, cat))
+                    continue
+                if (
+                    t_stats[0].split("_b{} = ".format(b_str))[0].split("_")[-1]
+                    != "null"
+                ):
+                    mode = t_stats[0].split("_b{} = ".format(b_str))[0].split("_")[-1]
+                elif len(t_stats) == 1:
+                    mode = "NULL"
+                else:
+                    mode = t_stats[1].split("_b{} = ".format(b_str))[0].split("_")[-1]
+
+                if not output:
+                    updates.append(
+                        "\t{}_{}_b{} = {}".format(prefix, "ncats", b_str, len(t_stats))
+                    )
+                    updates.append(
+                        "\t{}_{}_b{} = {}".format(prefix, "mode", b_str, mode)
+                    )
+
+                    area_tot = 0
+                    for l in t_stats:
+                        # check if raster maps has category or not
+                        if len(l.split("=")) == 2:
+                            updates.append("\t{}_{}".format(prefix, l.rstrip("%")))
+                        elif not l.startswith("null"):
+                            vals = l.split("=")
+                            updates.append(
+                                "\t{}_{} = {}".format(
+                                    prefix,
+                                    (
+                                        vals[-2].strip()
+                                        if self.valid_labels[rm]
+                                        else vals[0].strip()
+                                    ),
+                                    vals[-1].strip().rstrip("%"),
+                                )
+                            )
+                        if not l.startswith("null"):
+                            area_tot += float(l.rstrip("%").split("= ")[-1])
+                    if not self.percent:
+                        updates.append(
+                            "\t{}_{}_b{} = {}".format(
+                                prefix, "area_tot", b_str, area_tot
+                            )
+                        )
+
+                else:
+                    out_lines.append(
+                        "{1}{0}{2}{0}{3}{0}{4}{0}{5}".format(
+                            sep, cat, prefix, buf, "ncats", len(t_stats)
+                        )
+                    )
+                    out_lines.append(
+                        "{1}{0}{2}{0}{3}{0}{4}{0}{5}".format(
+                            sep, cat, prefix, buf, "mode", mode
+                        )
+                    )
+                    area_tot = 0
+                    for l in t_stats:
+                        rcat = (
+                            l.split("= ")[1].rstrip("_b{} = ".format(b_str))
+                            if self.valid_labels[rm]
+                            else l.split("_")[0]
+                        )
+                        area = l.split("= ")[-1]
+                        out_lines.append(
+                            "{1}{0}{2}{0}{3}{0}{4}{0}{5}".format(
+                                sep, cat, prefix, buf, "area {}".format(rcat), area
+                            )
+                        )
+                        if rcat != "null":
+                            area_tot = area_tot + float(l.rstrip("%").split("= ")[-1])
+                    if not self.percent:
+                        out_lines.append(
+                            "{1}{0}{2}{0}{3}{0}{4}{0}{5}".format(
+                                sep, cat, prefix, buf, "area total", area_tot
+                            )
+                        )
+
+            else:
+                # Get univariate statistics within buffer
+                u_stats = (
+                    grass.read_command(
+                        "r.univar",
+                        flags="ge" if self.extended else "g",
+                        map=rmap,
+                        separator=sep,
+                        percentile=percentile,
+                        quiet=True,
+                        env=env,
+                    )
+                    .rstrip(os.linesep)
+                    .replace("=", "_b{} = ".format(b_str))
+                    .split(os.linesep)
+                )
+
+                # Test if u_stats is empty and give warning
+                # Needs to be adjusted to number of requested stats?
+                if (
+                    (percentile and len(u_stats) < 14)
+                    or (self.extended and len(u_stats) < 13)
+                    or len(u_stats) < 12
+                ):
+                    grass.warning(EMPTY_BUFFER_WARNING.format(rmap, buf, cat))
+                    break
+
+                # Extract statistics for selected methods
+                for m in self.methods:
+                    if not output:
+                        # Add to list of UPDATE statements
+                        updates.append(
+                            "\t{}_{}".format(
+                                prefix,
+                                (
+                                    u_stats[int_dict[m][0]]
+                                    if is_number(
+                                        u_stats[int_dict[m][0]].split(" = ")[1]
+                                    )
+                                    else " = ".join(
+                                        [
+                                            u_stats[int_dict[m][0]].split(" = ")[0],
+                                            "NULL",
+                                        ]
+                                    )
+                                ),
+                            )
+                        )
+                    else:
+                        out_lines.append(
+                            "{1}{0}{2}{0}{3}{0}{4}{0}{5}".format(
+                                sep,
+                                cat,
+                                prefix,
+                                buf,
+                                m,
+                                u_stats[int_dict[m][0]].split("= ")[1],
+                            )
+                        )
+
+                if percentile:
+                    perc_count = 0
+                    for perc in percentile:
+                        if not output:
+                            updates.append(
+                                "{}_percentile_{}_b{} = {}".format(
+                                    prefix,
+                                    int(perc) if (perc).is_integer() else perc,
+                                    b_str,
+                                    u_stats[15 + perc_count].split("= ")[1],
+                                )
+                            )
+                        else:
+                            out_lines.append(
+                                "{1}{0}{2}{0}{3}{0}{4}{0}{5}".format(
+                                    sep,
+                                    cat,
+                                    prefix,
+                                    buf,
+                                    "percentile_{}".format(
+                                        int(perc) if (perc).is_integer() else perc
+                                    ),
+                                    u_stats[15 + perc_count].split("= ")[1],
+                                )
+                            )
+                        perc_count = perc_count + 1
+
+        # Remove temporary maps
+        # , stderr=os.devnull, stdout_=os.devnull)
+        grass.run_command(
+            "g.remove", flags="f", type="raster", name="MASK", quiet=True, env=env
+        )
+        grass.run_command(
+            "g.remove", flags="f", type="vector", name=vect_name, quiet=True
+        )
+
+        return updates, out_lines
+
+    def compute_all(self, geom, buffers, vect_name, env):
+        """Compute statistics for all buffers around a geometry
+
+        :returns: category of the geometry and list of results of compute()
+                  for every buffer distance
+        :rtype: tuple
+        """
+        return (
+            geom.cat,
+            [
+                self.compute(geom.cat, buf, buffer_geometry(geom, buf), vect_name, env)
+                for buf in buffers
+            ],
+        )
+
+
+def init_worker(buffer_stats, in_vector, layer, types, buffers):
+    """Initialize worker process with a private temporary mapset
+
+    The MASK and region of a worker are kept in its own mapset and
+    environment, temporary vector maps are written to the current mapset
+    with a name unique for the worker.
+    """
+    global WORKER
+    name = "{}_{}".format(tmp_map, os.getpid())
+    env = os.environ.copy()
+    env["GISRC"] = grass.tempfile()
+    shutil.copyfile(os.environ["GISRC"], env["GISRC"])
+    grass.run_command("g.mapset", flags="c", mapset=name, quiet=True, env=env)
+
+    in_vect = VectorTopo(in_vector, layer=layer)
+    in_vect.open(mode="r")
+    WORKER = SimpleNamespace(
+        buffer_stats=buffer_stats,
+        vect=in_vect,
+        geoms=list(iter_geometries(in_vect, types)),
+        buffers=buffers,
+        vect_name=name,
+        env=env,
+    )
+
+
+def process_geometry(idx):
+    """Compute statistics for all buffers around a geometry in a worker
+
+    :param idx: index of the geometry
+    :returns: result of BufferStats.compute_all()
+    """
+    return WORKER.buffer_stats.compute_all(
+        WORKER.geoms[idx], WORKER.buffers, WORKER.vect_name, WORKER.env
+    )
+
+
+def non_overlapping_groups(bboxes, margin):
+    """Group bounding boxes into batches of non-overlapping boxes
+
+    Boxes are assigned to the first batch they do not overlap with, using a
+    grid index for each batch. Boxes are extended by margin, so that
+    geometries within one batch never share a raster cell.
+
+    :param bboxes: list of (north, south, east, west) tuples
+    :param margin: distance to extend the boxes with (e.g. cell size)
+    :returns: list of lists with indices of the boxes in each batch
+    :rtype: list
+
+    :Example:
+
+    >>> non_overlapping_groups([(1, 0, 1, 0), (2, 0.5, 2, 0.5), (4, 3, 4, 3)], 0)
+    [[0, 2], [1]]
+    """
+    if not bboxes:
+        return []
+    size = max(max(n - s, e - w) for n, s, e, w in bboxes) + 2.0 * margin
+    size = size or 1.0
+    batches = []
+    for idx, bbox in enumerate(bboxes):
+        north = bbox[0] + margin
+        south = bbox[1] - margin
+        east = bbox[2] + margin
+        west = bbox[3] - margin
+        cells = [
+            (col, row)
+            for col in range(
+                int(math.floor(west / size)), int(math.floor(east / size)) + 1
+            )
+            for row in range(
+                int(math.floor(south / size)), int(math.floor(north / size)) + 1
+            )
+        ]
+        for indices, grid in batches:
+            if not any(
+                north > o_s and south < o_n and east > o_w and west < o_e
+                for cell in cells
+                for o_n, o_s, o_e, o_w in grid.get(cell, ())
+            ):
+                break
+        else:
+            indices, grid = [], {}
+            batches.append((indices, grid))
+        indices.append(idx)
+        for cell in cells:
+            grid.setdefault(cell, []).append((north, south, east, west))
+    return [indices for indices, grid in batches]
+
+
+def univar_zones(rmap, zone_map, extended, percentile):
+    """Compute univariate statistics for all zones in a single pass
+
+    :param rmap: name of the raster map
+    :param zone_map: name of the zone raster map
+    :param extended: compute extended statistics
+    :param percentile: list of percentiles or None
+    :returns: dictionary with zone (cat) as key and dictionary of r.univar
+              table columns and values
+    :rtype: dict
+    """
+    univar_flags = "te" if extended or percentile else "t"
+    table = grass.read_command(
+        "r.univar",
+        flags=univar_flags,
+        map=rmap,
+        zones=zone_map,
+        percentile=percentile,
+        separator="|",
+        quiet=True,
+    ).splitlines()
+    if not table:
+        return {}
+    header = table[0].split("|")
+    zones = {}
+    for line in table[1:]:
+        row = dict(zip(header, line.split("|")))
+        zones[int(row["zone"])] = row
+    return zones
+
+
+def tabulate_zones(rmap, zone_map):
+    """Tabulate area of raster categories for all zones in a single pass
+
+    :param rmap: name of the raster map
+    :param zone_map: name of the zone raster map
+    :returns: dictionary with zone (cat) as key and list of (category, area)
+              tuples sorted by decreasing area, and dictionary with zone (cat)
+              as key and number of non-null cells as value
+    :rtype: tuple
+    """
+    table = grass.read_command(
+        "r.stats",
+        flags="ac",
+        input=[zone_map, rmap],
+        separator="|",
+        null_value="null",
+        quiet=True,
+    ).splitlines()
+    zones = {}
+    cells = {}
+    for line in table:
+        zone, rcat, area, count = line.split("|")
+        if zone == "null":
+            continue
+        zones.setdefault(int(zone), []).append((rcat, float(area)))
+        if rcat != "null":
+            cells[int(zone)] = cells.get(int(zone), 0) + int(count)
+    for areas in zones.values():
+        areas.sort(key=lambda cat_area: cat_area[1], reverse=True)
+    return zones, cells
+
+
+def bulk_stats(
+    geoms,
+    buffers,
+    raster_maps,
+    column_prefix,
+    region,
+    user_mask,
+    tabulate,
+    percent,
+    methods,
+    int_dict,
+    percentile,
+    cat_columns,
+    cat_labels,
+):
+    """Compute statistics for buffers around all geometries using zone maps
+
+    For every buffer distance, buffered geometries are grouped into batches
+    of geometries which do not overlap. Each batch is rasterized into a zone
+    map, and statistics for all zones are computed with one r.univar or
+    r.stats run per raster map. Like in the per geometry mode, which masks
+    the region of the bounding box of a buffer, cells of that region outside
+    of the buffer are counted as NULL.
+
+    :returns: dictionary with (cat, buffer, raster index) as key and list of
+              (statistic, value, column name, column value) tuples, where
+              statistic is None for values written only to the table and
+              column name is None for values written only to the output
+    :rtype: dict
+    """
+    zone_map = "{}_zones".format(tmp_map)
+    TMP_MAPS.append(zone_map)
+    extended = bool(
+        set(methods).intersection(set(["first_quartile", "median", "third_quartile"]))
+    )
+    univar_names = {
+        "n": "non_null_cells",
+        "first_quartile": "first_quart",
+        "third_quartile": "third_quart",
+    }
+    margin = max(region.nsres, region.ewres)
+    # Original extent of the region the batches are aligned to
+    extent = (region.north, region.south, region.east, region.west)
+    extent_res = {
+        "north": region.north,
+        "south": region.south,
+        "east": region.east,
+        "west": region.west,
+        "nsres": region.nsres,
+        "ewres": region.ewres,
+    }
+    cell_area = region.nsres * region.ewres
+
+    results = {}
+    for buf in buffers:
+        b_str = str(buf).replace(".", "_")
+        buffer_geoms = [(cat, buffer_geometry(geom, buf)) for cat, geom in geoms]
+        bboxes = []
+        # number of cells of the region of the bounding box of every buffer
+        bbox_cells = []
+        for cat, buffer_geom in buffer_geoms:
+            bbox = buffer_geom[0].bbox()
+            bboxes.append((bbox.north, bbox.south, bbox.east, bbox.west))
+            _, rows, cols = aligned_region(extent_res, bbox)
+            bbox_cells.append(rows * cols)
+        batches = non_overlapping_groups(bboxes, margin)
+        grass.verbose(
+            "Processing {} geometries in {} batches for buffer {}".format(
+                len(buffer_geoms), len(batches), buf
+            )
+        )
+
+        for batch_idx, batch in enumerate(batches):
+            # Write buffers of the batch to a vector map
+            tmp_vect = VectorTopo(tmp_map, quiet=True)
+            tmp_vect.open(mode="w", overwrite=True)
+            for idx in batch:
+                write_buffer(tmp_vect, buffer_geoms[idx][1], buffer_geoms[idx][0])
+            tmp_vect.close(build=False)
+            grass.run_command("v.build", map=tmp_map, quiet=True)
+
+            # Align region to the extent of the batch
+            region.north, region.south, region.east, region.west = extent
+            batch_bbox = Bbox(
+                north=max(bboxes[idx][0] for idx in batch),
+                south=min(bboxes[idx][1] for idx in batch),
+                east=max(bboxes[idx][2] for idx in batch),
+                west=min(bboxes[idx][3] for idx in batch),
+            )
+            align_current(region, batch_bbox).write()
+
+            # Rasterize zones
+            grass.run_command(
+                "v.to.rast",
+                input=tmp_map,
+                output=zone_map if not user_mask else tmp_map,
+                use="cat",
+                overwrite=True,
+                quiet=True,
+            )
+            if user_mask:
+                grass.run_command(
+                    "r.mapcalc",
+                    expression="{0}=if(isnull({1}_MASK), null(), {1})".format(
+                        zone_map, tmp_map
+                    ),
+                    overwrite=True,
+                    quiet=True,
+                )
+
+            for rm, rmap in enumerate(raster_maps):
+                prefix = column_prefix[rm]
+                if tabulate:
+                    zones, zone_cells = tabulate_zones(rmap, zone_map)
+                else:
+                    zones = univar_zones(rmap, zone_map, extended, percentile)
+                for idx in batch:
+                    cat = buffer_geoms[idx][0]
+                    if cat not in zones:
+                        grass.warning(EMPTY_BUFFER_WARNING.format(rmap, buf, cat))
+                        continue
+                    stats = []
+                    if tabulate:
+                        areas = zones[cat]
+                        valid_areas = [a for a in areas if a[0] != "null"]
+                        area_tot = sum(a[1] for a in valid_areas)
+                        null_cells = bbox_cells[idx] - zone_cells.get(cat, 0)
+                        null_area = null_cells * cell_area
+                        if percent:
+                            areas = valid_areas
+                        elif null_cells > 0:
+                            areas = sorted(
+                                valid_areas + [("null", null_area)],
+                                key=lambda cat_area: cat_area[1],
+                                reverse=True,
+                            )
+                        else:
+                            areas = valid_areas
+                        mode = valid_areas[0][0] if valid_areas else None
+                        stats.append(
+                            (
+                                "ncats",
+                                len(areas),
+                                "{}_ncats_b{}".format(prefix, b_str),
+                                len(areas),
+                            )
+                        )
+                        stats.append(
+                            (
+                                "mode",
+                                "NULL" if mode is None else mode,
+                                "{}_mode_b{}".format(prefix, b_str),
+                                mode,
+                            )
+                        )
+                        if not percent:
+                            # Column only, null area is listed with categories
+                            stats.append(
+                                (
+                                    None,
+                                    None,
+                                    "{}_null_b{}".format(prefix, b_str),
+                                    null_area,
+                                )
+                            )
+                        for rcat, area in areas:
+                            if percent:
+                                area = area / area_tot * 100.0 if area_tot else 0
+                                area_str = "{:.2f}%".format(area)
+                            else:
+                                area_str = "{:f}".format(area)
+                            stats.append(
+                                (
+                                    "area {}".format(cat_labels[rm].get(rcat, rcat)),
+                                    area_str,
+                                    (
+                                        None
+                                        if rcat == "null"
+                                        else "{}_{}_b{}".format(
+                                            prefix,
+                                            cat_columns[rm].get(rcat, rcat),
+                                            b_str,
+                                        )
+                                    ),
+                                    area,
+                                )
+                            )
+                        if not percent:
+                            stats.append(
+                                (
+                                    "area total",
+                                    area_tot,
+                                    "{}_area_tot_b{}".format(prefix, b_str),
+                                    area_tot,
+                                )
+                            )
+                    else:
+                        row = zones[cat]
+                        for m in methods:
+                            if int_dict[m][2] == "null_cells":
+                                value = str(
+                                    bbox_cells[idx] - int(row["non_null_cells"])
+                                )
+                            else:
+                                value = row[
+                                    univar_names.get(int_dict[m][2], int_dict[m][2])
+                                ]
+                            stats.append(
+                                (
+                                    m,
+                                    value,
+                                    "{}_{}_b{}".format(prefix, int_dict[m][2], b_str),
+                                    value if is_number(value) else None,
+                                )
+                            )
+                        for perc in percentile or []:
+                            perc_str = int(perc) if perc.is_integer() else perc
+                            value = row[
+                                "perc_{}".format(str(perc_str).replace(".", "_"))
+                            ]
+                            stats.append(
+                                (
+                                    "percentile_{}".format(perc_str),
+                                    value,
+                                    "{}_percentile_{}_b{}".format(
+                                        prefix, perc_str, b_str
+                                    ),
+                                    value if is_number(value) else None,
+                                )
+                            )
+                    results[(cat, buf, rm)] = stats
+
+            grass.percent(batch_idx + 1, len(batches), 1)
+
+    return results
+
+
 def main():
     in_vector = options["input"].split("@")[0]
     if len(options["input"].split("@")) > 1:
@@ -330,7 +1183,7 @@ def main():
     percentile = (
         None
         if options["percentile"] == ""
-        else map(float, options["percentile"].split(","))
+        else list(map(float, options["percentile"].split(",")))
     )
     column_prefix = tuple(options["column_prefix"].split(","))
     buffers = options["buffers"].split(",")
@@ -342,10 +1195,8 @@ def main():
     percent = flags["p"]
     remove = flags["r"]
     use_label = flags["l"]
-
-    empty_buffer_warning = (
-        "No data in raster map {} within buffer {} around geometry {}"
-    )
+    bulk = flags["b"]
+    nprocs = int(options["nprocs"])
 
     # Do checks using pygrass
     for rmap in raster_maps:
@@ -421,12 +1272,22 @@ def main():
     # Generate list of required column names and types
     col_names = []
     valid_labels = []
+    cat_columns = []
+    cat_labels = []
     col_types = []
     for p in column_prefix:
         rmaptype, val_lab, rcats = raster_type(
             raster_maps[column_prefix.index(p)], tabulate, use_label
         )
         valid_labels.append(val_lab)
+        # Column name suffixes and output labels of raster categories
+        cat_columns.append(
+            {
+                str(rcat[1]): rcat[0].replace(" ", "_") if use_label else rcat[1]
+                for rcat in rcats
+            }
+        )
+        cat_labels.append({str(rcat[1]): rcat[0] for rcat in rcats} if val_lab else {})
 
         for b in buffers:
             b_str = str(b).replace(".", "_")
@@ -475,39 +1336,9 @@ def main():
     in_vect.open(mode="r")
 
     # Get name for temporary map
-    global TMP_MAPS
+    global TMP_MAPS, TMP_MAPSETS
     TMP_MAPS.append(tmp_map)
 
-    # Setup stats collectors
-    if tabulate:
-        # Collector for raster category statistics
-        stats = Module("r.stats", run_=False, stdout_=PIPE)
-        stats.inputs.sort = "desc"
-        stats.inputs.null_value = "null"
-        stats.flags.quiet = True
-        stats.flags.l = True
-        if percent:
-            stats.flags.p = True
-            stats.flags.n = True
-        else:
-            stats.flags.a = True
-    else:
-        # Collector for univariat statistics
-        univar = Module("r.univar", run_=False, stdout_=PIPE)
-        univar.inputs.separator = sep
-        univar.flags.g = True
-        univar.flags.quiet = True
-
-        # Add extended statistics if requested
-        if set(methods).intersection(
-            set(["first_quartile", "median", "third_quartile"])
-        ):
-            univar.flags.e = True
-
-        if percentile is not None:
-            univar.flags.e = True
-            univar.inputs.percentile = percentile
-
     # Check if attribute table exists
     if not output:
         if not in_vect.table:
@@ -533,6 +1364,7 @@ def main():
                 grass.warning(
                     "Column(s) {} already exist!".format(",".join(existing_cols))
                 )
+        table_cols = set(col_names)
         for e in existing_cols:
             idx = col_names.index(e)
             del col_names[idx]
@@ -560,316 +1392,122 @@ def main():
     # reg = deepcopy(r)
 
     # Create iterator for geometries of all selected types
-    geoms = chain()
-    geoms_n = 0
-    n_geom = 1
-    for geom_type in types:
-        geoms_n += in_vect.number_of(geom_type)
-        if in_vect.number_of(geom_type) > 0:
-            geoms = chain(in_vect.viter(geom_type))
-
-    # Loop over geometries
-    for geom in geoms:
-        # Get cat
-        cat = geom.cat
-
-        # Add where clause to UPDATE statement
-        sql_str_end = " WHERE cat = {};".format(cat)
-
-        # Loop over ser provided buffer distances
-        for buf in buffers:
-            b_str = str(buf).replace(".", "_")
-            # Buffer geometry
-            if buf <= 0:
-                buffer_geom = geom
-            else:
-                buffer_geom = geom.buffer(buf)
-            # Create temporary vector map with buffered geometry
-            tmp_vect = VectorTopo(tmp_map, quiet=True)
-            tmp_vect.open(mode="w")
-            tmp_vect.write(Boundary(points=buffer_geom[0].to_list()))
-            # , c_cats=int(cat), set_cats=True
-            if callable(buffer_geom[1]):
-                tmp_vect.write(
-                    Centroid(x=buffer_geom[1]().x, y=buffer_geom[1]().y), cat=int(cat)
-                )
-            else:
-                tmp_vect.write(
-                    Centroid(x=buffer_geom[1].x, y=buffer_geom[1].y), cat=int(cat)
-                )
-
-            #################################################
-            # How to silence VectorTopo???
-            #################################################
-
-            # Save current stdout
-            # original = sys.stdout
-
-            # f = open(os.devnull, 'w')
-            # with open('output.txt', 'w') as f:
-            # sys.stdout = io.BytesIO()
-            # sys.stdout.fileno() = os.devnull
-            # sys.stderr = f
-            # os.environ.update(dict(GRASS_VERBOSE='0'))
-            tmp_vect.close(build=False)
-            grass.run_command("v.build", map=tmp_map, quiet=True)
-            # os.environ.update(dict(GRASS_VERBOSE='1'))
-
-            # reg = Region()
-            # reg.read()
-            # r.from_vect(tmp_map)
-            r = align_current(r, buffer_geom[0].bbox())
-            r.write()
-
-            # Check if the following is needed
-            # needed specially with r.stats -p
-            # grass.run_command('g.region', vector=tmp_map, flags='a')
-
-            # Create a MASK from buffered geometry
-            if user_mask:
-                grass.run_command(
-                    "v.to.rast",
-                    input=tmp_map,
-                    output=tmp_map,
-                    use="val",
-                    value=int(cat),
-                    quiet=True,
-                )
-                mc_expression = (
-                    "MASK=if(!isnull({0}) && !isnull({0}_MASK), {1}, null())".format(
-                        tmp_map, cat
-                    )
-                )
-                grass.run_command("r.mapcalc", expression=mc_expression, quiet=True)
-            else:
-                grass.run_command(
-                    "v.to.rast",
-                    input=tmp_map,
-                    output="MASK",
-                    use="val",
-                    value=int(cat),
-                    quiet=True,
-                )
-
-            # reg.write()
-
-            updates = []
-            # Compute statistics for every raster map
-            for rm, rmap in enumerate(raster_maps):
-                # rmap = raster_maps[rm]
-                prefix = column_prefix[rm]
-
-                if tabulate:
-                    # Get statistics on occurrence of raster categories within buffer
-                    stats.inputs.input = rmap
-                    stats.run()
-                    t_stats = (
-                        stats.outputs["stdout"]
-                        .value.rstrip(os.linesep)
-                        .replace("  ", " ")
-                        .replace("no data", "no_data")
-                        .replace(" ", "_b{} = ".format(b_str))
-                        .split(os.linesep)
-                    )
-                    if t_stats == [""]:
-                        grass.warning(empty_buffer_warning.format(rmap, buf, cat))
-                        continue
-                    if (
-                        t_stats[0].split("_b{} = ".format(b_str))[0].split("_")[-1]
-                        != "null"
-                    ):
-                        mode = (
-                            t_stats[0].split("_b{} = ".format(b_str))[0].split("_")[-1]
-                        )
-                    elif len(t_stats) == 1:
-                        mode = "NULL"
-                    else:
-                        mode = (
-                            t_stats[1].split("_b{} = ".format(b_str))[0].split("_")[-1]
-                        )
-
-                    if not output:
-                        updates.append(
-                            "\t{}_{}_b{} = {}".format(
-                                prefix, "ncats", b_str, len(t_stats)
-                            )
-                        )
-                        updates.append(
-                            "\t{}_{}_b{} = {}".format(prefix, "mode", b_str, mode)
-                        )
-
-                        area_tot = 0
-                        for l in t_stats:
-                            # check if raster maps has category or not
-                            if len(l.split("=")) == 2:
-                                updates.append("\t{}_{}".format(prefix, l.rstrip("%")))
-                            elif not l.startswith("null"):
-                                vals = l.split("=")
-                                updates.append(
-                                    "\t{}_{} = {}".format(
-                                        prefix,
-                                        vals[-2].strip()
-                                        if valid_labels[rm]
-                                        else vals[0].strip(),
-                                        vals[-1].strip().rstrip("%"),
-                                    )
-                                )
-                            if not l.startswith("null"):
-                                area_tot += float(l.rstrip("%").split("= ")[-1])
-                        if not percent:
-                            updates.append(
-                                "\t{}_{}_b{} = {}".format(
-                                    prefix, "area_tot", b_str, area_tot
-                                )
-                            )
-
-                    else:
-                        out_str = "{1}{0}{2}{0}{3}{0}{4}{0}{5}{6}".format(
-                            sep, cat, prefix, buf, "ncats", len(t_stats), os.linesep
-                        )
-                        out_str += "{1}{0}{2}{0}{3}{0}{4}{0}{5}{6}".format(
-                            sep, cat, prefix, buf, "mode", mode, os.linesep
-                        )
-                        area_tot = 0
-                        for l in t_stats:
-                            rcat = (
-                                l.split("= ")[1].rstrip("_b{} = ".format(b_str))
-                                if valid_labels[rm]
-                                else l.split("_")[0]
-                            )
-                            area = l.split("= ")[-1]
-                            out_str += "{1}{0}{2}{0}{3}{0}{4}{0}{5}{6}".format(
-                                sep,
-                                cat,
-                                prefix,
-                                buf,
-                                "area {}".format(rcat),
-                                area,
-                                os.linesep,
-                            )
-                            if rcat != "null":
-                                area_tot = area_tot + float(
-                                    l.rstrip("%").split("= ")[-1]
-                                )
-                        if not percent:
-                            out_str += "{1}{0}{2}{0}{3}{0}{4}{0}{5}{6}".format(
-                                sep,
-                                cat,
-                                prefix,
-                                buf,
-                                "area total",
-                                area_tot,
-                                os.linesep,
-                            )
-
-                        if output == "-":
-                            print(out_str.rstrip(os.linesep))
-                        else:
-                            out.write(out_str)
-
-                else:
-                    # Get univariate statistics within buffer
-                    univar.inputs.map = rmap
-                    univar.run()
-                    u_stats = (
-                        univar.outputs["stdout"]
-                        .value.rstrip(os.linesep)
-                        .replace("=", "_b{} = ".format(b_str))
-                        .split(os.linesep)
-                    )
-
-                    # Test if u_stats is empty and give warning
-                    # Needs to be adjusted to number of requested stats?
-                    if (
-                        (percentile and len(u_stats) < 14)
-                        or (univar.flags.e and len(u_stats) < 13)
-                        or len(u_stats) < 12
+    geoms = iter_geometries(in_vect, types)
+    geoms_n = sum(in_vect.number_of(geom_type) for geom_type in types)
+
+    if bulk:
+        geoms = [(geom.cat, geom) for geom in geoms]
+        results = bulk_stats(
+            geoms,
+            buffers,
+            raster_maps,
+            column_prefix,
+            r,
+            user_mask,
+            tabulate,
+            percent,
+            methods,
+            int_dict,
+            percentile,
+            cat_columns,
+            cat_labels,
+        )
+        # Write results in the order of geometries and buffers
+        table_updates = {}
+        for cat, geom in geoms:
+            for buf in buffers:
+                for rm, prefix in enumerate(column_prefix):
+                    for statistic, value, column, column_value in results.get(
+                        (cat, buf, rm), []
                     ):
-                        grass.warning(empty_buffer_warning.format(rmap, buf, cat))
-                        break
-
-                    # Extract statistics for selected methods
-                    for m in methods:
                         if not output:
-                            # Add to list of UPDATE statements
-                            updates.append(
-                                "\t{}_{}".format(
-                                    prefix,
-                                    u_stats[int_dict[m][0]]
-                                    if is_number(
-                                        u_stats[int_dict[m][0]].split(" = ")[1]
-                                    )
-                                    else " = ".join(
-                                        [
-                                            u_stats[int_dict[m][0]].split(" = ")[0],
-                                            "NULL",
-                                        ]
-                                    ),
-                                )
-                            )
-                        else:
+                            if column in table_cols:
+                                table_updates.setdefault(cat, {})[column] = column_value
+                        elif statistic is not None:
                             out_str = "{1}{0}{2}{0}{3}{0}{4}{0}{5}".format(
-                                sep,
-                                cat,
-                                prefix,
-                                buf,
-                                m,
-                                u_stats[int_dict[m][0]].split("= ")[1],
+                                sep, cat, prefix, buf, statistic, value
                             )
                             if output == "-":
                                 print(out_str)
                             else:
                                 out.write("{}{}".format(out_str, os.linesep))
-
-                    if percentile:
-                        perc_count = 0
-                        for perc in percentile:
-                            if not output:
-                                updates.append(
-                                    "{}_percentile_{}_b{} = {}".format(
-                                        p,
-                                        int(perc) if (perc).is_integer() else perc,
-                                        b_str,
-                                        u_stats[15 + perc_count].split("= ")[1],
-                                    )
-                                )
-                            else:
-                                out_str = "{1}{0}{2}{0}{3}{0}{4}{0}{5}".format(
-                                    sep,
-                                    cat,
-                                    prefix,
-                                    buf,
-                                    "percentile_{}".format(
-                                        int(perc) if (perc).is_integer() else perc
-                                    ),
-                                    u_stats[15 + perc_count].split("= ")[1],
-                                )
-                                if output == "-":
-                                    print(out_str)
-                                else:
-                                    out.write(out_str)
-                            perc_count = perc_count + 1
-
-            if not output and len(updates) > 0:
+        if not output:
+            # Update attribute table in one transaction
+            for cat, values in table_updates.items():
                 cur.execute(
-                    "{}{}{}".format(sql_str_start, ",\n".join(updates), sql_str_end)
+                    "{}{} WHERE cat = {};".format(
+                        sql_str_start,
+                        ",\n".join(
+                            "\t{} = {}".format(
+                                column, "NULL" if value is None else value
+                            )
+                            for column, value in values.items()
+                        ),
+                        cat,
+                    )
                 )
+            conn.commit()
 
-            # Remove temporary maps
-            # , stderr=os.devnull, stdout_=os.devnull)
-            grass.run_command(
-                "g.remove", flags="f", type="raster", name="MASK", quiet=True
+    else:
+        buffer_stats = BufferStats(
+            [grass.find_file(rmap, element="cell")["fullname"] for rmap in raster_maps],
+            column_prefix,
+            methods,
+            int_dict,
+            percentile,
+            tabulate,
+            percent,
+            valid_labels,
+            output,
+            sep,
+            "{}_MASK@{}".format(tmp_map, Mapset().name) if user_mask else None,
+        )
+        if nprocs > 1:
+            # Workers compute statistics in private mapsets, results are
+            # written here in the order of the geometries
+            TMP_MAPSETS = True
+            pool = Pool(
+                nprocs,
+                initializer=init_worker,
+                initargs=(buffer_stats, in_vector, layer, types, buffers),
             )
-            grass.run_command(
-                "g.remove", flags="f", type="vector", name=tmp_map, quiet=True
+            results = pool.imap(
+                process_geometry,
+                range(geoms_n),
+                chunksize=max(1, min(100, geoms_n // (nprocs * 4))),
+            )
+        else:
+            pool = None
+            results = (
+                buffer_stats.compute_all(geom, buffers, tmp_map, os.environ)
+                for geom in geoms
             )
 
-        # Give progress information
-        grass.percent(n_geom, geoms_n, 1)
-        n_geom = n_geom + 1
+        # Loop over geometries
+        for n_geom, (cat, buffer_results) in enumerate(results, 1):
+            # Add where clause to UPDATE statement
+            sql_str_end = " WHERE cat = {};".format(cat)
 
-        if not output:
-            conn.commit()
+            for updates, out_lines in buffer_results:
+                if not output and len(updates) > 0:
+                    cur.execute(
+                        "{}{}{}".format(sql_str_start, ",\n".join(updates), sql_str_end)
+                    )
+                for out_str in out_lines:
+                    if output == "-":
+                        print(out_str)
+                    else:
+                        out.write("{}{}".format(out_str, os.linesep))
+
+            # Give progress information
+            grass.percent(n_geom, geoms_n, 1)
+
+            if not output:
+                conn.commit()
+
+        if pool:
+            pool.close()
+            pool.join()
 
     # Close cursor and DB connection
     if not output and not output == "-":
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+MODULE:    Test of v.what.rast.multi
+PURPOSE:   Test that the single pass engine of v.what.rast.multi gives the
+           same values as the loop engine
+COPYRIGHT: (C) 2026 by the GRASS Development Team
+
+This program is free software under the GNU General Public
+License (>=v2). Read the file COPYING that comes with GRASS
+for details.
+"""
+
+import grass.script as gs
+
+from grass.gunittest.case import TestCase
+from grass.gunittest.main import test
+
+
+class TestEngines(TestCase):
+    """Compare the single pass engine with the loop engine"""
+
+    points = "vwrm_points"
+    cell = "vwrm_cell"
+    fcell = "elevation@PERMANENT"
+
+    @classmethod
+    def setUpClass(cls):
+        """Create points, a CELL map with NULL cells and a region which
+        contains only part of the points"""
+        cls.use_temp_region()
+        cls.runModule("g.region", raster=cls.fcell)
+        cls.runModule(
+            "r.mapcalc",
+            expression="{} = if(row() % 5 == 0, null(), int({}))".format(
+                cls.cell, cls.fcell
+            ),
+        )
+        cls.runModule(
+            "v.random", output=cls.points, npoints=200, seed=1, column="value"
+        )
+        # two points with the same category
+        cls.runModule("v.edit", map=cls.points, tool="copy", cats=1)
+        cls.runModule(
+            "v.db.addcolumn",
+            map=cls.points,
+            columns=",".join(
+                "{}_{} {}".format(engine, column, ctype)
+                for engine in ("loop", "single_pass")
+                for column, ctype in (
+                    ("fcell", "double precision"),
+                    ("cell", "integer"),
+                    ("fcell_i", "double precision"),
+                    ("cell_i", "double precision"),
+                )
+            ),
+        )
+
+        region = gs.region()
+        cls.runModule("g.region", n=(region["n"] + region["s"]) / 2)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the temporary region and data"""
+        cls.runModule("g.remove", flags="f", type="raster", name=cls.cell)
+        cls.runModule("g.remove", flags="f", type="vector", name=cls.points)
+        cls.del_temp_region()
+
+    def sample(self, suffix, flags=""):
+        """Sample the maps with both engines into columns with suffix
+        :return: dict of loop and single pass values by category
+        """
+        for engine in ("loop", "single_pass"):
+            self.assertModule(
+                "v.what.rast.multi",
+                flags=flags,
+                map=self.points,
+                raster=[self.fcell, self.cell],
+                columns=[
+                    "{}_fcell{}".format(engine, suffix),
+                    "{}_cell{}".format(engine, suffix),
+                ],
+                engine=engine,
+            )
+        columns = [
+            "{}_{}{}".format(engine, column, suffix)
+            for engine in ("loop", "single_pass")
+            for column in ("fcell", "cell")
+        ]
+        return gs.vector_db_select(self.points, columns=",".join(columns))["values"]
+
+    def assertEnginesEqual(self, values):
+        """Check that both engines gave the same values, NULL included"""
+        n_values = 0
+        for cat, (loop_fcell, loop_cell, sp_fcell, sp_cell) in values.items():
+            for loop, single_pass in ((loop_fcell, sp_fcell), (loop_cell, sp_cell)):
+                if loop == "" or single_pass == "":
+                    self.assertEqual(
+                        loop, single_pass, msg="NULL differs for cat {}".format(cat)
+                    )
+                else:
+                    n_values += 1
+                    self.assertAlmostEqual(
+                        float(loop),
+                        float(single_pass),
+                        places=4,
+                        msg="Value differs for cat {}".format(cat),
+                    )
+        # points outside of the region and with duplicate category are NULL
+        self.assertGreater(n_values, 0)
+        self.assertEqual(values[1], ["", "", "", ""])
+
+    def test_nearest(self):
+        """Test values of the cells containing the points"""
+        self.assertEnginesEqual(self.sample(""))
+
+    def test_interpolate(self):
+        """Test values interpolated from the nearest four cells"""
+        self.assertEnginesEqual(self.sample("_i", flags="i"))
+
+    def test_missing_column(self):
+        """Test that a missing column is an error like in the loop engine"""
+        for engine in ("loop", "single_pass"):
+            self.assertModuleFail(
+                "v.what.rast.multi",
+                map=self.points,
+                raster=self.fcell,
+                columns="missing",
+                engine=engine,
+            )
+
+
+if __name__ == "__main__":
+    test()
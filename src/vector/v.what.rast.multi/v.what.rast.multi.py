@@ -100,16 +100,210 @@
 # % description: Example: income < 1000 and population >= 10000
 # %end
 
+# %option
+# % key: engine
+# % type: string
+# % required: no
+# % multiple: no
+# % label: Engine used to sample the raster maps
+# % description: The single pass engine reads the points once, samples all raster maps row by row and updates all columns in one transaction
+# % options: loop,single_pass
+# % descriptions: loop;Run v.what.rast for every raster map;single_pass;Sample all raster maps in a single pass over the points
+# % answer: loop
+# %end
+
 import sys
 import os
+import numpy as np
 import grass.script as grass
+from grass.exceptions import CalledModuleError
 from grass.pygrass.modules.shortcuts import vector as v
+from grass.pygrass.raster import RasterRow
 
 if "GISBASE" not in os.environ:
     grass.message("You must be in GRASS GIS to run this program.")
     sys.exit(1)
 
 
+CELL_NULL = -2147483648
+
+
+def read_points(vmap, layer, vtype, where):
+    """Read coordinates and categories of the points once
+
+    :return: tuple of arrays (x, y, cat)
+    """
+    ascii = grass.read_command(
+        "v.out.ascii",
+        input=vmap,
+        layer=layer,
+        type=vtype,
+        where=where or None,
+        format="point",
+        separator="|",
+        quiet=True,
+    )
+    xs, ys, cats = [], [], []
+    for line in ascii.splitlines():
+        fields = line.split("|")
+        # features without category in the layer cannot be updated
+        if len(fields) < 3 or not fields[-1]:
+            continue
+        xs.append(float(fields[0]))
+        ys.append(float(fields[1]))
+        cats.append(int(fields[-1].split("/")[0]))
+    return np.array(xs), np.array(ys), np.array(cats, dtype=int)
+
+
+def sample_cells(xs, ys, region, interpolate):
+    """Compute raster cells to be sampled for every point in the current
+    region
+
+    :return: tuple of arrays (rows, cols, weights) of shape (points, cells),
+             cells outside of the region have a weight of NaN
+    """
+    north, west = float(region["n"]), float(region["w"])
+    nsres, ewres = float(region["nsres"]), float(region["ewres"])
+    fr = (north - ys) / nsres
+    fc = (xs - west) / ewres
+    if not interpolate:
+        rows = np.floor(fr).astype(int)[:, None]
+        cols = np.floor(fc).astype(int)[:, None]
+        weights = np.ones(rows.shape)
+    else:
+        # four cells whose centres surround the point
+        r0 = np.floor(fr - 0.5).astype(int)
+        c0 = np.floor(fc - 0.5).astype(int)
+        rows = np.stack([r0, r0, r0 + 1, r0 + 1], axis=1)
+        cols = np.stack([c0, c0 + 1, c0, c0 + 1], axis=1)
+        dist = np.hypot(
+            (rows + 0.5 - fr[:, None]) * nsres, (cols + 0.5 - fc[:, None]) * ewres
+        )
+        with np.errstate(divide="ignore"):
+            weights = 1.0 / dist**2
+        # points on a cell centre take the value of that cell
+        exact = np.isinf(weights)
+        weights[exact.any(axis=1)] = 0.0
+        weights[exact] = 1.0
+    outside = (
+        (rows < 0)
+        | (rows >= int(region["rows"]))
+        | (cols < 0)
+        | (cols >= int(region["cols"]))
+    )
+    weights[outside] = np.nan
+    return rows, cols, weights
+
+
+def sample_raster(raster, rows, cols, weights):
+    """Sample raster map at given cells streaming the needed rows in sorted
+    order, only the current row is kept in memory
+
+    :return: array of values with NaN for NULL
+    """
+    flat_rows = rows.ravel()
+    flat_cols = cols.ravel()
+    inside = np.flatnonzero(~np.isnan(weights.ravel()))
+    order = inside[np.argsort(flat_rows[inside], kind="stable")]
+    bounds = np.flatnonzero(np.diff(flat_rows[order])) + 1
+    cells = np.full(flat_rows.size, np.nan)
+    with RasterRow(raster) as rast:
+        is_cell = rast.mtype == "CELL"
+        for idx in np.split(order, bounds):
+            if idx.size == 0:
+                continue
+            row = np.asarray(rast[int(flat_rows[idx[0]])])
+            values = row[flat_cols[idx]].astype(float)
+            if is_cell:
+                values[row[flat_cols[idx]] == CELL_NULL] = np.nan
+            cells[idx] = values
+    cells = cells.reshape(rows.shape)
+    # inverse distance weighting of the cells with values
+    valid = ~np.isnan(cells) & ~np.isnan(weights) & (weights > 0)
+    wsum = np.where(valid, weights, 0.0).sum(axis=1)
+    vsum = np.where(valid, weights * np.where(valid, cells, 0.0), 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(wsum > 0, vsum / wsum, np.nan)
+
+
+def single_pass(vmap, layer, vtype, rasters, columns, where, interpolate):
+    """Sample all raster maps in a single pass over the points and update all
+    columns in one transaction"""
+    db = grass.vector_db(vmap)
+    link = db.get(int(layer)) if layer.isdigit() else None
+    if link is None:
+        link = next((info for info in db.values() if info["name"] == layer), None)
+    if link is None:
+        grass.fatal(_("No database connection defined for layer <%s>") % layer)
+
+    # like v.what.rast, only existing columns are updated
+    existing = grass.vector_columns(vmap, link["layer"])
+    missing = [column for column in columns if column not in existing]
+    if missing:
+        grass.fatal(_("Column(s) <%s> not found") % ",".join(missing))
+    integer = ["INT" in existing[column]["type"].upper() for column in columns]
+
+    xs, ys, cats = read_points(vmap, link["layer"], vtype, where)
+    region = grass.region()
+    rows, cols, weights = sample_cells(xs, ys, region, interpolate)
+    sampled = ~np.isnan(weights).all(axis=1)
+    if not sampled.all():
+        grass.warning(
+            _("%d points outside of current region were skipped")
+            % np.count_nonzero(~sampled)
+        )
+
+    # points with shared category get NULL
+    unique, counts = np.unique(cats, return_counts=True)
+    duplicate = np.isin(cats, unique[counts > 1])
+    if duplicate.any():
+        grass.warning(
+            _("%d points with duplicate category were set to NULL")
+            % np.count_nonzero(duplicate)
+        )
+
+    values = np.empty((len(cats), len(rasters)))
+    for i, raster in enumerate(rasters):
+        grass.percent(i, len(rasters), 1)
+        values[:, i] = sample_raster(raster, rows, cols, weights)
+    grass.percent(1, 1, 1)
+    values[duplicate] = np.nan
+
+    cmd = ["BEGIN TRANSACTION"]
+    for cat, row in zip(cats[sampled], values[sampled]):
+        assignments = ", ".join(
+            "{}={}".format(
+                column,
+                (
+                    "NULL"
+                    if np.isnan(value)
+                    else (int(value) if is_int else repr(float(value)))
+                ),
+            )
+            for column, value, is_int in zip(columns, row, integer)
+        )
+        cmd.append(
+            "UPDATE {table} SET {values} WHERE {key}={cat};".format(
+                table=link["table"], values=assignments, key=link["key"], cat=cat
+            )
+        )
+    cmd.append("END TRANSACTION")
+    try:
+        grass.write_command(
+            "db.execute",
+            input="-",
+            database=link["database"],
+            driver=link["driver"],
+            stdin="\n".join(cmd),
+        )
+    except CalledModuleError:
+        grass.fatal(_("db.execute return an error"))
+    grass.message(
+        _("%d categories updated in %d columns")
+        % (len(np.unique(cats[sampled])), len(columns))
+    )
+
+
 def main():
 
     # Get options
@@ -127,6 +321,12 @@ def main():
                 _("The number of rasters and the number of column names do not match")
             )
 
+    if options["engine"] == "single_pass":
+        if columns == [""]:
+            columns = [r.split("@")[0] for r in rasters]
+        single_pass(vmap, layer, vtype, rasters, columns, where, flags["i"])
+        return 0
+
     # Get flags
     if flags["i"]:
         fl = "i"